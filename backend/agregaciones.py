@@ -0,0 +1,176 @@
+"""
+WaterWay - Agregaciones vectorizadas sobre los datos de consumo (NumPy)
+Agrupa por cualquier combinación de estrato, municipio, mes, trimestre y
+año, y calcula conteo, suma, promedio, mediana y percentiles sin recorrer
+los registros en Python. Las últimas formas de consulta se guardan (LRU)
+por versión de los datos.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from indices import parsear_fecha
+
+# Dimensiones por las que se puede agrupar
+DIMENSIONES = ('estrato', 'municipio', 'mes', 'trimestre', 'anio')
+
+# Percentiles que se calculan si no se piden otros
+PERCENTILES = (25, 75, 90)
+
+# Formas de consulta distintas que se guardan (LRU): las claves salen de la URL
+MAX_CONSULTAS = 256
+
+# Grupo de los registros sin valor en una dimensión
+SIN_DATO = 'sin_dato'
+
+
+def percentiles_por_grupo(valores, grupo, n_grupos, percentiles):
+    """
+    Percentiles (interpolación lineal, como numpy.percentile) de cada grupo.
+    Ordena una sola vez por (grupo, valor). Retorna {p: arreglo de n_grupos}.
+    """
+    conteo = np.bincount(grupo, minlength=n_grupos)
+    orden = np.lexsort((valores, grupo))
+    ordenados = valores[orden]
+    inicios = np.concatenate(([0], np.cumsum(conteo)[:-1]))
+    hay = conteo > 0
+
+    resultado = {}
+    for p in percentiles:
+        rango = np.maximum(conteo - 1, 0) * (p / 100.0)
+        bajo = np.floor(rango).astype(np.intp)
+        alto = np.ceil(rango).astype(np.intp)
+        valor = np.full(n_grupos, np.nan)
+        if hay.any():
+            v_bajo = ordenados[inicios[hay] + bajo[hay]]
+            v_alto = ordenados[inicios[hay] + alto[hay]]
+            valor[hay] = v_bajo + (v_alto - v_bajo) * (rango[hay] - bajo[hay])
+        resultado[p] = valor
+    return resultado
+
+
+def _codificar(valores):
+    """
+    Códigos enteros y valores distintos (ordenados) de una columna de textos.
+    None y NaN van al grupo SIN_DATO.
+    """
+    valores = np.asarray(valores, dtype=object)
+    faltan = np.equal(valores, None) | (valores != valores)
+    etiquetas = np.where(faltan, SIN_DATO, valores).astype(str)
+    distintos, codigos = np.unique(etiquetas, return_inverse=True)
+    return codigos.astype(np.intp), distintos.tolist()
+
+
+class AgregadorConsumo:
+    """Motor de agrupación sobre consumo.json (lista de dicts o TablaColumnar)"""
+
+    def __init__(self, registros):
+        if hasattr(registros, 'columna'):
+            estratos = [None if v is None else str(v) for v in registros.columna('estrato').tolist()]
+            municipios = registros.columna('municipio').tolist()
+            consumo = np.where(registros.nulos('consumo_m3'), 0.0, registros.columna('consumo_m3')).astype(np.float64)
+            fechas = registros.columna('fecha')
+            fechas = fechas.astype('datetime64[D]') if registros.tipo('fecha') == 'fecha' else fechas.tolist()
+        else:
+            estratos = [None if r.get('estrato') is None else str(r.get('estrato')) for r in registros]
+            municipios = [r.get('municipio') for r in registros]
+            consumo = np.array([r.get('consumo_m3') or 0 for r in registros], dtype=np.float64)
+            fechas = [r.get('fecha') for r in registros]
+
+        if not isinstance(fechas, np.ndarray):
+            fechas = np.array(
+                [np.datetime64('NaT') if parsear_fecha(f) is None else parsear_fecha(f) for f in fechas],
+                dtype='datetime64[D]'
+            )
+
+        self.total = len(consumo)
+        self.consumo = consumo
+        self.estrato = np.array(estratos, dtype=object)
+        self.municipio = np.array(municipios, dtype=object)
+
+        meses = fechas.astype('datetime64[M]')
+        sin_fecha = np.isnat(fechas)
+        anio = meses.astype(np.int64) // 12 + 1970
+        mes = meses.astype(np.int64) % 12 + 1
+        self._dimensiones = {
+            'estrato': self.estrato,
+            'municipio': self.municipio,
+            'mes': np.where(sin_fecha, None, np.char.mod('%04d-', anio).astype(object) + np.char.mod('%02d', mes).astype(object)),
+            'trimestre': np.where(sin_fecha, None, np.char.mod('%04d-T', anio).astype(object) + np.char.mod('%d', (mes - 1) // 3 + 1).astype(object)),
+            'anio': np.where(sin_fecha, None, np.char.mod('%04d', anio).astype(object)),
+        }
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def agrupar(self, por=('estrato',), percentiles=PERCENTILES, estrato=None, municipio=None):
+        """
+        Estadísticas de consumo_m3 por grupo.
+        por: dimensiones (ver DIMENSIONES); estrato/municipio: filtros opcionales.
+        Retorna una lista de grupos ordenada por sus claves.
+        """
+        por = tuple(por)
+        percentiles = tuple(sorted(set(percentiles)))
+        desconocidas = [d for d in por if d not in DIMENSIONES]
+        if desconocidas:
+            raise ValueError(f"No se puede agrupar por {', '.join(desconocidas)}. Opciones: {', '.join(DIMENSIONES)}")
+        if any(not 0 <= p <= 100 for p in percentiles):
+            raise ValueError("Los percentiles deben estar entre 0 y 100")
+
+        clave = (por, percentiles, None if estrato is None else str(estrato), municipio)
+        with self._cache_lock:
+            resultado = self._cache.get(clave)
+            if resultado is not None:
+                self._cache.move_to_end(clave)
+                return resultado
+
+        resultado = self._calcular(*clave)
+        with self._cache_lock:
+            self._cache[clave] = resultado
+            while len(self._cache) > MAX_CONSULTAS:
+                self._cache.popitem(last=False)
+        return resultado
+
+    def _calcular(self, por, percentiles, estrato, municipio):
+        filas = np.ones(self.total, dtype=bool)
+        if estrato is not None:
+            filas &= self.estrato == estrato
+        if municipio is not None:
+            filas &= self.municipio == municipio
+        filas = np.flatnonzero(filas)
+        if len(filas) == 0:
+            return []
+
+        # Código de grupo combinado (base mixta sobre los códigos de cada dimensión)
+        grupo = np.zeros(len(filas), dtype=np.intp)
+        etiquetas = []
+        for dimension in por:
+            codigos, distintos = _codificar(self._dimensiones[dimension][filas])
+            grupo = grupo * len(distintos) + codigos
+            etiquetas.append((dimension, distintos, codigos))
+        unicos, grupo = np.unique(grupo, return_inverse=True)
+        n_grupos = len(unicos)
+
+        valores = self.consumo[filas]
+        conteo = np.bincount(grupo, minlength=n_grupos)
+        suma = np.bincount(grupo, weights=valores, minlength=n_grupos)
+        cuantiles = percentiles_por_grupo(valores, grupo, n_grupos, percentiles + (50,))
+
+        # Primera fila de cada grupo, para leer sus etiquetas
+        primera = np.full(n_grupos, len(filas), dtype=np.intp)
+        np.minimum.at(primera, grupo, np.arange(len(filas)))
+
+        resultado = []
+        for g in range(n_grupos):
+            fila = {dimension: distintos[codigos[primera[g]]] for dimension, distintos, codigos in etiquetas}
+            fila.update({
+                'conteo': int(conteo[g]),
+                'suma': round(float(suma[g]), 2),
+                'promedio': round(float(suma[g] / conteo[g]), 2),
+                'mediana': round(float(cuantiles[50][g]), 2),
+            })
+            for p in percentiles:
+                fila[f'p{p}'] = round(float(cuantiles[p][g]), 2)
+            resultado.append(fila)
+        return resultado
@@ -0,0 +1,223 @@
+"""
+WaterWay - Detección de anomalías en mediciones de calidad de agua
+Mantiene por (policlínica, métrica) una ventana móvil con suma y suma de
+cuadrados, así cada muestra nueva se evalúa y se incorpora en O(1).
+Una muestra es anómala si se aleja más de UMBRAL_Z desvíos de la media
+de las últimas VENTANA muestras de esa policlínica.
+Al recargar los datos, el detector de la versión anterior se copia y solo
+observa las muestras nuevas.
+"""
+import math
+import threading
+from collections import Counter, deque
+
+# Métricas que se vigilan (nombres de la vista normalizada)
+METRICAS_VIGILADAS = ('conductividad', 'sodio', 'cloruro')
+
+# Muestras que forman la línea base de cada policlínica
+VENTANA = 20
+
+# Muestras mínimas antes de empezar a evaluar
+MINIMO_MUESTRAS = 8
+
+UMBRAL_Z = 3.0
+
+# Desvío mínimo relativo a la media: con una línea base casi constante,
+# cualquier variación mínima daría un z enorme
+DESVIO_MINIMO_RELATIVO = 0.01
+
+
+class EstadisticaMovil:
+    """Media y desvío de las últimas n muestras, con actualización O(1)"""
+
+    __slots__ = ('ventana', 'valores', 'suma', 'suma_cuadrados')
+
+    def __init__(self, ventana=VENTANA):
+        self.ventana = ventana
+        self.valores = deque()
+        self.suma = 0.0
+        self.suma_cuadrados = 0.0
+
+    def __len__(self):
+        return len(self.valores)
+
+    def copia(self):
+        nueva = EstadisticaMovil(self.ventana)
+        nueva.valores = deque(self.valores)
+        nueva.suma = self.suma
+        nueva.suma_cuadrados = self.suma_cuadrados
+        return nueva
+
+    def agregar(self, valor):
+        self.valores.append(valor)
+        self.suma += valor
+        self.suma_cuadrados += valor * valor
+        if len(self.valores) > self.ventana:
+            viejo = self.valores.popleft()
+            self.suma -= viejo
+            self.suma_cuadrados -= viejo * viejo
+
+    @property
+    def media(self):
+        return self.suma / len(self.valores)
+
+    @property
+    def desvio(self):
+        """Desvío estándar muestral"""
+        n = len(self.valores)
+        if n < 2:
+            return 0.0
+        varianza = (self.suma_cuadrados - self.suma * self.suma / n) / (n - 1)
+        return math.sqrt(max(varianza, 0.0))
+
+
+class DetectorAnomalias:
+    """
+    Detector incremental: observar() evalúa una muestra contra la línea base
+    de su policlínica y después la incorpora a esa línea base.
+    Las muestras de cada policlínica deben llegar en orden cronológico.
+    """
+
+    def __init__(self, metricas=METRICAS_VIGILADAS, ventana=VENTANA, umbral=UMBRAL_Z, minimo=MINIMO_MUESTRAS):
+        self.metricas = metricas
+        self.ventana = ventana
+        self.umbral = umbral
+        self.minimo = minimo
+        self.anomalias = []         # en orden de llegada
+        self.muestras = 0
+        self._estadisticas = {}     # (ubicación, métrica) -> EstadisticaMovil
+        self._ultima_fecha = {}     # ubicación -> fecha de su última muestra
+        self._observadas = Counter()    # (ubicación, fecha, valores) de las muestras incorporadas
+        self._lock = threading.Lock()
+
+    def _clave(self, ubicacion, fecha, valores):
+        return ubicacion, fecha.isoformat(), tuple(valores.get(metrica) for metrica in self.metricas)
+
+    def copia(self):
+        """Detector independiente con el mismo estado (para seguir observando sin tocar este)"""
+        with self._lock:
+            nuevo = DetectorAnomalias(self.metricas, self.ventana, self.umbral, self.minimo)
+            nuevo.anomalias = list(self.anomalias)
+            nuevo.muestras = self.muestras
+            nuevo._estadisticas = {clave: estadistica.copia() for clave, estadistica in self._estadisticas.items()}
+            nuevo._ultima_fecha = dict(self._ultima_fecha)
+            nuevo._observadas = Counter(self._observadas)
+        return nuevo
+
+    def muestras_nuevas(self, muestras):
+        """
+        Muestras (ubicación, fecha, valores) en orden cronológico que el detector
+        todavía no observó, o None si no se pueden incorporar en orden: falta
+        alguna ya observada (se corrigió o se borró) o alguna nueva es anterior
+        a la última muestra de su policlínica.
+        """
+        with self._lock:
+            pendientes = Counter(self._observadas)
+            ultima_fecha = dict(self._ultima_fecha)
+
+        nuevas = []
+        for ubicacion, fecha, valores in muestras:
+            clave = self._clave(ubicacion, fecha, valores)
+            if pendientes[clave] > 0:
+                pendientes[clave] -= 1
+            else:
+                nuevas.append((ubicacion, fecha, valores))
+
+        if any(n > 0 for n in pendientes.values()):
+            return None
+        for ubicacion, fecha, _ in nuevas:
+            ultima = ultima_fecha.get(ubicacion)
+            if ultima is not None and fecha.isoformat() < ultima:
+                return None
+        return nuevas
+
+    def observar(self, ubicacion, fecha, valores):
+        """
+        Evalúa e incorpora una muestra.
+        valores: {métrica: float o None}. Retorna las anomalías encontradas.
+        """
+        encontradas = []
+        with self._lock:
+            self.muestras += 1
+            self._ultima_fecha[ubicacion] = fecha.isoformat()
+            self._observadas[self._clave(ubicacion, fecha, valores)] += 1
+
+            for metrica in self.metricas:
+                valor = valores.get(metrica)
+                if valor is None:
+                    continue
+
+                estadistica = self._estadisticas.get((ubicacion, metrica))
+                if estadistica is None:
+                    estadistica = self._estadisticas[(ubicacion, metrica)] = EstadisticaMovil(self.ventana)
+
+                if len(estadistica) >= self.minimo:
+                    media = estadistica.media
+                    desvio = max(estadistica.desvio, abs(media) * DESVIO_MINIMO_RELATIVO, 1e-9)
+                    z = (valor - media) / desvio
+                    if abs(z) >= self.umbral:
+                        encontradas.append({
+                            'ubicacion': ubicacion,
+                            'fecha': fecha.isoformat(),
+                            'metrica': metrica,
+                            'valor': valor,
+                            'media': round(media, 2),
+                            'desvio': round(desvio, 2),
+                            'z': round(z, 2),
+                            'direccion': 'alta' if z > 0 else 'baja',
+                        })
+
+                estadistica.agregar(valor)
+
+            self.anomalias.extend(encontradas)
+        return encontradas
+
+    def es_actual(self, anomalia):
+        """Indica si la anomalía corresponde a la última muestra de su policlínica"""
+        return self._ultima_fecha.get(anomalia['ubicacion']) == anomalia['fecha']
+
+    def linea_base(self, ubicacion, metrica):
+        """Media y desvío actuales de una policlínica, o None si no hay muestras"""
+        estadistica = self._estadisticas.get((ubicacion, metrica))
+        if not estadistica:
+            return None
+        return {'media': round(estadistica.media, 2), 'desvio': round(estadistica.desvio, 2), 'muestras': len(estadistica)}
+
+
+def _muestras(normalizado, metricas):
+    """(ubicación, fecha, valores) de la vista tipada de calidad_agua en orden cronológico"""
+    fechas = normalizado.columna('fecha')
+    ubicaciones = normalizado.columna('ubicacion')
+    columnas = {metrica: normalizado.columna(metrica) for metrica in metricas}
+
+    return [
+        (
+            normalizado.ubicaciones[ubicaciones[pos]],
+            fechas[pos],
+            {metrica: columna[pos] for metrica, columna in columnas.items()}
+        )
+        for pos in sorted(normalizado.validos, key=lambda p: (fechas[p], p))
+    ]
+
+
+def detector_desde_normalizado(normalizado, anterior=None):
+    """
+    Detector sobre la vista tipada de calidad_agua.
+    anterior: detector de una versión previa del archivo. Si las muestras nuevas
+    se pueden incorporar en orden, se continúa una copia suya observando solo
+    esas; si no, se recorre todo el dataset.
+    """
+    muestras = _muestras(normalizado, METRICAS_VIGILADAS if anterior is None else anterior.metricas)
+
+    if anterior is not None:
+        nuevas = anterior.muestras_nuevas(muestras)
+        if nuevas is not None:
+            detector = anterior.copia()
+            for muestra in nuevas:
+                detector.observar(*muestra)
+            return detector
+
+    detector = DetectorAnomalias()
+    for muestra in muestras:
+        detector.observar(*muestra)
+    return detector
@@ -1,10 +1,15 @@
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 from datetime import datetime
 from openai import OpenAI
-from data_loader import data_loader
+from data_loader import INTERVALO_RECARGA, PERCENTILES, data_loader, get_data_loader, activar_recarga_automatica
+from paginacion import huella_consulta, paginar, parsear_campos
+from respuestas import (
+    TAMANO_MINIMO_COMPRESION, CacheComprimidos, CacheRespuestas, calcular_etag,
+    elegir_codificacion, etag_coincide, etag_representacion
+)
 
 # Cargar variables de entorno
 load_dotenv()
@@ -12,6 +17,127 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# Recarga en segundo plano de los datos procesados (nuevos exports del notebook)
+if os.getenv('WATERWAY_HOT_RELOAD', '1') == '1':
+    activar_recarga_automatica()
+
+# Carga todos los datasets antes de servir (los scripts y workers auxiliares
+# solo cargan los que usan, la primera vez que los usan)
+if os.getenv('WATERWAY_PRELOAD', '1') == '1':
+    data_loader.preload()
+    get_data_loader('uruguay', 'montevideo').preload()
+
+# ============ RESPUESTAS CONDICIONALES (ETag), COMPRIMIDAS Y CACHEADAS ============
+
+# Prefijo de ruta -> loader cuyos datos sirve
+PREFIJOS_DATOS = {
+    '/api/epm/': ('colombia', None),
+    '/api/uruguay/': ('uruguay', 'montevideo'),
+}
+
+# Tamaño máximo de la cache de respuestas serializadas (0 la desactiva)
+CACHE_RESPUESTAS_MB = float(os.getenv('WATERWAY_CACHE_MB', '64'))
+
+comprimidos = CacheComprimidos()
+respuestas_cache = CacheRespuestas(int(CACHE_RESPUESTAS_MB * 1024 * 1024))
+
+def _version_de_ruta(ruta):
+    """
+    (grupo, versión) de los datos que sirve una ruta GET,
+    o None si la respuesta no depende solo de datos versionados
+    """
+    for prefijo, (pais, ciudad) in PREFIJOS_DATOS.items():
+        if ruta.startswith(prefijo):
+            return prefijo, get_data_loader(pais, ciudad).version
+    if ruta.startswith('/api/ml/') and ML_AVAILABLE and predictor.listo:
+        return '/api/ml/', predictor.version
+    return None
+
+def _etag_actual():
+    """ETag de la URL pedida según la versión actual de los datos"""
+    version = _version_de_ruta(request.path)
+    if version is None:
+        return None
+    return calcular_etag('.'.join(version[1:]), request.path, request.args.items(multi=True))
+
+@app.before_request
+def verificar_etag():
+    """Responde 304 sin ejecutar el endpoint si el cliente ya tiene esta versión"""
+    g.etag = None
+    g.clave_cache = None
+    # Sin ruta (404/405) no hay nada que validar: que Flask responda el error
+    if request.method != 'GET' or request.url_rule is None:
+        return None
+    
+    version = _version_de_ruta(request.path)
+    if version is None:
+        return None
+    
+    g.etag = calcular_etag('.'.join(version[1:]), request.path, request.args.items(multi=True))
+    if respuestas_cache.max_bytes:
+        g.clave_cache = CacheRespuestas.clave(*version, request.path, request.args.items(multi=True))
+    if g.etag and etag_coincide(request.headers.get('If-None-Match'), g.etag):
+        respuesta = app.response_class(status=304)
+        respuesta.set_etag(etag_representacion(g.etag, elegir_codificacion(request.accept_encodings)))
+        respuesta.headers['Cache-Control'] = 'no-cache'
+        respuesta.vary.add('Accept-Encoding')
+        return respuesta
+    
+    return None
+
+@app.before_request
+def servir_desde_cache():
+    """Devuelve la respuesta ya serializada si otra consulta idéntica la generó en esta versión"""
+    if g.clave_cache is None:
+        return None
+    
+    cuerpo = respuestas_cache.obtener(g.clave_cache)
+    if cuerpo is None:
+        return None
+    
+    g.clave_cache = None
+    return app.response_class(cuerpo, mimetype='application/json')
+
+@app.after_request
+def etiquetar_y_comprimir(response):
+    """Agrega el ETag y sirve el cuerpo comprimido (una compresión por versión de los datos)"""
+    etag = g.pop('etag', None)
+    if etag is None or response.status_code != 200 or response.direct_passthrough:
+        return response
+    
+    # Si los datos se recargaron mientras se atendía el request, el cuerpo
+    # puede ser de cualquiera de las dos versiones: mejor no etiquetarlo
+    if _etag_actual() != etag:
+        return response
+    
+    codificacion = None
+    cuerpo = response.get_data()
+    if len(cuerpo) >= TAMANO_MINIMO_COMPRESION and 'Content-Encoding' not in response.headers:
+        codificacion = elegir_codificacion(request.accept_encodings)
+    
+    if codificacion:
+        response.set_data(comprimidos.obtener(etag, codificacion, cuerpo))
+        response.headers['Content-Encoding'] = codificacion
+    
+    response.set_etag(etag_representacion(etag, codificacion))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+# Flask ejecuta los after_request en orden inverso al de registro: esta corre
+# antes de etiquetar_y_comprimir y guarda el cuerpo todavía sin comprimir
+@app.after_request
+def guardar_en_cache(response):
+    """Guarda el cuerpo serializado de las respuestas 200 cacheables"""
+    clave = g.pop('clave_cache', None)
+    if clave is None or response.status_code != 200 or response.direct_passthrough:
+        return response
+    
+    # No guarda si los datos cambiaron mientras se atendía el request
+    if _version_de_ruta(request.path) == clave[:2]:
+        respuestas_cache.guardar(clave, response.get_data())
+    return response
+
 # Inicializar cliente de OpenAI (opcional)
 try:
     api_key = os.getenv('OPENAI_API_KEY')
@@ -28,14 +154,43 @@ except Exception as e:
     OPENAI_AVAILABLE = False
 
 # Inicializar predictor de ML (opcional)
+# Los modelos se cargan en segundo plano para que el servidor (y /api/health)
+# responda enseguida; WATERWAY_ML_SEGUNDO_PLANO=0 los carga antes de servir
 try:
     from predictor import get_predictor
-    predictor = get_predictor()
+    predictor = get_predictor(en_segundo_plano=os.getenv('WATERWAY_ML_SEGUNDO_PLANO', '1') == '1')
     ML_AVAILABLE = True
+    # Los modelos reentrenados (o recompilados) se recargan igual que los datos
+    if os.getenv('WATERWAY_HOT_RELOAD', '1') == '1':
+        predictor.iniciar_recarga_automatica(INTERVALO_RECARGA)
 except ImportError:
     predictor = None
     ML_AVAILABLE = False
 
+# Segundos que se sugiere esperar (Retry-After) mientras cargan los modelos
+REINTENTO_MODELOS_SEGUNDOS = 2
+
+def _modelos_cargando():
+    return ML_AVAILABLE and not predictor.listo
+
+def _respuesta_cargando_modelos():
+    """503 con Retry-After mientras los modelos de ML no terminaron de cargar"""
+    respuesta = jsonify({
+        "success": False,
+        "ready": False,
+        "error": "Los modelos de ML se están cargando, reintentar en unos segundos"
+    })
+    respuesta.status_code = 503
+    respuesta.headers['Retry-After'] = str(REINTENTO_MODELOS_SEGUNDOS)
+    return respuesta
+
+@app.before_request
+def esperar_modelos():
+    """Los endpoints de ML responden 503 hasta que los modelos estén listos"""
+    if request.path.startswith('/api/ml/') and request.method != 'OPTIONS' and _modelos_cargando():
+        return _respuesta_cargando_modelos()
+    return None
+
 # Base de datos en memoria (mock data - solo como fallback)
 reportes_db = []
 usuarios_db = []
@@ -56,6 +211,37 @@ def health_check():
         "timestamp": datetime.now().isoformat()
     })
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness (distinto de /api/health, que solo indica que el proceso responde):
+    200 cuando los modelos de ML terminaron de cargar, 503 con Retry-After mientras tanto
+    """
+    if _modelos_cargando():
+        return _respuesta_cargando_modelos()
+    
+    return jsonify({
+        "success": True,
+        "ready": True,
+        "modelos": {
+            "disponibles": ML_AVAILABLE,
+            "ml_activo": ML_AVAILABLE and predictor.ml_enabled,
+            "compilados": ML_AVAILABLE and predictor.modelos_compilados,
+            "proyecciones_activas": ML_AVAILABLE and predictor.proyecciones_enabled
+        },
+        "timestamp": datetime.now().isoformat()
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Uso de la cache de respuestas serializadas y de la cache de resultados del predictor"""
+    return jsonify({
+        "success": True,
+        "cache": respuestas_cache.estadisticas(),
+        "comprimidos": len(comprimidos),
+        "predictor": predictor.estadisticas_cache() if ML_AVAILABLE else None
+    })
+
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Estadísticas generales de la plataforma"""
@@ -331,7 +517,7 @@ def analyze_water_data():
         proyecciones_ml = []
         modelo_activo = False
         
-        if city == 'Medellín' and ML_AVAILABLE and predictor.ml_enabled:
+        if city == 'Medellín' and ML_AVAILABLE and predictor.listo and predictor.ml_enabled:
             proyecciones_ml = predictor.obtener_proyecciones(city)
             modelo_activo = True
             
@@ -427,6 +613,38 @@ Responde ÚNICAMENTE con el JSON, sin texto adicional."""
 
 # ============ ENDPOINTS CON DATOS REALES DE EPM ============
 
+def _respuesta_lista(loader, registros, **extra):
+    """
+    Respuesta JSON de un listado, con paginación por cursor y proyección de campos
+    Query params: limit (tamaño de página), cursor (next_cursor de la página anterior),
+    fields (campos a incluir, separados por coma)
+    """
+    try:
+        pagina = paginar(
+            registros,
+            loader.version,
+            huella_consulta(request.path, request.args.items(multi=True)),
+            cursor=request.args.get('cursor'),
+            limite=request.args.get('limit', type=int),
+            campos=parsear_campos(request.args.get('fields'))
+        )
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    
+    respuesta = {
+        "success": True,
+        "data": pagina.registros,
+        "total": len(pagina.registros)
+    }
+    if pagina.paginada:
+        respuesta["next_cursor"] = pagina.siguiente
+        respuesta["total_resultados"] = pagina.total
+    respuesta.update(extra)
+    return jsonify(respuesta)
+
 @app.route('/api/epm/tarifas', methods=['GET'])
 def get_tarifas_epm():
     """Obtiene tarifas reales de EPM"""
@@ -435,28 +653,155 @@ def get_tarifas_epm():
     
     tarifas = data_loader.get_tarifas(municipio=municipio, estrato=estrato)
     
-    return jsonify({
-        "success": True,
-        "data": tarifas,
-        "total": len(tarifas),
-        "source": "EPM - Datos reales" if tarifas else "Mock data"
-    })
+    return _respuesta_lista(
+        data_loader, tarifas,
+        source="EPM - Datos reales" if tarifas else "Mock data"
+    )
 
 @app.route('/api/epm/interrupciones', methods=['GET'])
 def get_interrupciones_epm():
-    """Obtiene interrupciones reales de EPM"""
+    """
+    Obtiene interrupciones reales de EPM
+    Query params: municipio, activa_en (instante ISO), desde, hasta (ventana ISO),
+    limit, cursor, fields
+    """
     municipio = request.args.get('municipio')
-    limit = request.args.get('limit', type=int)
     
-    interrupciones = data_loader.get_interrupciones(municipio=municipio, limit=limit)
+    try:
+        interrupciones = data_loader.get_interrupciones(
+            municipio=municipio,
+            activa_en=request.args.get('activa_en'),
+            desde=request.args.get('desde'),
+            hasta=request.args.get('hasta')
+        )
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    
+    return _respuesta_lista(
+        data_loader, interrupciones,
+        source="EPM - Datos reales" if interrupciones else "Mock data"
+    )
+
+def _respuesta_resumen_interrupciones(loader):
+    """
+    Roll-up de impacto de interrupciones desde el cubo precalculado
+    Query params: agrupar_por (subconjunto de area,mes,tipo; vacío = total),
+    area, tipo, desde, hasta (meses AAAA-MM), limit, cursor, fields
+    """
+    agrupar_por = request.args.get('agrupar_por', 'area,mes')
+    dimensiones = [d.strip() for d in agrupar_por.split(',') if d.strip()]
+    
+    try:
+        grupos, totales, campos = loader.get_resumen_interrupciones(
+            dimensiones,
+            area=request.args.get('area'),
+            tipo=request.args.get('tipo'),
+            desde=request.args.get('desde'),
+            hasta=request.args.get('hasta')
+        )
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    
+    return _respuesta_lista(loader, grupos, agrupar_por=dimensiones, totales=totales, campos=campos)
+
+@app.route('/api/epm/interrupciones/resumen', methods=['GET'])
+def get_resumen_interrupciones_epm():
+    """Horas, interrupciones y usuarios afectados por municipio, mes e impacto"""
+    return _respuesta_resumen_interrupciones(data_loader)
+
+def _parsear_bbox(texto):
+    """Convierte 'minLon,minLat,maxLon,maxLat' en una tupla de floats"""
+    try:
+        bbox = tuple(float(v) for v in texto.split(','))
+    except ValueError:
+        bbox = ()
+    if len(bbox) != 4:
+        raise ValueError("bbox inválido: se espera minLon,minLat,maxLon,maxLat")
+    return bbox
+
+def _respuesta_mapa(loader, dataset):
+    """
+    Puntos de un dataset geográfico dentro de un bbox o un radio
+    Query params: bbox=minLon,minLat,maxLon,maxLat  o  lat, lon, radio_km;
+    limit, cursor, fields
+    """
+    bbox = request.args.get('bbox')
+    
+    try:
+        puntos = loader.get_puntos(
+            dataset,
+            bbox=_parsear_bbox(bbox) if bbox else None,
+            lat=request.args.get('lat', type=float),
+            lon=request.args.get('lon', type=float),
+            radio_km=request.args.get('radio_km', type=float)
+        )
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    
+    if puntos is None:
+        return jsonify({
+            "success": False,
+            "error": f"Dataset '{dataset}' no disponible. Opciones: {', '.join(loader.datasets_geograficos())}"
+        }), 404
+    
+    return _respuesta_lista(loader, puntos, dataset=dataset)
+
+def _respuesta_clusters(loader, dataset):
+    """
+    Clusters de un dataset geográfico para un zoom de mapa
+    Query params: zoom (0-22, requerido), bbox=minLon,minLat,maxLon,maxLat (opcional)
+    """
+    zoom = request.args.get('zoom', type=int)
+    bbox = request.args.get('bbox')
+    
+    if zoom is None:
+        return jsonify({
+            "success": False,
+            "error": "zoom es requerido"
+        }), 400
+    
+    try:
+        clusters = loader.get_clusters(dataset, zoom, bbox=_parsear_bbox(bbox) if bbox else None)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    
+    if clusters is None:
+        return jsonify({
+            "success": False,
+            "error": f"Dataset '{dataset}' no disponible. Opciones: {', '.join(loader.datasets_geograficos())}"
+        }), 404
     
     return jsonify({
         "success": True,
-        "data": interrupciones,
-        "total": len(interrupciones),
-        "source": "EPM - Datos reales" if interrupciones else "Mock data"
+        "dataset": dataset,
+        "zoom": zoom,
+        "data": clusters,
+        "total": len(clusters),
+        "puntos": sum(c['conteo'] for c in clusters)
     })
 
+@app.route('/api/epm/mapa/<dataset>', methods=['GET'])
+def get_mapa_epm(dataset):
+    """Reportes o interrupciones de EPM dentro de un bbox o un radio"""
+    return _respuesta_mapa(data_loader, dataset)
+
+@app.route('/api/epm/mapa/<dataset>/clusters', methods=['GET'])
+def get_clusters_epm(dataset):
+    """Clusters de reportes o interrupciones de EPM para un zoom"""
+    return _respuesta_clusters(data_loader, dataset)
+
 @app.route('/api/epm/reportes-ciudadanos', methods=['GET'])
 def get_reportes_ciudadanos_epm():
     """Obtiene reportes ciudadanos reales/sintéticos"""
@@ -470,21 +815,94 @@ def get_reportes_ciudadanos_epm():
         estado=estado
     )
     
-    return jsonify({
-        "success": True,
-        "data": reportes,
-        "total": len(reportes),
-        "source": "Datos sintéticos basados en patrones reales"
-    })
+    return _respuesta_lista(
+        data_loader, reportes,
+        source="Datos sintéticos basados en patrones reales"
+    )
+
+@app.route('/api/epm/reportes-ciudadanos', methods=['POST'])
+def crear_reporte_ciudadano_epm():
+    """
+    Agrega un reporte ciudadano (se publica una nueva versión de los datos)
+    Body: { categoria, descripcion, municipio, barrio, latitud, longitud, estado (opcional) }
+    """
+    return _crear_reporte(data_loader)
+
+@app.route('/api/epm/reportes-ciudadanos/<reporte_id>', methods=['PATCH'])
+def actualizar_reporte_ciudadano_epm(reporte_id):
+    """Cambia el estado de un reporte ciudadano. Body: { estado }"""
+    return _actualizar_estado_reporte(data_loader, reporte_id)
+
+def _crear_reporte(loader):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "El cuerpo debe ser un objeto JSON"}), 400
+    
+    try:
+        reporte = loader.agregar_reporte(data)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    return jsonify({"success": True, "data": reporte, "version": loader.version}), 201
+
+def _actualizar_estado_reporte(loader, reporte_id):
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        reporte = loader.actualizar_estado_reporte(reporte_id, data.get('estado'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    if reporte is None:
+        return jsonify({"success": False, "error": f"Reporte {reporte_id} no encontrado"}), 404
+    return jsonify({"success": True, "data": reporte, "version": loader.version})
 
 @app.route('/api/epm/consumo', methods=['GET'])
 def get_consumo_epm():
-    """Obtiene datos de consumo por estrato"""
+    """
+    Obtiene datos de consumo por estrato
+    Query params: municipio, estrato; agrupar_por (ej. 'estrato,mes') y
+    percentiles (ej. '25,75,90') para estadísticas agrupadas
+    """
     municipio = request.args.get('municipio', 'Medellín')
     estrato = request.args.get('estrato')
+    agrupar_por = request.args.get('agrupar_por')
+    
+    if agrupar_por:
+        try:
+            dimensiones = [d.strip() for d in agrupar_por.split(',') if d.strip()]
+            percentiles = request.args.get('percentiles')
+            if percentiles is not None:
+                try:
+                    percentiles = [float(p) if '.' in p else int(p) for p in percentiles.split(',') if p.strip()]
+                except ValueError:
+                    raise ValueError("percentiles debe ser una lista de números separados por coma (ej. 25,75,90)")
+            grupos = data_loader.agregar_consumo(
+                dimensiones,
+                PERCENTILES if percentiles is None else percentiles,
+                estrato=estrato,
+                municipio=municipio or None
+            )
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        except RuntimeError as e:
+            return jsonify({"success": False, "error": str(e)}), 501
+        
+        return jsonify({
+            "success": True,
+            "data": grupos,
+            "agrupar_por": dimensiones,
+            "total": len(grupos),
+            "source": "EPM - Datos reales" if grupos else "Mock data"
+        })
     
     if estrato:
         consumo = data_loader.get_consumo(estrato=estrato, municipio=municipio)
+        return _respuesta_lista(
+            data_loader, consumo,
+            municipio=municipio,
+            source="EPM - Datos reales" if consumo else "Mock data"
+        )
     else:
         # Obtiene promedios por estrato
         consumo = data_loader.get_consumo_por_estrato(municipio=municipio)
@@ -498,17 +916,26 @@ def get_consumo_epm():
 
 @app.route('/api/epm/clima', methods=['GET'])
 def get_clima_epm():
-    """Obtiene datos climáticos recientes"""
-    dias = request.args.get('dias', 30, type=int)
+    """
+    Obtiene datos climáticos, del más reciente al más antiguo
+    Query params: dias, desde, hasta (fechas ISO, inclusive)
+    """
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    dias = request.args.get('dias', None if desde or hasta else 30, type=int)
     
-    clima = data_loader.get_clima_reciente(dias=dias)
+    try:
+        clima = data_loader.get_clima_reciente(dias=dias, desde=desde, hasta=hasta)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
     
-    return jsonify({
-        "success": True,
-        "data": clima,
-        "total": len(clima),
-        "source": "Datos climáticos sintéticos Medellín"
-    })
+    return _respuesta_lista(
+        data_loader, clima,
+        source="Datos climáticos sintéticos Medellín"
+    )
 
 @app.route('/api/epm/stats', methods=['GET'])
 def get_epm_stats():
@@ -525,47 +952,150 @@ def get_epm_stats():
 
 @app.route('/api/uruguay/calidad-agua', methods=['GET'])
 def get_calidad_agua_uruguay():
-    """Obtiene datos de calidad de agua de Montevideo"""
-    from data_loader import DataLoader
-    
-    uy_loader = DataLoader(pais='uruguay', ciudad='montevideo')
+    """
+    Obtiene datos de calidad de agua de Montevideo
+    Query params: ubicacion (policlínica), fecha ('AAAA', 'AAAA-MM' o 'AAAA-MM-DD')
+    """
+    uy_loader = get_data_loader('uruguay', 'montevideo')
     
     ubicacion = request.args.get('ubicacion')
     fecha = request.args.get('fecha')
     
     calidad = uy_loader.get_calidad_agua(ubicacion=ubicacion, fecha=fecha)
     
+    return _respuesta_lista(
+        uy_loader, calidad,
+        source="OSE Uruguay - Datos reales" if calidad else "Mock data"
+    )
+
+@app.route('/api/uruguay/calidad-agua/serie', methods=['GET'])
+def get_serie_calidad_agua():
+    """
+    Serie temporal re-muestreada de calidad de agua
+    Query params: ubicacion (policlínica; sin ella, todas juntas),
+    frecuencia (diaria, semanal, mensual), ventana (períodos del promedio móvil),
+    metricas (sodio, cloruro, conductividad, solidos_totales; separadas por coma)
+    """
+    uy_loader = get_data_loader('uruguay', 'montevideo')
+    
+    ubicacion = request.args.get('ubicacion')
+    frecuencia = request.args.get('frecuencia', 'mensual')
+    ventana = request.args.get('ventana', 3, type=int)
+    metricas = parsear_campos(request.args.get('metricas'))
+    
+    try:
+        serie = uy_loader.get_serie_calidad_agua(
+            ubicacion=ubicacion,
+            frecuencia=frecuencia,
+            ventana=ventana,
+            metricas=metricas
+        )
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    except RuntimeError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 501
+    
+    if serie is None:
+        return jsonify({
+            "success": False,
+            "error": f"Ubicación '{ubicacion}' no encontrada"
+        }), 404
+    
     return jsonify({
         "success": True,
-        "data": calidad,
-        "total": len(calidad),
-        "source": "OSE Uruguay - Datos reales" if calidad else "Mock data"
+        "ubicacion": ubicacion,
+        "frecuencia": frecuencia,
+        "ventana": ventana,
+        "data": serie,
+        "total": len(serie),
+        "source": "OSE Uruguay - Datos reales"
     })
 
+@app.route('/api/uruguay/calidad-agua/anomalias', methods=['GET'])
+def get_anomalias_calidad_agua():
+    """
+    Mediciones anómalas de calidad de agua (respecto de la línea base de cada policlínica)
+    Query params: ubicacion, metrica (conductividad, sodio, cloruro), desde (fecha ISO),
+    actuales=1 (solo las de la última muestra de cada policlínica), limit, cursor, fields
+    """
+    uy_loader = get_data_loader('uruguay', 'montevideo')
+    
+    try:
+        anomalias = uy_loader.get_anomalias_calidad_agua(
+            ubicacion=request.args.get('ubicacion'),
+            metrica=request.args.get('metrica'),
+            desde=request.args.get('desde'),
+            solo_actuales=request.args.get('actuales') == '1'
+        )
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    
+    return _respuesta_lista(
+        uy_loader, anomalias,
+        source="OSE Uruguay - Datos reales"
+    )
+
 @app.route('/api/uruguay/tarifas', methods=['GET'])
 def get_tarifas_ose():
     """Obtiene tarifas de OSE Uruguay"""
-    from data_loader import DataLoader
-    
-    uy_loader = DataLoader(pais='uruguay', ciudad='montevideo')
+    uy_loader = get_data_loader('uruguay', 'montevideo')
     
     categoria = request.args.get('categoria')
     
     tarifas = uy_loader.get_tarifas_ose(categoria=categoria)
     
+    return _respuesta_lista(
+        uy_loader, tarifas,
+        source="OSE - Datos reales" if tarifas else "Mock data"
+    )
+
+@app.route('/api/uruguay/facturacion/lote', methods=['POST'])
+def facturar_lote_ose():
+    """
+    Calcula las facturas de un lote de hogares con las tarifas por bloques de OSE
+    Body: { consumo_m3: [...], categoria: str o [...], fecha: str o [...], tarifas: [...] (opcional) }
+    fecha es 'AAAA-MM' o 'AAAA-MM-DD'; sin fecha se usa la última tarifa.
+    tarifas permite simular otro tarifario con el mismo formato que /api/uruguay/tarifas.
+    """
+    uy_loader = get_data_loader('uruguay', 'montevideo')
+    data = request.get_json(silent=True) or {}
+    
+    consumos = data.get('consumo_m3')
+    if not isinstance(consumos, list):
+        return jsonify({"success": False, "error": "consumo_m3 debe ser una lista de consumos"}), 400
+    
+    tarifas = data.get('tarifas')
+    try:
+        facturas = uy_loader.facturar_lote(
+            consumos,
+            categorias=data.get('categoria', 'Residencial'),
+            fechas=data.get('fecha'),
+            tarifas=tarifas
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"success": False, "error": str(e)}), 501
+    
     return jsonify({
         "success": True,
-        "data": tarifas,
-        "total": len(tarifas),
-        "source": "OSE - Datos reales" if tarifas else "Mock data"
+        "data": facturas,
+        "source": "Tarifario simulado" if tarifas is not None else "OSE - Datos reales"
     })
 
 @app.route('/api/uruguay/reportes', methods=['GET'])
 def get_reportes_montevideo():
     """Obtiene reportes ciudadanos de Montevideo"""
-    from data_loader import DataLoader
-    
-    uy_loader = DataLoader(pais='uruguay', ciudad='montevideo')
+    uy_loader = get_data_loader('uruguay', 'montevideo')
     
     barrio = request.args.get('barrio')
     categoria = request.args.get('categoria')
@@ -577,56 +1107,97 @@ def get_reportes_montevideo():
         estado=estado
     )
     
-    return jsonify({
-        "success": True,
-        "data": reportes,
-        "total": len(reportes),
-        "source": "Datos sintéticos Montevideo"
-    })
+    return _respuesta_lista(
+        uy_loader, reportes,
+        source="Datos sintéticos Montevideo"
+    )
+
+@app.route('/api/uruguay/reportes', methods=['POST'])
+def crear_reporte_montevideo():
+    """
+    Agrega un reporte ciudadano de Montevideo
+    Body: { categoria, descripcion, barrio, latitud, longitud, estado (opcional) }
+    """
+    return _crear_reporte(get_data_loader('uruguay', 'montevideo'))
+
+@app.route('/api/uruguay/reportes/<reporte_id>', methods=['PATCH'])
+def actualizar_reporte_montevideo(reporte_id):
+    """Cambia el estado de un reporte ciudadano de Montevideo. Body: { estado }"""
+    return _actualizar_estado_reporte(get_data_loader('uruguay', 'montevideo'), reporte_id)
 
 @app.route('/api/uruguay/interrupciones', methods=['GET'])
 def get_interrupciones_montevideo():
-    """Obtiene interrupciones de servicio en Montevideo"""
-    from data_loader import DataLoader
-    
-    uy_loader = DataLoader(pais='uruguay', ciudad='montevideo')
+    """
+    Obtiene interrupciones de servicio en Montevideo
+    Query params: barrio, activa_en (instante ISO), desde, hasta (ventana ISO),
+    limit, cursor, fields
+    """
+    uy_loader = get_data_loader('uruguay', 'montevideo')
     
     barrio = request.args.get('barrio')
-    limit = request.args.get('limit', type=int)
     
-    interrupciones = uy_loader.get_interrupciones_montevideo(barrio=barrio, limit=limit)
+    try:
+        interrupciones = uy_loader.get_interrupciones_montevideo(
+            barrio=barrio,
+            activa_en=request.args.get('activa_en'),
+            desde=request.args.get('desde'),
+            hasta=request.args.get('hasta')
+        )
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
     
-    return jsonify({
-        "success": True,
-        "data": interrupciones,
-        "total": len(interrupciones),
-        "source": "Datos sintéticos OSE"
-    })
+    return _respuesta_lista(
+        uy_loader, interrupciones,
+        source="Datos sintéticos OSE"
+    )
+
+@app.route('/api/uruguay/interrupciones/resumen', methods=['GET'])
+def get_resumen_interrupciones_montevideo():
+    """Horas, interrupciones y usuarios afectados por barrio, mes y motivo"""
+    return _respuesta_resumen_interrupciones(get_data_loader('uruguay', 'montevideo'))
+
+@app.route('/api/uruguay/mapa/<dataset>', methods=['GET'])
+def get_mapa_montevideo(dataset):
+    """Reportes o interrupciones de Montevideo dentro de un bbox o un radio"""
+    return _respuesta_mapa(get_data_loader('uruguay', 'montevideo'), dataset)
+
+@app.route('/api/uruguay/mapa/<dataset>/clusters', methods=['GET'])
+def get_clusters_montevideo(dataset):
+    """Clusters de reportes o interrupciones de Montevideo para un zoom"""
+    return _respuesta_clusters(get_data_loader('uruguay', 'montevideo'), dataset)
 
 @app.route('/api/uruguay/clima', methods=['GET'])
 def get_clima_montevideo():
-    """Obtiene datos climáticos de Montevideo"""
-    from data_loader import DataLoader
-    
-    uy_loader = DataLoader(pais='uruguay', ciudad='montevideo')
+    """
+    Obtiene datos climáticos de Montevideo
+    Query params: dias, desde, hasta (fechas ISO, inclusive)
+    """
+    uy_loader = get_data_loader('uruguay', 'montevideo')
     
-    dias = request.args.get('dias', 30, type=int)
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    dias = request.args.get('dias', None if desde or hasta else 30, type=int)
     
-    clima = uy_loader.get_clima_montevideo(dias=dias)
+    try:
+        clima = uy_loader.get_clima_montevideo(dias=dias, desde=desde, hasta=hasta)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
     
-    return jsonify({
-        "success": True,
-        "data": clima,
-        "total": len(clima),
-        "source": "INUMET - Datos reales" if clima else "Mock data"
-    })
+    return _respuesta_lista(
+        uy_loader, clima,
+        source="INUMET - Datos reales" if clima else "Mock data"
+    )
 
 @app.route('/api/uruguay/stats', methods=['GET'])
 def get_uruguay_stats():
     """Estadísticas generales de datos de Uruguay"""
-    from data_loader import DataLoader
-    
-    uy_loader = DataLoader(pais='uruguay', ciudad='montevideo')
+    uy_loader = get_data_loader('uruguay', 'montevideo')
     
     stats = uy_loader.get_stats_uruguay()
     
@@ -694,6 +1265,47 @@ def predecir_consumo():
             "error": str(e)
         }), 500
 
+@app.route('/api/ml/predecir-consumo-lote', methods=['POST'])
+def predecir_consumo_lote():
+    """
+    Predice consumo para muchos escenarios en una sola llamada
+    Body: { escenarios: [{ estrato, mes, precipitacion, temperatura }, ...] }
+    Los campos que falten toman los mismos valores por defecto que /api/ml/predecir-consumo.
+    """
+    data = request.get_json(silent=True) or {}
+    escenarios = data.get('escenarios')
+    if not isinstance(escenarios, list) or not all(isinstance(e, dict) for e in escenarios):
+        return jsonify({
+            "success": False,
+            "error": "escenarios debe ser una lista de objetos"
+        }), 400
+    
+    mes_actual = datetime.now().month
+    try:
+        consumos = predictor.predecir_consumo_lote(
+            [e.get('estrato', '3') for e in escenarios],
+            [e.get('mes', mes_actual) for e in escenarios],
+            [e.get('precipitacion', 150) for e in escenarios],
+            [e.get('temperatura', 22) for e in escenarios]
+        )
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+    
+    return jsonify({
+        "success": True,
+        "consumo_predicho_m3": consumos,
+        "total": len(consumos),
+        "modelo_ml_activo": predictor.ml_enabled
+    })
+
 @app.route('/api/ml/clasificar-riesgo', methods=['POST'])
 def clasificar_riesgo():
     """
@@ -0,0 +1,209 @@
+"""
+WaterWay - Almacenamiento columnar de datasets (NumPy)
+Guarda cada columna como un arreglo tipado en lugar de una lista de dicts
+"""
+from collections.abc import Sequence
+from datetime import datetime
+
+import numpy as np
+
+# Formatos de fecha reconocidos en los JSON procesados
+FORMATOS_FECHA = [
+    '%Y-%m-%d',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%d/%m/%Y',
+]
+
+# Máxima proporción de valores distintos para guardar un texto como categoría
+MAX_PROPORCION_CATEGORIAS = 0.5
+
+_AUSENTE = object()
+
+
+class Columna:
+    """
+    Una columna tipada.
+    tipo: 'entero', 'real', 'fecha', 'categoria', 'texto' u 'objeto'
+    """
+
+    def __init__(self, tipo, datos, categorias=None, formato=None, nulos=None, presentes=None):
+        self.tipo = tipo
+        self.datos = datos              # np.ndarray (códigos si es categoría)
+        self.categorias = categorias    # lista de valores si es categoría
+        self.formato = formato          # formato strftime si es fecha
+        self.nulos = nulos              # máscara de valores None (o None si no hay)
+        self.presentes = presentes      # máscara de claves presentes (o None si todas)
+
+    def valor(self, i):
+        """Valor Python nativo de la fila i"""
+        if self.nulos is not None and self.nulos[i]:
+            return None
+        v = self.datos[i]
+        if self.tipo == 'entero':
+            return int(v)
+        if self.tipo == 'real':
+            return float(v)
+        if self.tipo == 'fecha':
+            return v.item().strftime(self.formato)
+        if self.tipo == 'categoria':
+            return self.categorias[v]
+        return v
+
+    def nbytes(self):
+        """Memoria ocupada por los arreglos de la columna"""
+        total = self.datos.nbytes
+        for mascara in (self.nulos, self.presentes):
+            if mascara is not None:
+                total += mascara.nbytes
+        return total
+
+
+def _formato_fecha(valores):
+    """Formato común a todas las fechas, o None si no todas lo cumplen"""
+    for formato in FORMATOS_FECHA:
+        try:
+            if all(datetime.strptime(v, formato).strftime(formato) == v for v in valores):
+                return formato
+        except ValueError:
+            continue
+    return None
+
+
+def _construir_columna(valores):
+    """Infiere el tipo de una columna y la convierte a arreglos NumPy"""
+    n = len(valores)
+    presentes = np.array([v is not _AUSENTE for v in valores], dtype=bool)
+    valores = [None if v is _AUSENTE else v for v in valores]
+    nulos = np.array([v is None for v in valores], dtype=bool)
+    no_nulos = [v for v in valores if v is not None]
+
+    presentes = None if presentes.all() else presentes
+    nulos = nulos if nulos.any() else None
+    tipos = {type(v) for v in no_nulos}
+
+    if tipos == {int}:
+        if nulos is None:
+            datos = np.array(valores, dtype=np.int64)
+        else:
+            datos = np.array([np.nan if v is None else v for v in valores], dtype=np.float64)
+        return Columna('entero', datos, nulos=nulos, presentes=presentes)
+
+    if tipos == {float}:
+        datos = np.array([np.nan if v is None else v for v in valores], dtype=np.float64)
+        return Columna('real', datos, nulos=nulos, presentes=presentes)
+
+    if tipos == {str}:
+        unicos = list(dict.fromkeys(no_nulos))
+
+        formato = _formato_fecha(unicos)
+        if formato:
+            fechas = {v: datetime.strptime(v, formato) for v in unicos}
+            datos = np.array(
+                [np.datetime64('NaT') if v is None else fechas[v] for v in valores],
+                dtype='datetime64[us]'
+            )
+            return Columna('fecha', datos, formato=formato, nulos=nulos, presentes=presentes)
+
+        if len(unicos) <= max(1, n * MAX_PROPORCION_CATEGORIAS):
+            codigo = {v: i for i, v in enumerate(unicos)}
+            dtype = np.int8 if len(unicos) < 128 else np.int32
+            datos = np.array([0 if v is None else codigo[v] for v in valores], dtype=dtype)
+            return Columna('categoria', datos, categorias=unicos, nulos=nulos, presentes=presentes)
+
+        return Columna('texto', np.array(valores, dtype=object), nulos=nulos, presentes=presentes)
+
+    return Columna('objeto', np.array(valores + [None], dtype=object)[:-1], presentes=presentes)
+
+
+class TablaColumnar(Sequence):
+    """
+    Dataset en formato columnar.
+    Se comporta como una lista de dicts de solo lectura (len, índices,
+    slices, iteración) y además expone las columnas como arreglos NumPy
+    para agregaciones vectorizadas.
+    """
+
+    def __init__(self, registros):
+        self._n = len(registros)
+
+        claves = {}
+        for registro in registros:
+            for clave in registro:
+                claves.setdefault(clave, None)
+
+        self._columnas = {
+            clave: _construir_columna([r.get(clave, _AUSENTE) for r in registros])
+            for clave in claves
+        }
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._fila(j) for j in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError('índice fuera de rango')
+        return self._fila(i)
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self._fila(i)
+
+    def _fila(self, i):
+        """Reconstruye el registro i como dict"""
+        fila = {}
+        for clave, columna in self._columnas.items():
+            if columna.presentes is None or columna.presentes[i]:
+                fila[clave] = columna.valor(i)
+        return fila
+
+    def registros(self, posiciones=None):
+        """Lista de dicts para las posiciones indicadas (o todas)"""
+        if posiciones is None:
+            return list(self)
+        return [self._fila(i) for i in posiciones]
+
+    @property
+    def nombres(self):
+        """Nombres de las columnas"""
+        return list(self._columnas)
+
+    def tipo(self, nombre):
+        """Tipo inferido de una columna"""
+        return self._columnas[nombre].tipo
+
+    def columna(self, nombre):
+        """
+        Arreglo NumPy de la columna.
+        Números y fechas vienen tipados; las categorías se devuelven como
+        un arreglo object con los valores decodificados.
+        """
+        columna = self._columnas[nombre]
+        if columna.tipo == 'categoria':
+            return np.array(columna.categorias + [None], dtype=object)[:-1][columna.datos]
+        return columna.datos
+
+    def codigos(self, nombre):
+        """Códigos y categorías de una columna categórica"""
+        columna = self._columnas[nombre]
+        return columna.datos, columna.categorias
+
+    def nulos(self, nombre):
+        """Máscara de filas sin valor en la columna (ausente o None)"""
+        columna = self._columnas[nombre]
+        mascara = np.zeros(self._n, dtype=bool)
+        if columna.nulos is not None:
+            mascara |= columna.nulos
+        if columna.presentes is not None:
+            mascara |= ~columna.presentes
+        return mascara
+
+    def nbytes(self):
+        """Memoria aproximada ocupada por los arreglos"""
+        return sum(columna.nbytes() for columna in self._columnas.values())
+
@@ -0,0 +1,147 @@
+"""
+WaterWay - Cubo de impacto de interrupciones (área × mes × tipo)
+Normaliza una sola vez duración y usuarios afectados de cada interrupción
+(EPM guarda 'Horas' como texto y 'N. Inst' sin separador de miles) y
+acumula interrupciones, horas, usuarios y horas-usuario por celda.
+Los roll-ups sobre cualquier subconjunto de dimensiones se precalculan.
+"""
+from datetime import datetime
+from itertools import combinations
+
+from indices import parsear_fecha, parsear_horas, parsear_numero
+from normalizacion import clave_ubicacion
+
+# Dimensiones del cubo, en el orden en que se agrupan
+DIMENSIONES_CUBO = ('area', 'mes', 'tipo')
+
+# Valor de una dimensión que falta en el registro
+SIN_DATO = 'sin_dato'
+
+
+def _instalaciones(valor, en_miles):
+    """
+    Usuarios afectados. En EPM 'N. Inst' se exportó con punto de miles y quedó
+    como float (2.32 = 2.320 instalaciones): los valores con decimales se escalan.
+    """
+    numero = parsear_numero(valor)
+    if numero is None:
+        return 0
+    if en_miles and not numero.is_integer():
+        numero *= 1000
+    return int(round(numero))
+
+
+class CuboInterrupciones:
+    """
+    Cubo de interrupciones de un dataset.
+    campo_area/campo_tipo: campos que se usan como área (municipio, barrio) y tipo (impacto, motivo).
+    La duración sale de campo_horas; si no hay, de campo_inicio/campo_fin cuando ambos son
+    fechas válidas y el fin no es anterior al inicio. En EPM el Fin no es confiable (hay
+    cortes de 2 horas con Fin cinco meses después del Inicio).
+    """
+
+    def __init__(self, registros, campo_area, campo_tipo, campo_inicio, campo_fin=None,
+                 campo_horas=None, horas_en_dias=False, campo_usuarios=None, usuarios_en_miles=False):
+        self.total = 0
+        self.areas = {}         # clave canónica -> nombre como aparece en los datos
+        self._celdas = {}       # (área, mes, tipo) -> [interrupciones, horas, usuarios, horas-usuario]
+
+        for registro in registros:
+            inicio = parsear_fecha(registro.get(campo_inicio))
+            horas = parsear_horas(registro.get(campo_horas), horas_en_dias) if campo_horas else None
+            if horas is None and campo_fin:
+                fin = parsear_fecha(registro.get(campo_fin))
+                if inicio is not None and fin is not None and fin >= inicio:
+                    horas = (fin - inicio).total_seconds() / 3600
+            horas = max(horas or 0.0, 0.0)
+            usuarios = _instalaciones(registro.get(campo_usuarios), usuarios_en_miles) if campo_usuarios else 0
+
+            nombre_area = registro.get(campo_area)
+            area = clave_ubicacion(nombre_area) or SIN_DATO
+            if area != SIN_DATO:
+                self.areas.setdefault(area, str(nombre_area).strip())
+            mes = inicio.strftime('%Y-%m') if isinstance(inicio, datetime) else SIN_DATO
+            tipo = str(registro.get(campo_tipo) or '').strip() or SIN_DATO
+
+            celda = self._celdas.get((area, mes, tipo))
+            if celda is None:
+                celda = self._celdas[(area, mes, tipo)] = [0, 0.0, 0, 0.0]
+            celda[0] += 1
+            celda[1] += horas
+            celda[2] += usuarios
+            celda[3] += horas * usuarios
+            self.total += 1
+
+        # Roll-ups precalculados: subconjunto de dimensiones -> {claves: medidas}
+        self._rollups = {
+            por: self._agrupar(self._celdas.items(), por)
+            for n in range(len(DIMENSIONES_CUBO) + 1)
+            for por in combinations(DIMENSIONES_CUBO, n)
+        }
+
+    def __len__(self):
+        return len(self._celdas)
+
+    @staticmethod
+    def _agrupar(celdas, por):
+        indices = [DIMENSIONES_CUBO.index(d) for d in por]
+        grupos = {}
+        for clave, medidas in celdas:
+            grupo = tuple(clave[i] for i in indices)
+            acumulado = grupos.get(grupo)
+            if acumulado is None:
+                grupos[grupo] = list(medidas)
+            else:
+                for i, valor in enumerate(medidas):
+                    acumulado[i] += valor
+        return grupos
+
+    def consultar(self, por=('area', 'mes'), area=None, tipo=None, desde=None, hasta=None):
+        """
+        Corte del cubo agrupado por las dimensiones de `por`.
+        area/tipo filtran (área sin distinguir mayúsculas ni tildes);
+        desde/hasta son meses 'AAAA-MM' inclusive.
+        Retorna (grupos ordenados por sus claves, totales del corte).
+        """
+        desconocidas = [d for d in por if d not in DIMENSIONES_CUBO]
+        if desconocidas:
+            raise ValueError(f"No se puede agrupar por {', '.join(desconocidas)}. Opciones: {', '.join(DIMENSIONES_CUBO)}")
+        por = tuple(d for d in DIMENSIONES_CUBO if d in por)
+        for nombre, mes in (('desde', desde), ('hasta', hasta)):
+            if mes is not None and (len(mes) != 7 or parsear_fecha(f"{mes}-01") is None):
+                raise ValueError(f"{nombre} debe tener formato AAAA-MM")
+
+        if area is None and tipo is None and desde is None and hasta is None:
+            grupos = self._rollups[por]
+            totales = self._rollups[()].get((), [0, 0.0, 0, 0.0])
+        else:
+            clave_area = clave_ubicacion(area) if area else None
+            tipo = tipo.strip().casefold() if tipo else None
+            celdas = [
+                (clave, medidas) for clave, medidas in self._celdas.items()
+                if (clave_area is None or clave[0] == clave_area)
+                and (tipo is None or clave[2].casefold() == tipo)
+                and (desde is None or (clave[1] != SIN_DATO and clave[1] >= desde))
+                and (hasta is None or (clave[1] != SIN_DATO and clave[1] <= hasta))
+            ]
+            grupos = self._agrupar(celdas, por)
+            totales = self._agrupar(celdas, ()).get((), [0, 0.0, 0, 0.0])
+
+        resultado = []
+        for claves in sorted(grupos):
+            fila = {}
+            for dimension, valor in zip(por, claves):
+                fila[dimension] = self.areas.get(valor, valor) if dimension == 'area' else valor
+            fila.update(self._medidas(grupos[claves]))
+            resultado.append(fila)
+        return resultado, self._medidas(totales)
+
+    @staticmethod
+    def _medidas(valores):
+        interrupciones, horas, usuarios, horas_usuario = valores
+        return {
+            'interrupciones': interrupciones,
+            'horas': round(horas, 2),
+            'usuarios_afectados': usuarios,
+            'horas_usuario': round(horas_usuario, 2),
+        }
@@ -2,44 +2,326 @@
 WaterWay - Cargador de datos reales (Colombia y Uruguay)
 Carga y procesa los datos JSON generados en Google Colab
 """
+import hashlib
 import json
 import os
+import threading
+import time
+from datetime import datetime
+from functools import partial
 from pathlib import Path
 
+from anomalias import detector_desde_normalizado
+from cubo_interrupciones import CuboInterrupciones
+from indices import ClustersGrilla, IndiceEspacial, IndiceIntervalos, IndiceInvertido, SerieFechas, parsear_fecha
+from normalizacion import ESQUEMAS, DatasetNormalizado, clave_ubicacion
+from snapshot_binario import obtener_snapshot
+
+# Almacenamiento columnar opcional (requiere NumPy)
+try:
+    from columnar import TablaColumnar
+    COLUMNAR_AVAILABLE = True
+except ImportError:
+    TablaColumnar = None
+    COLUMNAR_AVAILABLE = False
+
+# Series de calidad de agua re-muestreadas (requiere NumPy)
+try:
+    from series_calidad import METRICAS, VENTANA_MOVIL, SeriesCalidad
+    SERIES_AVAILABLE = True
+except ImportError:
+    METRICAS, VENTANA_MOVIL, SeriesCalidad = (), 3, None
+    SERIES_AVAILABLE = False
+
+# Agregaciones vectorizadas de consumo (requiere NumPy)
+try:
+    from agregaciones import DIMENSIONES, PERCENTILES, SIN_DATO, AgregadorConsumo
+    AGREGACIONES_AVAILABLE = True
+except ImportError:
+    DIMENSIONES, PERCENTILES, SIN_DATO, AgregadorConsumo = (), (), None, None
+    AGREGACIONES_AVAILABLE = False
+
+# Facturación en lote sobre tarifas OSE (requiere NumPy)
+try:
+    from facturacion import TarifarioOSE, resumen_facturas
+    FACTURACION_AVAILABLE = True
+except ImportError:
+    TarifarioOSE, resumen_facturas = None, None
+    FACTURACION_AVAILABLE = False
+
 # Ruta base de datos
 DATA_DIR = Path(__file__).parent / 'data' / 'processed'
 
+# Datasets de cada país: atributo -> (archivo relativo a DATA_DIR, tipo vacío)
+DATASETS_COLOMBIA = {
+    'tarifas': ('tarifas.json', list),
+    'interrupciones': ('interrupciones.json', list),
+    'reportes': ('reportes.json', list),
+    'consumo': ('consumo.json', list),
+    'clima': ('clima.json', list),
+    'summary': ('summary.json', dict),
+}
+
+DATASETS_URUGUAY = {
+    'calidad_agua': ('montevideo/calidad_agua_real.json', list),
+    'clima_montevideo': ('montevideo/clima_real.json', list),
+    'tarifas_ose': ('montevideo/tarifas_ose.json', list),
+    'reportes_montevideo': ('montevideo/reportes_montevideo.json', list),
+    'interrupciones_montevideo': ('montevideo/interrupciones_montevideo.json', list),
+    'summary_montevideo': ('montevideo/summary_montevideo.json', dict),
+}
+
+def _minusculas(valor):
+    return (valor or '').lower()
+
+# Campos indexados por dataset: atributo -> {campo: normalizador}
+CAMPOS_INDEXADOS = {
+    'tarifas': {'Municipio': None, 'Estrato': str},
+    'interrupciones': {'Municipio': None},
+    'reportes': {'municipio': None, 'categoria': None, 'estado': None},
+    'consumo': {'estrato': str, 'municipio': None},
+    'tarifas_ose': {'categoria': _minusculas},
+    'reportes_montevideo': {'barrio': None, 'categoria': None, 'estado': None},
+    'interrupciones_montevideo': {'barrio': None},
+}
+
+# Campos que definen el intervalo de cada interrupción (ver IndiceIntervalos)
+INTERVALOS_INTERRUPCIONES = {
+    'interrupciones': {'campo_inicio': 'Inicio', 'campo_fin': 'Fin', 'campo_duracion_horas': 'Horas', 'horas_en_dias': True},
+    'interrupciones_montevideo': {'campo_inicio': 'fecha_inicio', 'campo_duracion_horas': 'duracion_horas'},
+}
+
+# Campos del cubo de impacto de cada dataset de interrupciones (ver CuboInterrupciones)
+CUBO_INTERRUPCIONES = {
+    'interrupciones': {
+        'campo_area': 'Municipio', 'campo_tipo': 'Impacto',
+        'campo_inicio': 'Inicio', 'campo_fin': 'Fin', 'campo_horas': 'Horas', 'horas_en_dias': True,
+        'campo_usuarios': 'N. Inst', 'usuarios_en_miles': True,
+    },
+    'interrupciones_montevideo': {
+        'campo_area': 'barrio', 'campo_tipo': 'motivo',
+        'campo_inicio': 'fecha_inicio', 'campo_horas': 'duracion_horas',
+        'campo_usuarios': 'usuarios_afectados',
+    },
+}
+
+# Datasets con latitud/longitud consultables por mapa: nombre público -> atributo
+DATASETS_GEOGRAFICOS = {
+    'colombia': {'reportes': 'reportes', 'interrupciones': 'interrupciones'},
+    'uruguay': {'reportes': 'reportes_montevideo', 'interrupciones': 'interrupciones_montevideo'},
+}
+
+# Estados válidos de un reporte ciudadano y prefijo de los ids generados
+ESTADOS_REPORTE = ('pendiente', 'en_proceso', 'resuelto')
+PREFIJOS_REPORTE = {'reportes': 'REP-', 'reportes_montevideo': 'REP-MVD-'}
+CAMPOS_REQUERIDOS_REPORTE = {
+    'reportes': ('categoria', 'descripcion', 'municipio'),
+    'reportes_montevideo': ('categoria', 'descripcion', 'barrio'),
+}
+
+# Campo por el que se desglosa cada cluster del mapa
+DESGLOSE_CLUSTERS = {
+    'reportes': 'categoria',
+    'interrupciones': 'Impacto',
+    'reportes_montevideo': 'categoria',
+    'interrupciones_montevideo': 'motivo',
+}
+
+# Zoom máximo aceptado para clusters (como los mapas web)
+ZOOM_MAXIMO = 22
+
+# Datasets que se guardan en formato columnar cuando está activado
+DATASETS_COLUMNARES = {
+    'tarifas', 'interrupciones', 'consumo', 'clima',
+    'calidad_agua', 'tarifas_ose', 'interrupciones_montevideo', 'clima_montevideo',
+}
+
+# WATERWAY_COLUMNAR=1 activa el almacenamiento columnar por defecto
+ALMACENAMIENTO_COLUMNAR = os.getenv('WATERWAY_COLUMNAR', '0') == '1'
+
+# Usa el snapshot binario compilado (data/processed.snap) si está al día con los JSON
+USAR_SNAPSHOT_BINARIO = os.getenv('WATERWAY_SNAPSHOT', '1') == '1'
+
+# Segundos entre verificaciones de cambios en disco (evita un stat por request)
+INTERVALO_VERIFICACION = 2.0
+
+# Segundos entre verificaciones del thread de recarga en segundo plano
+INTERVALO_RECARGA = 5.0
+
+class _Entrada:
+    """
+    Un dataset dentro de un snapshot, con su índice.
+    Se carga la primera vez que se usa: una sola vez y de forma thread-safe.
+    """
+    
+    def __init__(self, cargar=None, datos=None, indice=None):
+        self._cargar = cargar   # función que retorna (datos, indice, error)
+        self._lock = threading.Lock()
+        self._derivados_lock = threading.Lock()
+        self._derivados = {}    # clave -> (construir, estructura)
+        self.datos = datos
+        self.indice = indice
+        self.error = False
+        self.cargado = cargar is None
+    
+    def obtener(self):
+        """Carga el dataset si todavía no se cargó"""
+        if not self.cargado:
+            with self._lock:
+                if not self.cargado:
+                    self.datos, self.indice, self.error = self._cargar()
+                    self._cargar = None
+                    self.cargado = True
+        return self
+    
+    def derivado(self, clave, construir):
+        """
+        Estructura derivada del dataset (serie ordenada, índice espacial, ...).
+        Se construye una sola vez con construir(datos) y se reutiliza mientras
+        el archivo no cambie.
+        """
+        par = self._derivados.get(clave)
+        if par is None:
+            datos = self.obtener().datos
+            with self._derivados_lock:
+                par = self._derivados.get(clave)
+                if par is None:
+                    par = (construir, construir(datos))
+                    self._derivados[clave] = par
+        return par[1]
+    
+    def reconstruir_derivados(self, previa):
+        """Construye ya las estructuras derivadas que tenía la versión anterior del dataset"""
+        for clave, (construir, _) in list(previa._derivados.items()):
+            self.derivado(clave, construir)
+
+class DataSnapshot:
+    """
+    Estado inmutable de los datos de un país en un momento dado.
+    Al recargar se construye uno nuevo y se reemplaza la referencia completa,
+    así cada request trabaja siempre sobre un estado consistente.
+    Los datasets no deben modificarse una vez publicados: un alta o cambio
+    de reporte publica un snapshot nuevo (con_dataset) con otra revisión.
+    """
+    
+    def __init__(self, entradas, firma, revision=0):
+        self.entradas = entradas  # atributo -> _Entrada
+        self.firma = firma        # archivo -> (mtime_ns, tamaño)
+        self.revision = revision  # cambios en memoria publicados sobre los archivos
+        self.version = hashlib.sha1(repr((sorted(firma.items()), revision)).encode()).hexdigest()[:16]
+    
+    def con_dataset(self, nombre, entrada):
+        """Snapshot nuevo igual a este salvo por un dataset"""
+        return DataSnapshot({**self.entradas, nombre: entrada}, self.firma, self.revision + 1)
+    
+    def dataset(self, nombre):
+        """Registros de un dataset (lo carga si es necesario)"""
+        return self.entradas[nombre].obtener().datos
+    
+    def indice(self, nombre):
+        """Índice invertido de un dataset (lo carga si es necesario)"""
+        return self.entradas[nombre].obtener().indice
+    
+    def derivado(self, nombre, clave, construir):
+        """Estructura derivada de un dataset (ver _Entrada.derivado)"""
+        return self.entradas[nombre].derivado(clave, construir)
+    
+    def precargar(self):
+        """Carga todos los datasets que falten"""
+        for entrada in self.entradas.values():
+            entrada.obtener()
+
+def _como_lista(data):
+    """Lista de registros de un dataset (materializa las tablas columnares)"""
+    return data if isinstance(data, list) else list(data)
+
+def _dataset(nombre):
+    """Atributo de solo lectura que apunta al dataset del snapshot actual"""
+    return property(lambda self: self._snapshot.dataset(nombre))
+
 class DataLoader:
     """Carga y gestiona datos reales de múltiples países"""
     
-    def __init__(self, pais='colombia', ciudad=None):
+    # Datos de Colombia (EPM Medellín)
+    tarifas = _dataset('tarifas')
+    interrupciones = _dataset('interrupciones')
+    reportes = _dataset('reportes')
+    consumo = _dataset('consumo')
+    clima = _dataset('clima')
+    summary = _dataset('summary')
+    
+    # Datos de Uruguay (OSE Montevideo)
+    calidad_agua = _dataset('calidad_agua')
+    tarifas_ose = _dataset('tarifas_ose')
+    reportes_montevideo = _dataset('reportes_montevideo')
+    interrupciones_montevideo = _dataset('interrupciones_montevideo')
+    clima_montevideo = _dataset('clima_montevideo')
+    summary_montevideo = _dataset('summary_montevideo')
+    
+    def __init__(self, pais='colombia', ciudad=None, columnar=None):
         """
         Inicializa el cargador de datos
         pais: 'colombia' o 'uruguay'
         ciudad: 'medellin' o 'montevideo' (para datos específicos)
+        columnar: guarda los datasets numéricos como arreglos NumPy
+                  (por defecto según WATERWAY_COLUMNAR)
         """
         self.pais = pais.lower()
         self.ciudad = ciudad.lower() if ciudad else None
         
-        # Datos de Colombia (EPM Medellín)
-        self.tarifas = []
-        self.interrupciones = []
-        self.reportes = []
-        self.consumo = []
-        self.clima = []
-        self.summary = {}
-        
-        # Datos de Uruguay (OSE Montevideo)
-        self.calidad_agua = []
-        self.tarifas_ose = []
-        self.reportes_montevideo = []
-        self.interrupciones_montevideo = []
-        self.clima_montevideo = []
-        self.summary_montevideo = {}
+        self.columnar = ALMACENAMIENTO_COLUMNAR if columnar is None else columnar
+        if self.columnar and not COLUMNAR_AVAILABLE:
+            print("[!] NumPy no disponible, usando almacenamiento en listas")
+            self.columnar = False
+        
+        # Último detector de anomalías de calidad de agua (se continúa al recargar)
+        self._detector_anomalias = None
+        self._anomalias_lock = threading.Lock()
+        
+        # Recarga en caliente
+        self._recarga_lock = threading.Lock()
+        self._hilo_recarga = None
+        self._detener_recarga = threading.Event()
+        self._ultima_verificacion = time.monotonic()
         
         # Intenta cargar los datos
         self._load_all()
     
+    @property
+    def version(self):
+        """Versión de los datos servidos: cambia cuando cambian los archivos"""
+        return self._snapshot.version
+    
+    def _datasets(self):
+        """Datasets que usa este cargador: atributo -> (archivo, tipo vacío)"""
+        if self.pais == 'uruguay' and self.ciudad == 'montevideo':
+            return DATASETS_URUGUAY
+        if self.pais == 'colombia':
+            return DATASETS_COLOMBIA
+        return {}
+    
+    def _firma_archivos(self):
+        """Firma (mtime, tamaño) de los archivos de datos, para detectar cambios"""
+        firma = {}
+        for filename, _ in self._datasets().values():
+            try:
+                st = os.stat(DATA_DIR / filename)
+                firma[filename] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                firma[filename] = (None, None)
+        return firma
+    
+    def archivos_modificados(self):
+        """
+        Indica si algún archivo cambió en disco desde la carga.
+        Verifica como máximo una vez cada INTERVALO_VERIFICACION segundos.
+        """
+        ahora = time.monotonic()
+        if ahora - self._ultima_verificacion < INTERVALO_VERIFICACION:
+            return False
+        self._ultima_verificacion = ahora
+        return self._firma_archivos() != self._snapshot.firma
+    
     def _load_json(self, filename):
         """Carga un archivo JSON"""
         filepath = DATA_DIR / filename
@@ -56,85 +338,326 @@ class DataLoader:
             print(f"[ERROR] Error cargando {filename}: {e}")
             return None
     
+    def _load_dataset(self, filename, firma):
+        """Carga un dataset desde el snapshot binario si está vigente, si no desde el JSON"""
+        if USAR_SNAPSHOT_BINARIO:
+            compilado = obtener_snapshot()
+            if compilado is not None and compilado.vigente(filename, firma, DATA_DIR / filename):
+                try:
+                    data = compilado.cargar(filename)
+                    print(f"[OK] {filename} cargado (snapshot): {len(data) if isinstance(data, list) else 'OK'} registros")
+                    return data
+                except Exception as e:
+                    print(f"[!] Error leyendo {filename} del snapshot, usando JSON: {e}")
+        
+        return self._load_json(filename)
+    
     def _load_all(self):
-        """Carga todos los archivos de datos según el país"""
+        """Prepara el snapshot inicial; cada dataset se carga al usarse por primera vez"""
+        self._snapshot = self._construir_snapshot(self._firma_archivos())
+    
+    def preload(self):
+        """Carga todos los datasets ahora (para servidores que quieren arrancar con todo listo)"""
         print("\n" + "="*60)
         
         if self.pais == 'uruguay' and self.ciudad == 'montevideo':
             print("CARGANDO DATOS REALES DE URUGUAY (OSE MONTEVIDEO)")
-            print("="*60)
-            self._load_uruguay_data()
         elif self.pais == 'colombia':
             print("CARGANDO DATOS REALES DE EPM")
-            print("="*60)
-            self._load_colombia_data()
         else:
             print(f"CARGANDO DATOS PARA {self.pais.upper()}")
-            print("="*60)
+        print("="*60)
+        
+        self._snapshot.precargar()
+        
+        # Normaliza al cargar, así las filas con problemas se informan ahora
+        for nombre in ESQUEMAS:
+            if nombre in self._datasets():
+                self._normalizado(nombre)
+        
+        if self.pais == 'uruguay' and self.ciudad == 'montevideo':
+            if self.has_uruguay_data():
+                print("OK - Datos reales de Uruguay cargados exitosamente")
+            else:
+                print("AVISO - Usando datos mock")
+        elif self.pais == 'colombia':
+            if self.has_data():
+                print("OK - Datos reales de EPM cargados exitosamente")
+            else:
+                print("AVISO - Usando datos mock")
+        else:
             print("[!] Datos no disponibles, usando mock")
         
         print("="*60 + "\n")
+        return self
     
-    def _load_colombia_data(self):
-        """Carga datos de Colombia (EPM Medellín)"""
-        self.tarifas = self._load_json('tarifas.json') or []
-        self.interrupciones = self._load_json('interrupciones.json') or []
-        self.reportes = self._load_json('reportes.json') or []
-        self.consumo = self._load_json('consumo.json') or []
-        self.clima = self._load_json('clima.json') or []
-        self.summary = self._load_json('summary.json') or {}
-        
-        if self.has_data():
-            print("OK - Datos reales de EPM cargados exitosamente")
-        else:
-            print("AVISO - Usando datos mock")
+    def _cargar_dataset(self, nombre, filename, tipo, firma):
+        """Carga un dataset y construye su índice. Retorna (datos, indice, error)"""
+        data = self._load_dataset(filename, firma)
+        error = data is None and firma != (None, None)
+        datos = data or tipo()
+        
+        if self.columnar and nombre in DATASETS_COLUMNARES and datos:
+            datos = TablaColumnar(datos)
+        
+        indice = IndiceInvertido(datos, CAMPOS_INDEXADOS[nombre]) if nombre in CAMPOS_INDEXADOS else None
+        return datos, indice, error
     
-    def _load_uruguay_data(self):
-        """Carga datos de Uruguay (OSE Montevideo)"""
-        mvd_dir = 'montevideo'
+    def _construir_snapshot(self, firma, anterior=None, reutilizar=True):
+        """
+        Construye un snapshot nuevo a partir de los archivos en disco.
+        Con el snapshot anterior:
+          - reutiliza los datasets cuyos archivos no cambiaron (si reutilizar=True)
+          - los datasets que ya estaban cargados se vuelven a cargar en el momento,
+            fuera del request path; el resto queda para cargarse al usarse
+        """
+        entradas = {}
+        for datasets in (DATASETS_COLOMBIA, DATASETS_URUGUAY):
+            for nombre, (_, tipo) in datasets.items():
+                campos = CAMPOS_INDEXADOS.get(nombre)
+                entradas[nombre] = _Entrada(datos=tipo(), indice=IndiceInvertido([], campos) if campos else None)
+        firma = dict(firma)
         
-        self.calidad_agua = self._load_json(f'{mvd_dir}/calidad_agua_real.json') or []
-        self.clima_montevideo = self._load_json(f'{mvd_dir}/clima_real.json') or []
-        self.tarifas_ose = self._load_json(f'{mvd_dir}/tarifas_ose.json') or []
-        self.reportes_montevideo = self._load_json(f'{mvd_dir}/reportes_montevideo.json') or []
-        self.interrupciones_montevideo = self._load_json(f'{mvd_dir}/interrupciones_montevideo.json') or []
-        self.summary_montevideo = self._load_json(f'{mvd_dir}/summary_montevideo.json') or {}
+        for nombre, (filename, tipo) in self._datasets().items():
+            previa = anterior.entradas[nombre] if anterior is not None else None
+            
+            if reutilizar and previa is not None and anterior.firma.get(filename) == firma[filename]:
+                entradas[nombre] = previa
+                continue
+            
+            entrada = _Entrada(cargar=partial(self._cargar_dataset, nombre, filename, tipo, firma[filename]))
+            
+            if previa is not None and previa.cargado:
+                entrada.obtener()
+                if entrada.error:
+                    # Archivo presente pero ilegible (p.ej. a medio escribir):
+                    # se conserva la versión anterior y se reintenta en la próxima verificación
+                    entrada = previa
+                    firma[filename] = anterior.firma.get(filename)
+                else:
+                    entrada.reconstruir_derivados(previa)
+            
+            entradas[nombre] = entrada
         
-        if self.has_uruguay_data():
-            print("OK - Datos reales de Uruguay cargados exitosamente")
+        # Los reportes agregados en memoria solo sobreviven si se reutilizó su entrada;
+        # si una recarga forzada los descarta, la versión tiene que cambiar igual
+        revision = 0
+        if anterior is not None and anterior.revision:
+            revision = anterior.revision if reutilizar else anterior.revision + 1
+        return DataSnapshot(entradas, firma, revision)
+    
+    # ========== RECARGA EN CALIENTE ==========
+    
+    def recargar(self, forzar=False):
+        """
+        Vuelve a leer los archivos que cambiaron y publica un snapshot nuevo.
+        El parseo se hace aparte: los requests en curso siguen usando el
+        snapshot anterior hasta que se reemplaza la referencia (asignación atómica).
+        Retorna True si se publicó una versión nueva.
+        """
+        with self._recarga_lock:
+            anterior = self._snapshot
+            firma = self._firma_archivos()
+            
+            if not forzar and firma == anterior.firma:
+                return False
+            
+            nuevo = self._construir_snapshot(firma, anterior=anterior, reutilizar=not forzar)
+            self._snapshot = nuevo
+            
+            if nuevo.version == anterior.version:
+                return False
+            
+            print(f"[OK] Datos recargados ({self.pais}): versión {nuevo.version}")
+            return True
+    
+    @property
+    def recarga_automatica(self):
+        """Indica si el thread de recarga en segundo plano está activo"""
+        return self._hilo_recarga is not None and self._hilo_recarga.is_alive()
+    
+    def iniciar_recarga_automatica(self, intervalo=INTERVALO_RECARGA):
+        """Inicia un thread que detecta cambios en data/processed/ y recarga en segundo plano"""
+        if self.recarga_automatica:
+            return
+        
+        self._detener_recarga.clear()
+        self._hilo_recarga = threading.Thread(
+            target=self._ciclo_recarga,
+            args=(intervalo,),
+            name=f"recarga-datos-{self.pais}",
+            daemon=True
+        )
+        self._hilo_recarga.start()
+    
+    def detener_recarga_automatica(self):
+        """Detiene el thread de recarga en segundo plano"""
+        self._detener_recarga.set()
+        if self._hilo_recarga is not None:
+            self._hilo_recarga.join()
+            self._hilo_recarga = None
+    
+    def _ciclo_recarga(self, intervalo):
+        """Bucle del thread de recarga"""
+        while not self._detener_recarga.wait(intervalo):
+            try:
+                self.recargar()
+            except Exception as e:
+                print(f"[ERROR] Error recargando datos ({self.pais}): {e}")
+    
+    def _filtrar(self, nombre, **criterios):
+        """Filtra un dataset intersectando las listas de sus índices"""
+        snapshot = self._snapshot
+        data = snapshot.dataset(nombre)
+        criterios = {campo: valor for campo, valor in criterios.items() if valor}
+        
+        if not criterios:
+            return _como_lista(data)
+        
+        posiciones = snapshot.indice(nombre).posiciones(**criterios)
+        if isinstance(data, list):
+            return [data[pos] for pos in posiciones]
+        return data.registros(posiciones)
+    
+    def _intervalos(self, nombre):
+        """Árbol de intervalos de un dataset de interrupciones (se construye una vez por versión)"""
+        campos = INTERVALOS_INTERRUPCIONES[nombre]
+        return self._snapshot.derivado(nombre, 'intervalos', lambda datos: IndiceIntervalos(datos, **campos))
+    
+    def _filtrar_intervalos(self, nombre, activa_en=None, desde=None, hasta=None, **criterios):
+        """
+        Registros cuyo intervalo está activo en activa_en o se superpone con [desde, hasta],
+        ordenados por inicio y combinados con los filtros del índice invertido
+        """
+        snapshot = self._snapshot
+        data = snapshot.dataset(nombre)
+        intervalos = self._intervalos(nombre)
+        
+        if activa_en:
+            posiciones = intervalos.activos_en(activa_en)
         else:
-            print("AVISO - Usando datos mock")
+            posiciones = intervalos.superpuestos(desde, hasta)
+        
+        criterios = {campo: valor for campo, valor in criterios.items() if valor}
+        if criterios:
+            indice = snapshot.indice(nombre)
+            posiciones = [
+                pos for pos in posiciones
+                if all(indice.contiene(campo, valor, pos) for campo, valor in criterios.items())
+            ]
+        
+        if isinstance(data, list):
+            return [data[pos] for pos in posiciones]
+        return data.registros(posiciones)
+    
+    def get_resumen_interrupciones(self, agrupar_por=('area', 'mes'), area=None, tipo=None, desde=None, hasta=None):
+        """
+        Horas de interrupción, interrupciones y usuarios afectados por área, mes y tipo
+        (municipio e impacto en EPM, barrio y motivo en Montevideo).
+        Retorna (grupos, totales, campos de origen de área y tipo).
+        """
+        nombre = 'interrupciones_montevideo' if self.pais == 'uruguay' else 'interrupciones'
+        campos = CUBO_INTERRUPCIONES[nombre]
+        cubo = self._snapshot.derivado(
+            nombre, 'cubo', lambda datos: CuboInterrupciones(_como_lista(datos), **campos)
+        )
+        grupos, totales = cubo.consultar(agrupar_por, area=area, tipo=tipo, desde=desde, hasta=hasta)
+        return grupos, totales, {'area': campos['campo_area'], 'tipo': campos['campo_tipo']}
+    
+    def _espacial(self, nombre):
+        """Grilla espacial de un dataset (se construye una vez por versión)"""
+        return self._snapshot.derivado(nombre, 'espacial', IndiceEspacial)
+    
+    def datasets_geograficos(self):
+        """Nombres públicos de los datasets consultables por mapa"""
+        return list(DATASETS_GEOGRAFICOS.get(self.pais, {}))
+    
+    def get_puntos(self, dataset, bbox=None, lat=None, lon=None, radio_km=None, limit=None):
+        """
+        Registros de un dataset geográfico ('reportes' o 'interrupciones')
+        bbox: (minLon, minLat, maxLon, maxLat); resultado en el orden del dataset
+        lat/lon/radio_km: círculo; resultado del más cercano al más lejano, con distancia_km
+        Retorna None si el dataset no existe para el país.
+        """
+        nombre = DATASETS_GEOGRAFICOS.get(self.pais, {}).get(dataset)
+        if nombre is None:
+            return None
+        
+        snapshot = self._snapshot
+        data = snapshot.dataset(nombre)
+        espacial = self._espacial(nombre)
+        
+        if radio_km is not None:
+            if lat is None or lon is None:
+                raise ValueError("La búsqueda por radio requiere lat y lon")
+            cercanos = espacial.en_radio(lat, lon, radio_km)
+            if limit:
+                cercanos = cercanos[:limit]
+            return [
+                {**data[pos], 'distancia_km': round(distancia, 3)}
+                for pos, distancia in cercanos
+            ]
+        
+        if bbox is None:
+            raise ValueError("Se requiere bbox o lat, lon y radio_km")
+        
+        posiciones = espacial.en_rectangulo(*bbox)
+        if limit:
+            posiciones = posiciones[:limit]
+        if isinstance(data, list):
+            return [data[pos] for pos in posiciones]
+        return data.registros(posiciones)
+    
+    def get_clusters(self, dataset, zoom, bbox=None):
+        """
+        Clusters de un dataset geográfico para un nivel de zoom
+        Se calculan una vez por zoom y versión de los datos; bbox recorta al viewport.
+        Retorna None si el dataset no existe para el país.
+        """
+        nombre = DATASETS_GEOGRAFICOS.get(self.pais, {}).get(dataset)
+        if nombre is None:
+            return None
+        if not 0 <= zoom <= ZOOM_MAXIMO:
+            raise ValueError(f"zoom debe estar entre 0 y {ZOOM_MAXIMO}")
+        
+        clusters = self._snapshot.derivado(
+            nombre, ('clusters', zoom),
+            lambda datos: ClustersGrilla(datos, zoom, DESGLOSE_CLUSTERS.get(nombre))
+        )
+        
+        if bbox is None:
+            return clusters.clusters
+        return clusters.en_rectangulo(*bbox)
     
     def has_data(self):
         """Verifica si hay datos cargados (Colombia)"""
-        return len(self.tarifas) > 0 or len(self.reportes) > 0
+        snapshot = self._snapshot
+        return len(snapshot.dataset('tarifas')) > 0 or len(snapshot.dataset('reportes')) > 0
     
     def has_uruguay_data(self):
         """Verifica si hay datos cargados de Uruguay"""
-        return (len(self.calidad_agua) > 0 or 
-                len(self.tarifas_ose) > 0 or 
-                len(self.reportes_montevideo) > 0)
+        snapshot = self._snapshot
+        return (len(snapshot.dataset('calidad_agua')) > 0 or 
+                len(snapshot.dataset('tarifas_ose')) > 0 or 
+                len(snapshot.dataset('reportes_montevideo')) > 0)
     
     # ========== MÉTODOS PARA COLOMBIA (EPM) ==========
     
     def get_tarifas(self, municipio=None, estrato=None):
         """Obtiene tarifas filtradas"""
-        data = self.tarifas
-        
-        if municipio:
-            data = [t for t in data if t.get('Municipio') == municipio]
-        
-        if estrato:
-            data = [t for t in data if str(t.get('Estrato')) == str(estrato)]
-        
-        return data
+        return self._filtrar('tarifas', Municipio=municipio, Estrato=estrato)
     
-    def get_interrupciones(self, municipio=None, limit=None):
-        """Obtiene interrupciones filtradas"""
-        data = self.interrupciones
-        
-        if municipio:
-            data = [i for i in data if i.get('Municipio') == municipio]
+    def get_interrupciones(self, municipio=None, limit=None, activa_en=None, desde=None, hasta=None):
+        """
+        Obtiene interrupciones filtradas
+        activa_en: instante ISO; solo las interrupciones en curso en ese momento
+        desde/hasta: ventana ISO; las interrupciones que se superponen con ella
+        Con filtros de tiempo el resultado se ordena por fecha de inicio.
+        """
+        if activa_en or desde or hasta:
+            data = self._filtrar_intervalos('interrupciones', activa_en, desde, hasta, Municipio=municipio)
+        else:
+            data = self._filtrar('interrupciones', Municipio=municipio)
         
         if limit:
             data = data[:limit]
@@ -143,33 +666,34 @@ class DataLoader:
     
     def get_reportes(self, municipio=None, categoria=None, estado=None):
         """Obtiene reportes filtrados"""
-        data = self.reportes
-        
-        if municipio:
-            data = [r for r in data if r.get('municipio') == municipio]
-        
-        if categoria:
-            data = [r for r in data if r.get('categoria') == categoria]
-        
-        if estado:
-            data = [r for r in data if r.get('estado') == estado]
-        
-        return data
+        return self._filtrar('reportes', municipio=municipio, categoria=categoria, estado=estado)
     
     def get_consumo(self, estrato=None, municipio=None):
         """Obtiene datos de consumo filtrados"""
-        data = self.consumo
-        
-        if estrato:
-            data = [c for c in data if str(c.get('estrato')) == str(estrato)]
-        
-        if municipio:
-            data = [c for c in data if c.get('municipio') == municipio]
-        
-        return data
+        return self._filtrar('consumo', estrato=estrato, municipio=municipio)
+    
+    def _agregador_consumo(self):
+        return self._snapshot.derivado('consumo', 'agregador', AgregadorConsumo)
+    
+    def agregar_consumo(self, agrupar_por=('estrato',), percentiles=PERCENTILES, estrato=None, municipio=None):
+        """
+        Estadísticas de consumo agrupadas (conteo, suma, promedio, mediana y percentiles)
+        agrupar_por: dimensiones entre estrato, municipio, mes, trimestre y anio
+        """
+        if not AGREGACIONES_AVAILABLE:
+            raise RuntimeError("NumPy no disponible para agregar consumo")
+        return self._agregador_consumo().agrupar(agrupar_por, percentiles, estrato=estrato, municipio=municipio)
     
     def get_consumo_por_estrato(self, municipio='Medellín'):
         """Calcula consumo promedio por estrato"""
+        if AGREGACIONES_AVAILABLE:
+            grupos = self.agregar_consumo(('estrato',), (), municipio=municipio or None)
+            # Sin estrato la clave sigue siendo 'None', como en el cálculo por registros (str(None))
+            return {
+                'None' if g['estrato'] == SIN_DATO else g['estrato']: {'promedio': g['promedio'], 'total': g['conteo']}
+                for g in grupos
+            }
+        
         consumos = self.get_consumo(municipio=municipio)
         
         if not consumos:
@@ -195,112 +719,319 @@ class DataLoader:
         
         return result
     
-    def get_clima_reciente(self, dias=30):
-        """Obtiene datos climáticos recientes"""
-        data = self.clima
-        
-        if not data:
-            return []
-        
-        # Ordena por fecha descendente y toma los últimos N días
-        sorted_data = sorted(data, key=lambda x: x.get('fecha', ''), reverse=True)
-        return sorted_data[:dias]
+    def _serie_clima(self, nombre):
+        """Serie de clima ordenada por fecha (se construye una vez por versión del archivo)"""
+        return self._snapshot.derivado(nombre, 'serie_fechas', lambda datos: SerieFechas(datos, 'fecha'))
+    
+    def get_clima_reciente(self, dias=30, desde=None, hasta=None):
+        """
+        Obtiene datos climáticos, del más reciente al más antiguo
+        dias: máximo de días (los más recientes); None = sin límite
+        desde/hasta: rango de fechas ISO (inclusive)
+        """
+        return self._serie_clima('clima').rango(desde=desde, hasta=hasta, limite=dias)
     
     def get_stats(self):
         """Obtiene estadísticas generales"""
         if self.pais == 'uruguay':
             return self.get_stats_uruguay()
         
+        snapshot = self._snapshot
+        reportes = snapshot.indice('reportes')
+        
         return {
-            'tarifas': len(self.tarifas),
-            'interrupciones': len(self.interrupciones),
+            'tarifas': len(snapshot.dataset('tarifas')),
+            'interrupciones': len(snapshot.dataset('interrupciones')),
             'reportes': {
-                'total': len(self.reportes),
-                'pendientes': len([r for r in self.reportes if r.get('estado') == 'pendiente']),
-                'en_proceso': len([r for r in self.reportes if r.get('estado') == 'en_proceso']),
-                'resueltos': len([r for r in self.reportes if r.get('estado') == 'resuelto'])
+                'total': len(snapshot.dataset('reportes')),
+                'pendientes': reportes.conteo('estado', 'pendiente'),
+                'en_proceso': reportes.conteo('estado', 'en_proceso'),
+                'resueltos': reportes.conteo('estado', 'resuelto')
             },
-            'consumo_registros': len(self.consumo),
-            'clima_registros': len(self.clima),
-            'municipios': list(set([t.get('Municipio') for t in self.tarifas if t.get('Municipio')]))
+            'consumo_registros': len(snapshot.dataset('consumo')),
+            'clima_registros': len(snapshot.dataset('clima')),
+            'municipios': [m for m in snapshot.indice('tarifas').valores('Municipio') if m]
         }
     
+    # ========== ALTAS Y CAMBIOS DE REPORTES ==========
+    
+    def _dataset_reportes(self):
+        """Dataset de reportes ciudadanos del país y prefijo de sus ids"""
+        nombre = DATASETS_GEOGRAFICOS.get(self.pais, DATASETS_GEOGRAFICOS['colombia'])['reportes']
+        return nombre, PREFIJOS_REPORTE[nombre]
+    
+    def agregar_reporte(self, reporte):
+        """
+        Agrega un reporte ciudadano y publica un snapshot nuevo (copy-on-write):
+        el índice y los conteos se ajustan con el registro nuevo sin recontar.
+        Los reportes agregados se pierden si su archivo cambia y se recarga.
+        Retorna el reporte con id, fecha y estado.
+        """
+        nombre, prefijo = self._dataset_reportes()
+        faltantes = [campo for campo in CAMPOS_REQUERIDOS_REPORTE[nombre] if not reporte.get(campo)]
+        if faltantes:
+            raise ValueError(f"Faltan campos del reporte: {', '.join(faltantes)}")
+        estado = reporte.get('estado') or 'pendiente'
+        if estado not in ESTADOS_REPORTE:
+            raise ValueError(f"Estado inválido: {estado}. Opciones: {', '.join(ESTADOS_REPORTE)}")
+        
+        with self._recarga_lock:
+            anterior = self._snapshot
+            entrada = anterior.entradas[nombre].obtener()
+            datos = _como_lista(entrada.datos)
+            ids = {r.get('id') for r in datos}
+            numero = len(datos) + 1
+            while f"{prefijo}{numero:04d}" in ids:
+                numero += 1
+            
+            reporte = {
+                **reporte,
+                'id': f"{prefijo}{numero:04d}",
+                'fecha': reporte.get('fecha') or datetime.now().isoformat(),
+                'estado': estado,
+            }
+            nueva = _Entrada(datos=datos + [reporte], indice=entrada.indice.con_registro(len(datos), reporte))
+            self._snapshot = anterior.con_dataset(nombre, nueva)
+        
+        return reporte
+    
+    def actualizar_estado_reporte(self, reporte_id, estado):
+        """
+        Cambia el estado de un reporte publicando un snapshot nuevo (copy-on-write).
+        Retorna el reporte actualizado o None si no existe.
+        """
+        if estado not in ESTADOS_REPORTE:
+            raise ValueError(f"Estado inválido: {estado}. Opciones: {', '.join(ESTADOS_REPORTE)}")
+        nombre, _ = self._dataset_reportes()
+        
+        with self._recarga_lock:
+            anterior = self._snapshot
+            entrada = anterior.entradas[nombre].obtener()
+            datos = _como_lista(entrada.datos)
+            pos = next((i for i, r in enumerate(datos) if r.get('id') == reporte_id), None)
+            if pos is None:
+                return None
+            
+            reporte = {**datos[pos], 'estado': estado}
+            indice = entrada.indice.con_cambio(pos, 'estado', datos[pos].get('estado'), estado)
+            datos = list(datos)
+            datos[pos] = reporte
+            self._snapshot = anterior.con_dataset(nombre, _Entrada(datos=datos, indice=indice))
+        
+        return reporte
+    
     # ========== MÉTODOS PARA URUGUAY (OSE) ==========
     
+    def _normalizado(self, nombre, snapshot=None):
+        """Vista tipada de un dataset según su esquema (se construye una vez por versión)"""
+        esquema = ESQUEMAS[nombre]
+        return (snapshot or self._snapshot).derivado(nombre, 'normalizado', lambda datos: DatasetNormalizado(datos, esquema, nombre))
+    
     def get_calidad_agua(self, ubicacion=None, fecha=None):
-        """Obtiene datos de calidad de agua de Montevideo"""
-        data = self.calidad_agua
+        """
+        Obtiene datos de calidad de agua de Montevideo
+        ubicacion: policlínica (sin distinguir mayúsculas ni tildes)
+        fecha: prefijo 'AAAA', 'AAAA-MM' o 'AAAA-MM-DD'
+        """
+        data = self._snapshot.dataset('calidad_agua')
         
-        if ubicacion:
-            data = [c for c in data if c.get('Policlinica') == ubicacion or c.get('ubicacion') == ubicacion]
+        if not ubicacion and not fecha:
+            return _como_lista(data)
         
-        if fecha:
-            data = [c for c in data if c.get('Fecha', '').startswith(fecha) or c.get('fecha', '').startswith(fecha)]
+        posiciones = self._normalizado('calidad_agua').filtrar(ubicacion=ubicacion, fecha=fecha)
         
-        return data
+        if posiciones is None:
+            # Prefijo de fecha no estándar: compara el texto original
+            data = self.get_calidad_agua(ubicacion=ubicacion)
+            return [c for c in data if (c.get('Fecha') or c.get('fecha') or '').startswith(fecha)]
+        
+        if isinstance(data, list):
+            return [data[pos] for pos in posiciones]
+        return data.registros(posiciones)
     
-    def get_tarifas_ose(self, categoria=None):
-        """Obtiene tarifas de OSE Uruguay"""
-        data = self.tarifas_ose
+    def get_serie_calidad_agua(self, ubicacion=None, frecuencia='mensual', ventana=VENTANA_MOVIL, metricas=None):
+        """
+        Serie re-muestreada de calidad de agua (promedio, min, max, p95 y promedio móvil)
+        ubicacion: policlínica (None = todas juntas)
+        frecuencia: 'diaria', 'semanal' o 'mensual'
+        metricas: lista de métricas a incluir (por defecto todas)
+        Retorna None si la ubicación no existe.
+        """
+        if not SERIES_AVAILABLE:
+            raise RuntimeError("NumPy no disponible para calcular series")
         
-        if categoria:
-            data = [t for t in data if t.get('categoria', '').lower() == categoria.lower()]
+        metricas = list(metricas or METRICAS)
+        desconocidas = [m for m in metricas if m not in METRICAS]
+        if desconocidas:
+            raise ValueError(f"Métricas desconocidas: {', '.join(desconocidas)}. Opciones: {', '.join(METRICAS)}")
         
-        return data
-    
-    def get_reportes_montevideo(self, barrio=None, categoria=None, estado=None):
-        """Obtiene reportes de Montevideo"""
-        data = self.reportes_montevideo
+        normalizado = self._normalizado('calidad_agua')
+        clave = clave_ubicacion(ubicacion) if ubicacion else None
+        if clave is not None and clave not in normalizado.ubicaciones:
+            return None
         
-        if barrio:
-            data = [r for r in data if r.get('barrio') == barrio]
+        series = normalizado.derivado('series', SeriesCalidad)
+        serie = series.resamplear(clave, frecuencia, ventana)
         
-        if categoria:
-            data = [r for r in data if r.get('categoria') == categoria]
+        if len(metricas) == len(METRICAS):
+            return serie
+        return [
+            {**punto, 'metricas': {m: punto['metricas'][m] for m in metricas}}
+            for punto in serie
+        ]
+    
+    def get_anomalias_calidad_agua(self, ubicacion=None, metrica=None, desde=None, solo_actuales=False):
+        """
+        Mediciones de calidad de agua que se alejan de la línea base de su policlínica
+        Retorna las anomalías de la más reciente a la más antigua; solo_actuales deja
+        las de la última muestra de cada policlínica.
+        """
+        # El detector de la versión anterior de los datos se continúa con las muestras nuevas.
+        # Leer, construir y publicar va bajo lock, y solo se publica el detector de los datos
+        # vigentes: un request que todavía usa un snapshot viejo no pisa uno más nuevo
+        snapshot = self._snapshot
+        normalizado = self._normalizado('calidad_agua', snapshot)
+        with self._anomalias_lock:
+            detector = normalizado.derivado(
+                'anomalias', lambda datos: detector_desde_normalizado(datos, self._detector_anomalias)
+            )
+            if self._snapshot.dataset('calidad_agua') is snapshot.dataset('calidad_agua'):
+                self._detector_anomalias = detector
         
-        if estado:
-            data = [r for r in data if r.get('estado') == estado]
+        if metrica and metrica not in detector.metricas:
+            raise ValueError(f"Métrica desconocida: {metrica}. Opciones: {', '.join(detector.metricas)}")
+        if desde:
+            inicio = parsear_fecha(desde)
+            if inicio is None:
+                raise ValueError(f"Fecha inválida: {desde}")
+            desde = inicio.isoformat()
         
-        return data
+        clave = clave_ubicacion(ubicacion) if ubicacion else None
+        resultado = []
+        for anomalia in reversed(detector.anomalias):
+            if clave and clave_ubicacion(anomalia['ubicacion']) != clave:
+                continue
+            if metrica and anomalia['metrica'] != metrica:
+                continue
+            if desde and anomalia['fecha'] < desde:
+                continue
+            actual = detector.es_actual(anomalia)
+            if solo_actuales and not actual:
+                continue
+            resultado.append({**anomalia, 'actual': actual})
+        
+        return resultado
     
-    def get_interrupciones_montevideo(self, barrio=None, limit=None):
-        """Obtiene interrupciones de servicio en Montevideo"""
-        data = self.interrupciones_montevideo
+    def get_tarifas_ose(self, categoria=None):
+        """Obtiene tarifas de OSE Uruguay"""
+        return self._filtrar('tarifas_ose', categoria=categoria)
+    
+    def facturar_lote(self, consumos, categorias=None, fechas=None, tarifas=None):
+        """
+        Facturas de un lote de hogares con las tarifas por bloques de OSE
+        categorias/fechas: una por hogar o una para todos (sin fecha = última tarifa)
+        tarifas: filas con el formato de tarifas_ose para simular otro tarifario
+        """
+        if not FACTURACION_AVAILABLE:
+            raise RuntimeError("NumPy no disponible para facturar en lote")
+        
+        if tarifas is None:
+            tarifario = self._snapshot.derivado(
+                'tarifas_ose', 'tarifario', lambda datos: TarifarioOSE(_como_lista(datos))
+            )
+        else:
+            tarifario = TarifarioOSE(tarifas)
         
-        if barrio:
-            data = [i for i in data if i.get('barrio') == barrio]
+        facturas = tarifario.facturar(consumos, categorias, fechas)
+        return {
+            'importe': facturas['importe'].round(2).tolist(),
+            'cargo_fijo': facturas['cargo_fijo'].round(2).tolist(),
+            'cargo_variable': facturas['cargo_variable'].round(2).tolist(),
+            'bloque': facturas['bloque'].tolist(),
+            'vigencia': facturas['vigencia'].astype(str).tolist(),
+            'moneda': tarifario.moneda,
+            'resumen': resumen_facturas(facturas['importe']),
+        }
+    
+    def get_reportes_montevideo(self, barrio=None, categoria=None, estado=None):
+        """Obtiene reportes de Montevideo"""
+        return self._filtrar('reportes_montevideo', barrio=barrio, categoria=categoria, estado=estado)
+    
+    def get_interrupciones_montevideo(self, barrio=None, limit=None, activa_en=None, desde=None, hasta=None):
+        """Obtiene interrupciones de servicio en Montevideo (mismos filtros de tiempo que get_interrupciones)"""
+        if activa_en or desde or hasta:
+            data = self._filtrar_intervalos('interrupciones_montevideo', activa_en, desde, hasta, barrio=barrio)
+        else:
+            data = self._filtrar('interrupciones_montevideo', barrio=barrio)
         
         if limit:
             data = data[:limit]
         
         return data
     
-    def get_clima_montevideo(self, dias=30):
-        """Obtiene datos climáticos recientes de Montevideo"""
-        data = self.clima_montevideo
-        
-        if not data:
-            return []
-        
-        # Ordena por fecha descendente y toma los últimos N días
-        sorted_data = sorted(data, key=lambda x: x.get('fecha', ''), reverse=True)
-        return sorted_data[:dias]
+    def get_clima_montevideo(self, dias=30, desde=None, hasta=None):
+        """Obtiene datos climáticos de Montevideo (mismos parámetros que get_clima_reciente)"""
+        return self._serie_clima('clima_montevideo').rango(desde=desde, hasta=hasta, limite=dias)
     
     def get_stats_uruguay(self):
         """Obtiene estadísticas de Uruguay"""
+        snapshot = self._snapshot
+        reportes = snapshot.indice('reportes_montevideo')
+        
         return {
-            'calidad_agua': len(self.calidad_agua),
-            'tarifas_ose': len(self.tarifas_ose),
-            'interrupciones': len(self.interrupciones_montevideo),
+            'calidad_agua': len(snapshot.dataset('calidad_agua')),
+            'tarifas_ose': len(snapshot.dataset('tarifas_ose')),
+            'interrupciones': len(snapshot.dataset('interrupciones_montevideo')),
             'reportes': {
-                'total': len(self.reportes_montevideo),
-                'pendientes': len([r for r in self.reportes_montevideo if r.get('estado') == 'pendiente']),
-                'en_proceso': len([r for r in self.reportes_montevideo if r.get('estado') == 'en_proceso']),
-                'resueltos': len([r for r in self.reportes_montevideo if r.get('estado') == 'resuelto'])
+                'total': len(snapshot.dataset('reportes_montevideo')),
+                'pendientes': reportes.conteo('estado', 'pendiente'),
+                'en_proceso': reportes.conteo('estado', 'en_proceso'),
+                'resueltos': reportes.conteo('estado', 'resuelto')
             },
-            'clima_registros': len(self.clima_montevideo),
-            'barrios': list(set([r.get('barrio') for r in self.reportes_montevideo if r.get('barrio')]))
+            'clima_registros': len(snapshot.dataset('clima_montevideo')),
+            'barrios': [b for b in reportes.valores('barrio') if b]
         }
 
+# ========== REGISTRO DE CARGADORES ==========
+
+# Un cargador por (pais, ciudad), compartido entre requests y threads
+_loaders = {}
+_loaders_lock = threading.Lock()
+
+# Intervalo de recarga en segundo plano para los cargadores del registro (None = desactivada)
+_intervalo_recarga = None
+
+def get_data_loader(pais='colombia', ciudad=None):
+    """
+    Obtiene el cargador compartido para (pais, ciudad).
+    Carga los datos una sola vez y solo los recarga si cambiaron los archivos.
+    """
+    clave = (pais.lower(), ciudad.lower() if ciudad else None)
+    
+    loader = _loaders.get(clave)
+    if loader is None:
+        with _loaders_lock:
+            # Otro thread pudo haberlo cargado mientras esperábamos el lock
+            loader = _loaders.get(clave)
+            if loader is None:
+                loader = DataLoader(pais=clave[0], ciudad=clave[1])
+                if _intervalo_recarga:
+                    loader.iniciar_recarga_automatica(_intervalo_recarga)
+                _loaders[clave] = loader
+    elif not loader.recarga_automatica and loader.archivos_modificados():
+        # Sin recarga en segundo plano, se recarga en el propio request
+        loader.recargar()
+    
+    return loader
+
+def activar_recarga_automatica(intervalo=INTERVALO_RECARGA):
+    """Activa la recarga en segundo plano para los cargadores actuales y futuros del registro"""
+    global _intervalo_recarga
+    
+    with _loaders_lock:
+        _intervalo_recarga = intervalo
+        for loader in _loaders.values():
+            loader.iniciar_recarga_automatica(intervalo)
+
 # Instancia global
-data_loader = DataLoader()
+data_loader = get_data_loader()
@@ -0,0 +1,177 @@
+"""
+WaterWay - Facturación en lote sobre las tarifas por bloques de OSE (NumPy)
+Cada vigencia de tarifa (categoría + fecha) se guarda como una fila con los
+límites de sus bloques y el costo acumulado hasta el inicio de cada bloque,
+así una factura es cargo fijo + acumulado del bloque + excedente × tarifa.
+La tarifa vigente de cada hogar se busca con searchsorted sobre todas las
+vigencias a la vez.
+"""
+import numpy as np
+
+# Máximo de hogares por lote
+MAX_HOGARES_LOTE = 100000
+
+# Separa las categorías en la clave de búsqueda (categoría, mes)
+_MESES_POR_CATEGORIA = 1 << 32
+
+
+def _clave_categoria(texto):
+    return str(texto).strip().lower()
+
+
+def _meses(fechas, n):
+    """
+    Mes (datetime64[M] como entero) de cada fecha ('AAAA-MM' o 'AAAA-MM-DD').
+    Una fecha None o ausente usa la última tarifa de la categoría.
+    """
+    if fechas is None or isinstance(fechas, str):
+        fechas = [fechas] * n
+    if len(fechas) != n:
+        raise ValueError("fecha debe tener un valor por hogar o ser uno solo para todos")
+
+    sin_fecha = np.array([f is None or f == '' for f in fechas], dtype=bool)
+    textos = [str(f)[:10] if f else '1970-01' for f in fechas]
+    try:
+        meses = np.array(textos, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    except ValueError:
+        raise ValueError("Las fechas deben tener formato AAAA-MM o AAAA-MM-DD")
+    meses[sin_fecha] = _MESES_POR_CATEGORIA - 1
+    return meses
+
+
+class TarifarioOSE:
+    """
+    Tarifas por bloques de OSE preparadas para facturar en lote.
+    registros: filas de tarifas_ose (fecha, categoria, hasta_m3, tarifa_por_m3, cargo_fijo, moneda).
+    Una tarifa fechada en un mes rige desde el inicio de ese mes hasta la siguiente.
+    """
+
+    def __init__(self, registros):
+        vigencias = {}          # (categoría, mes) -> filas de bloques
+        self.categorias = {}    # clave -> nombre como aparece en los datos
+        monedas = set()
+
+        for registro in registros:
+            try:
+                categoria = _clave_categoria(registro['categoria'])
+                mes = int(np.datetime64(str(registro['fecha'])[:10], 'M').astype(np.int64))
+                bloque = (float(registro['hasta_m3']), float(registro['tarifa_por_m3']), float(registro.get('cargo_fijo') or 0))
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Fila de tarifa inválida: {registro!r}")
+            self.categorias.setdefault(categoria, str(registro['categoria']).strip())
+            vigencias.setdefault((categoria, mes), []).append(bloque)
+            if registro.get('moneda'):
+                monedas.add(registro['moneda'])
+
+        if not vigencias:
+            raise ValueError("No hay tarifas para facturar")
+
+        self.moneda = monedas.pop() if len(monedas) == 1 else None
+        self._codigo = {categoria: i for i, categoria in enumerate(sorted(self.categorias))}
+
+        claves = sorted(vigencias, key=lambda c: (self._codigo[c[0]], c[1]))
+        n_bloques = max(len(bloques) for bloques in vigencias.values())
+
+        self._claves = np.array([self._codigo[c] * _MESES_POR_CATEGORIA + m for c, m in claves], dtype=np.int64)
+        self._categoria = np.array([self._codigo[c] for c, _ in claves], dtype=np.int64)
+        self._vigencia = np.array([m for _, m in claves], dtype='datetime64[M]')
+
+        # inicio: límite inferior de cada bloque (inf en los bloques que no existen)
+        # acumulado: costo de consumir hasta el inicio del bloque
+        self._inicio = np.full((len(claves), n_bloques), np.inf)
+        self._tarifa = np.zeros((len(claves), n_bloques))
+        self._acumulado = np.zeros((len(claves), n_bloques))
+        self._cargo_fijo = np.zeros(len(claves))
+
+        for fila, clave in enumerate(claves):
+            bloques = sorted(vigencias[clave])
+            limites = np.array([b[0] for b in bloques])
+            tarifas = np.array([b[1] for b in bloques])
+            inicios = np.concatenate(([0.0], limites[:-1]))
+            k = len(bloques)
+            self._inicio[fila, :k] = inicios
+            self._tarifa[fila, :k] = tarifas
+            self._acumulado[fila, :k] = np.concatenate(([0.0], np.cumsum((limites[:-1] - inicios[:-1]) * tarifas[:-1])))
+            self._cargo_fijo[fila] = bloques[0][2]
+
+    def __len__(self):
+        return len(self._claves)
+
+    def _vigentes(self, categorias, meses):
+        """Fila de la tarifa vigente de cada hogar (búsqueda 'as of' por categoría)"""
+        n = len(meses)
+        if categorias is None or isinstance(categorias, str):
+            categorias = [categorias] * n
+        if len(categorias) != n:
+            raise ValueError("categoria debe tener un valor por hogar o ser una sola para todos")
+
+        # Una búsqueda por categoría distinta, no por hogar
+        distintas, inversa = np.unique(np.asarray(categorias, dtype=object).astype(str), return_inverse=True)
+        por_distinta = np.empty(len(distintas), dtype=np.int64)
+        for j, categoria in enumerate(distintas):
+            codigo = self._codigo.get(_clave_categoria(categoria))
+            if codigo is None:
+                i = int(np.flatnonzero(inversa == j)[0])
+                raise ValueError(
+                    f"Categoría desconocida en el hogar {i}: {categorias[i]!r}. "
+                    f"Opciones: {', '.join(self.categorias.values())}"
+                )
+            por_distinta[j] = codigo
+        codigos = por_distinta[inversa]
+
+        filas = np.searchsorted(self._claves, codigos * _MESES_POR_CATEGORIA + meses, side='right') - 1
+        sin_tarifa = (filas < 0) | (self._categoria[np.maximum(filas, 0)] != codigos)
+        if sin_tarifa.any():
+            i = int(np.flatnonzero(sin_tarifa)[0])
+            raise ValueError(f"No hay tarifa vigente para el hogar {i} en {np.datetime64(int(meses[i]), 'M')}")
+        return filas
+
+    def facturar(self, consumos, categorias=None, fechas=None):
+        """
+        Factura un lote de hogares.
+        consumos: m³ de cada hogar; categorias y fechas: una por hogar o una para todos.
+        Retorna arreglos importe, cargo_fijo, cargo_variable, bloque (desde 0) y vigencia.
+        """
+        try:
+            consumos = np.asarray(consumos, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError("Los consumos deben ser números mayores o iguales a 0")
+        if consumos.ndim != 1:
+            raise ValueError("Los consumos deben ser una lista plana, un valor por hogar")
+        n = len(consumos)
+        if n > MAX_HOGARES_LOTE:
+            raise ValueError(f"Máximo {MAX_HOGARES_LOTE} hogares por lote")
+        if not np.isfinite(consumos).all() or (consumos < 0).any():
+            raise ValueError("Los consumos deben ser números mayores o iguales a 0")
+
+        filas = self._vigentes(categorias, _meses(fechas, n))
+
+        inicio = self._inicio[filas]
+        bloque = np.maximum((consumos[:, None] > inicio).sum(axis=1) - 1, 0)
+        variable = (
+            self._acumulado[filas, bloque]
+            + (consumos - inicio[np.arange(n), bloque]) * self._tarifa[filas, bloque]
+        )
+        cargo_fijo = self._cargo_fijo[filas]
+
+        return {
+            'importe': cargo_fijo + variable,
+            'cargo_fijo': cargo_fijo,
+            'cargo_variable': variable,
+            'bloque': bloque,
+            'vigencia': self._vigencia[filas],
+        }
+
+
+def resumen_facturas(importes):
+    """Totales de un lote de importes"""
+    if len(importes) == 0:
+        return {'hogares': 0, 'total': 0.0, 'promedio': None, 'mediana': None, 'minimo': None, 'maximo': None}
+    return {
+        'hogares': int(len(importes)),
+        'total': round(float(importes.sum()), 2),
+        'promedio': round(float(importes.mean()), 2),
+        'mediana': round(float(np.median(importes)), 2),
+        'minimo': round(float(importes.min()), 2),
+        'maximo': round(float(importes.max()), 2),
+    }
@@ -0,0 +1,543 @@
+"""
+WaterWay - Índices en memoria para los datasets procesados
+Permiten filtrar registros sin recorrer la lista completa en cada request
+"""
+import math
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+# Radio medio de la Tierra, para distancias haversine
+RADIO_TIERRA_KM = 6371.0088
+
+
+def parsear_fecha(valor):
+    """Convierte un texto ISO ('2025-01-27', '2025-01-27T10:00:00', ...) a datetime, o None"""
+    if not valor or not isinstance(valor, str):
+        return None
+    try:
+        fecha = datetime.fromisoformat(valor)
+    except ValueError:
+        return None
+    # Los datasets guardan fechas locales sin zona horaria
+    return fecha.replace(tzinfo=None)
+
+
+def parsear_numero(valor):
+    """Número desde float/int o texto con coma decimal; None si no se puede"""
+    if valor is None or isinstance(valor, bool):
+        return None
+    if isinstance(valor, str):
+        valor = valor.strip().replace(',', '.')
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def parsear_horas(valor, decimales_en_dias=False):
+    """
+    Duración en horas, o None. En EPM 'Horas' mezcla horas ('6', '6,33') con
+    fracciones de día del formato de hora de Excel ('0,25' = 6 horas): con
+    decimales_en_dias los valores con decimales menores que 1 se pasan de días
+    a horas (una interrupción de menos de una hora se guarda también así).
+    """
+    numero = parsear_numero(valor)
+    if numero is None:
+        return None
+    if decimales_en_dias and 0 < numero < 1:
+        numero *= 24
+    return numero
+
+
+def _es_solo_fecha(texto):
+    return isinstance(texto, str) and len(texto) == 10
+
+
+class IndiceInvertido:
+    """
+    Índice invertido campo -> valor -> posiciones de los registros.
+    Las posiciones de cada lista quedan ordenadas, así el resultado
+    de un filtro conserva el orden original del dataset.
+    El largo de cada lista es el conteo de registros con ese valor.
+    Un índice publicado no se modifica: con_registro() y con_cambio()
+    retornan una copia que comparte las listas que no cambian.
+    """
+
+    def __init__(self, registros, campos):
+        """
+        registros: lista de dicts
+        campos: dict {campo: normalizador o None}, p.ej. {'Estrato': str}
+        """
+        self.campos = dict(campos)
+        self.total = len(registros)
+        self._listas = {campo: {} for campo in self.campos}
+
+        for pos, registro in enumerate(registros):
+            for campo, normalizar in self.campos.items():
+                valor = registro.get(campo)
+                if normalizar:
+                    valor = normalizar(valor)
+                self._listas[campo].setdefault(valor, []).append(pos)
+
+        # Conjuntos para pruebas de pertenencia en O(1) durante la intersección
+        self._conjuntos = {
+            campo: {valor: set(posiciones) for valor, posiciones in valores.items()}
+            for campo, valores in self._listas.items()
+        }
+
+    def contiene(self, campo, valor, pos):
+        """Indica si el registro pos tiene ese valor en el campo"""
+        normalizar = self.campos[campo]
+        if normalizar:
+            valor = normalizar(valor)
+        conjunto = self._conjuntos[campo].get(valor)
+        return conjunto is not None and pos in conjunto
+
+    def valores(self, campo):
+        """Valores distintos de un campo"""
+        return list(self._listas[campo].keys())
+
+    def conteo(self, campo, valor):
+        """Cantidad de registros con ese valor en el campo (O(1))"""
+        normalizar = self.campos[campo]
+        if normalizar:
+            valor = normalizar(valor)
+        return len(self._listas[campo].get(valor, ()))
+
+    def _copia(self):
+        """Índice nuevo que comparte las listas y conjuntos (no se modifican en el lugar)"""
+        copia = IndiceInvertido.__new__(IndiceInvertido)
+        copia.campos = self.campos
+        copia.total = self.total
+        copia._listas = {campo: dict(valores) for campo, valores in self._listas.items()}
+        copia._conjuntos = {campo: dict(valores) for campo, valores in self._conjuntos.items()}
+        return copia
+
+    def _normalizado(self, campo, valor):
+        normalizar = self.campos[campo]
+        return normalizar(valor) if normalizar else valor
+
+    def con_registro(self, pos, registro):
+        """Copia del índice con un registro nuevo al final (pos = largo anterior)"""
+        copia = self._copia()
+        for campo in self.campos:
+            valor = self._normalizado(campo, registro.get(campo))
+            lista = copia._listas[campo].get(valor, [])
+            copia._listas[campo][valor] = lista + [pos]
+            copia._conjuntos[campo][valor] = copia._conjuntos[campo].get(valor, set()) | {pos}
+        copia.total = max(self.total, pos + 1)
+        return copia
+
+    def con_cambio(self, pos, campo, anterior, nuevo):
+        """Copia del índice con el registro pos movido del valor anterior al nuevo en un campo"""
+        if campo not in self.campos:
+            return self
+        anterior, nuevo = self._normalizado(campo, anterior), self._normalizado(campo, nuevo)
+        if anterior == nuevo:
+            return self
+
+        copia = self._copia()
+        quedan = [p for p in copia._listas[campo].get(anterior, ()) if p != pos]
+        if quedan:
+            copia._listas[campo][anterior] = quedan
+            copia._conjuntos[campo][anterior] = set(quedan)
+        else:
+            copia._listas[campo].pop(anterior, None)
+            copia._conjuntos[campo].pop(anterior, None)
+
+        lista = copia._listas[campo].get(nuevo, [])
+        i = bisect_left(lista, pos)
+        copia._listas[campo][nuevo] = lista[:i] + [pos] + lista[i:]
+        copia._conjuntos[campo][nuevo] = copia._conjuntos[campo].get(nuevo, set()) | {pos}
+        return copia
+
+    def posiciones(self, **criterios):
+        """
+        Posiciones (ordenadas) de los registros que cumplen todos los criterios.
+        Recorre solo la lista más corta y verifica pertenencia en las demás.
+        """
+        listas = []
+        for campo, valor in criterios.items():
+            normalizar = self.campos[campo]
+            if normalizar:
+                valor = normalizar(valor)
+            lista = self._listas[campo].get(valor)
+            if not lista:
+                return []
+            listas.append((campo, valor, lista))
+
+        if not listas:
+            return list(range(self.total))
+
+        listas.sort(key=lambda x: len(x[2]))
+        _, _, base = listas[0]
+        otros = [self._conjuntos[campo][valor] for campo, valor, _ in listas[1:]]
+
+        if not otros:
+            return base
+        return [pos for pos in base if all(pos in conjunto for conjunto in otros)]
+
+
+class SerieFechas:
+    """
+    Registros ordenados por fecha, con las fechas ya parseadas.
+    Las consultas por rango usan búsqueda binaria en lugar de ordenar
+    la lista completa en cada request.
+    """
+
+    def __init__(self, registros, campo='fecha'):
+        con_fecha = []
+        self._sin_fecha = []
+
+        for pos, registro in enumerate(registros):
+            fecha = parsear_fecha(registro.get(campo))
+            if fecha is None:
+                self._sin_fecha.append(registro)
+            else:
+                con_fecha.append((fecha, -pos, registro))
+
+        # A igual fecha, el registro que venía primero queda último: al recorrer
+        # de atrás hacia adelante se respeta el orden original (como sorted(reverse=True))
+        con_fecha.sort(key=lambda x: (x[0], x[1]))
+        self._fechas = [fecha for fecha, _, _ in con_fecha]
+        self._registros = [registro for _, _, registro in con_fecha]
+
+    def __len__(self):
+        return len(self._registros) + len(self._sin_fecha)
+
+    def _limites(self, desde=None, hasta=None):
+        """
+        Posiciones [inicio, fin) del rango de fechas.
+        desde/hasta aceptan texto ISO o datetime; un 'hasta' sin hora incluye el día completo.
+        """
+        inicio, fin = 0, len(self._fechas)
+
+        if desde is not None:
+            fecha = desde if isinstance(desde, datetime) else parsear_fecha(desde)
+            if fecha is None:
+                raise ValueError(f"Fecha inválida: {desde}")
+            inicio = bisect_left(self._fechas, fecha)
+
+        if hasta is not None:
+            fecha = hasta if isinstance(hasta, datetime) else parsear_fecha(hasta)
+            if fecha is None:
+                raise ValueError(f"Fecha inválida: {hasta}")
+            if _es_solo_fecha(hasta):
+                fin = bisect_left(self._fechas, fecha + timedelta(days=1))
+            else:
+                fin = bisect_right(self._fechas, fecha)
+
+        return inicio, max(inicio, fin)
+
+    def rango(self, desde=None, hasta=None, limite=None):
+        """
+        Registros entre desde y hasta, del más reciente al más antiguo.
+        limite: máximo de registros (los más recientes del rango).
+        Sin rango, los registros sin fecha van al final, como en el orden original.
+        """
+        inicio, fin = self._limites(desde, hasta)
+
+        if limite is not None:
+            if limite <= 0:
+                return []
+            inicio = max(inicio, fin - limite)
+
+        resultado = self._registros[inicio:fin][::-1]
+
+        if desde is None and hasta is None:
+            faltan = len(self._sin_fecha) if limite is None else limite - len(resultado)
+            if faltan > 0:
+                resultado.extend(self._sin_fecha[:faltan])
+
+        return resultado
+
+    def recientes(self, n):
+        """Los n registros más recientes"""
+        return self.rango(limite=n)
+
+
+def _fecha_limite(valor, fin_del_dia=False):
+    """Parsea un límite de consulta; con fin_del_dia, una fecha sin hora cubre el día completo"""
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    fecha = parsear_fecha(valor)
+    if fecha is None:
+        raise ValueError(f"Fecha inválida: {valor}")
+    if fin_del_dia and _es_solo_fecha(valor):
+        fecha += timedelta(days=1) - timedelta(microseconds=1)
+    return fecha
+
+
+class _NodoIntervalos:
+    """Nodo de un árbol de intervalos centrado"""
+
+    __slots__ = ('centro', 'por_inicio', 'inicios', 'por_fin', 'fines', 'izquierda', 'derecha')
+
+
+class IndiceIntervalos:
+    """
+    Árbol de intervalos (centrado) sobre registros con inicio y fin.
+    Responde "qué registros estaban activos en T" y "cuáles se superponen
+    con [a, b]" en O(log n + k).
+    El fin se toma de campo_fin; si no hay, o es anterior al inicio (interrupciones
+    que cruzan la medianoche en EPM), de inicio + campo_duracion_horas, igual que
+    CuboInterrupciones (horas_en_dias: ver parsear_horas).
+    """
+
+    def __init__(self, registros, campo_inicio, campo_fin=None, campo_duracion_horas=None, horas_en_dias=False):
+        self._inicios = {}
+        self._fines = {}
+
+        for pos, registro in enumerate(registros):
+            inicio = parsear_fecha(registro.get(campo_inicio))
+            if inicio is None:
+                continue
+
+            fin = parsear_fecha(registro.get(campo_fin)) if campo_fin else None
+            if (fin is None or fin < inicio) and campo_duracion_horas:
+                try:
+                    # Al segundo: las fracciones de día dejan restos de microsegundos
+                    segundos = round(parsear_horas(registro.get(campo_duracion_horas), horas_en_dias) * 3600)
+                    fin = inicio + timedelta(seconds=segundos)
+                except (TypeError, ValueError, OverflowError):
+                    fin = None
+
+            if fin is None or fin < inicio:
+                fin = inicio
+
+            self._inicios[pos] = inicio
+            self._fines[pos] = fin
+
+        self._raiz = self._construir(list(self._inicios))
+
+    def __len__(self):
+        return len(self._inicios)
+
+    def _construir(self, posiciones):
+        """Construye el subárbol para las posiciones dadas"""
+        if not posiciones:
+            return None
+
+        extremos = sorted([self._inicios[p] for p in posiciones] + [self._fines[p] for p in posiciones])
+        centro = extremos[len(extremos) // 2]
+
+        izquierda, derecha, medio = [], [], []
+        for p in posiciones:
+            if self._fines[p] < centro:
+                izquierda.append(p)
+            elif self._inicios[p] > centro:
+                derecha.append(p)
+            else:
+                medio.append(p)
+
+        nodo = _NodoIntervalos()
+        nodo.centro = centro
+        nodo.por_inicio = sorted(medio, key=lambda p: self._inicios[p])
+        nodo.inicios = [self._inicios[p] for p in nodo.por_inicio]
+        nodo.por_fin = sorted(medio, key=lambda p: self._fines[p])
+        nodo.fines = [self._fines[p] for p in nodo.por_fin]
+        nodo.izquierda = self._construir(izquierda)
+        nodo.derecha = self._construir(derecha)
+        return nodo
+
+    def superpuestos(self, desde=None, hasta=None):
+        """
+        Posiciones de los registros cuyo intervalo se superpone con [desde, hasta],
+        ordenadas por inicio. Sin desde (o hasta) el rango queda abierto de ese lado.
+        """
+        a = _fecha_limite(desde) or datetime.min
+        b = _fecha_limite(hasta, fin_del_dia=True) or datetime.max
+        if b < a:
+            return []
+
+        resultado = []
+        pendientes = [self._raiz]
+        while pendientes:
+            nodo = pendientes.pop()
+            if nodo is None:
+                continue
+            if b < nodo.centro:
+                # Solo sirven los del nodo que empiezan antes de b
+                resultado.extend(nodo.por_inicio[:bisect_right(nodo.inicios, b)])
+                pendientes.append(nodo.izquierda)
+            elif a > nodo.centro:
+                # Solo sirven los del nodo que terminan después de a
+                resultado.extend(nodo.por_fin[bisect_left(nodo.fines, a):])
+                pendientes.append(nodo.derecha)
+            else:
+                resultado.extend(nodo.por_inicio)
+                pendientes.append(nodo.izquierda)
+                pendientes.append(nodo.derecha)
+
+        resultado.sort(key=lambda p: (self._inicios[p], p))
+        return resultado
+
+    def activos_en(self, momento):
+        """Posiciones de los registros activos en un instante, ordenadas por inicio"""
+        momento = _fecha_limite(momento)
+        return self.superpuestos(momento, momento)
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distancia haversine en km entre dos puntos (grados)"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _coordenada(valor):
+    """Convierte latitud/longitud a float, o None si falta o no es válida"""
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return valor if math.isfinite(valor) else None
+
+
+class IndiceEspacial:
+    """
+    Grilla regular de celdas (lat, lon) -> posiciones de los registros.
+    Una consulta solo revisa las celdas que tocan el área pedida; las
+    celdas completamente dentro de un bbox se agregan sin revisar punto a punto.
+    """
+
+    def __init__(self, registros, campo_lat='latitud', campo_lon='longitud', celda_grados=0.01):
+        self.celda = celda_grados
+        self._coordenadas = {}
+        self._celdas = {}
+
+        for pos, registro in enumerate(registros):
+            lat = _coordenada(registro.get(campo_lat))
+            lon = _coordenada(registro.get(campo_lon))
+            if lat is None or lon is None:
+                continue
+            self._coordenadas[pos] = (lat, lon)
+            self._celdas.setdefault(self._celda(lat, lon), []).append(pos)
+
+    def __len__(self):
+        return len(self._coordenadas)
+
+    def _celda(self, lat, lon):
+        return (math.floor(lat / self.celda), math.floor(lon / self.celda))
+
+    def coordenadas(self, pos):
+        """(lat, lon) del registro pos, o None si no tiene"""
+        return self._coordenadas.get(pos)
+
+    def _celdas_en(self, min_lat, min_lon, max_lat, max_lon):
+        """Celdas ocupadas que tocan el rectángulo"""
+        fila_min, col_min = self._celda(min_lat, min_lon)
+        fila_max, col_max = self._celda(max_lat, max_lon)
+
+        # Si el rectángulo abarca más celdas de las que hay ocupadas, conviene recorrer las ocupadas
+        if (fila_max - fila_min + 1) * (col_max - col_min + 1) > len(self._celdas):
+            for (fila, col), posiciones in self._celdas.items():
+                if fila_min <= fila <= fila_max and col_min <= col <= col_max:
+                    yield (fila, col), posiciones
+            return
+
+        for fila in range(fila_min, fila_max + 1):
+            for col in range(col_min, col_max + 1):
+                posiciones = self._celdas.get((fila, col))
+                if posiciones:
+                    yield (fila, col), posiciones
+
+    def en_rectangulo(self, min_lon, min_lat, max_lon, max_lat):
+        """Posiciones (ordenadas) de los puntos dentro del bbox, bordes incluidos"""
+        if min_lat > max_lat or min_lon > max_lon:
+            raise ValueError("bbox inválido: se espera minLon,minLat,maxLon,maxLat")
+
+        resultado = []
+        for (fila, col), posiciones in self._celdas_en(min_lat, min_lon, max_lat, max_lon):
+            interior = (
+                fila * self.celda >= min_lat and (fila + 1) * self.celda < max_lat and
+                col * self.celda >= min_lon and (col + 1) * self.celda < max_lon
+            )
+            if interior:
+                resultado.extend(posiciones)
+            else:
+                for pos in posiciones:
+                    lat, lon = self._coordenadas[pos]
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                        resultado.append(pos)
+
+        resultado.sort()
+        return resultado
+
+    def en_radio(self, lat, lon, radio_km):
+        """Pares (posición, distancia_km) de los puntos a menos de radio_km, del más cercano al más lejano"""
+        if radio_km < 0:
+            raise ValueError("El radio debe ser positivo")
+
+        # Rectángulo que contiene el círculo; luego se filtra por distancia real
+        delta_lat = math.degrees(radio_km / RADIO_TIERRA_KM)
+        cos_lat = math.cos(math.radians(lat))
+        delta_lon = 180.0 if cos_lat < 1e-6 else min(180.0, delta_lat / cos_lat)
+
+        resultado = []
+        for _, posiciones in self._celdas_en(lat - delta_lat, lon - delta_lon, lat + delta_lat, lon + delta_lon):
+            for pos in posiciones:
+                plat, plon = self._coordenadas[pos]
+                distancia = distancia_km(lat, lon, plat, plon)
+                if distancia <= radio_km:
+                    resultado.append((pos, distancia))
+
+        resultado.sort(key=lambda x: (x[1], x[0]))
+        return resultado
+
+
+class ClustersGrilla:
+    """
+    Agrupa los puntos de los registros en celdas de una grilla según el zoom
+    del mapa (zoom 0 = mundo entero en una tesela). Cada cluster tiene conteo,
+    centroide y desglose por un campo de los registros.
+    """
+
+    # Celdas por tesela de mapa en cada eje (~64 px por celda en teselas de 256 px)
+    CELDAS_POR_TESELA = 4
+
+    def __init__(self, registros, zoom, campo_desglose=None, campo_lat='latitud', campo_lon='longitud'):
+        self.zoom = zoom
+        self.celda = 360.0 / (2 ** zoom) / self.CELDAS_POR_TESELA
+
+        grupos = {}
+        for registro in registros:
+            lat = _coordenada(registro.get(campo_lat))
+            lon = _coordenada(registro.get(campo_lon))
+            if lat is None or lon is None:
+                continue
+            clave = (math.floor(lat / self.celda), math.floor(lon / self.celda))
+            grupo = grupos.get(clave)
+            if grupo is None:
+                grupo = grupos[clave] = [0, 0.0, 0.0, {}]
+            grupo[0] += 1
+            grupo[1] += lat
+            grupo[2] += lon
+            if campo_desglose:
+                valor = registro.get(campo_desglose)
+                valor = 'sin_dato' if valor is None else str(valor)
+                grupo[3][valor] = grupo[3].get(valor, 0) + 1
+
+        self.clusters = []
+        for clave in sorted(grupos):
+            conteo, suma_lat, suma_lon, desglose = grupos[clave]
+            self.clusters.append({
+                'lat': round(suma_lat / conteo, 6),
+                'lon': round(suma_lon / conteo, 6),
+                'conteo': conteo,
+                'desglose': desglose,
+            })
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def en_rectangulo(self, min_lon, min_lat, max_lon, max_lat):
+        """Clusters cuyo centroide cae dentro del bbox"""
+        if min_lat > max_lat or min_lon > max_lon:
+            raise ValueError("bbox inválido: se espera minLon,minLat,maxLon,maxLat")
+        return [
+            c for c in self.clusters
+            if min_lat <= c['lat'] <= max_lat and min_lon <= c['lon'] <= max_lon
+        ]
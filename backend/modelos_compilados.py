@@ -0,0 +1,370 @@
+"""
+WaterWay - Modelos de ML compilados a arreglos NumPy
+Exporta el RandomForest + StandardScaler de consumo y el XGBoost de riesgo
+a un .npz con los árboles aplanados (hijos, feature, umbral, valor), y los
+evalúa con NumPy puro: sin importar sklearn ni xgboost y sin la validación
+por llamada de sus predict.
+
+Uso: python modelos_compilados.py   (genera models/waterway_models_compilados.npz)
+"""
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+MODELOS_PATH = Path(__file__).parent / 'models' / 'waterway_models.pkl'
+COMPILADOS_PATH = Path(__file__).parent / 'models' / 'waterway_models_compilados.npz'
+
+# Versión del formato del .npz (cambia si cambia la estructura de los arreglos)
+FORMATO = 1
+
+# Diferencia máxima aceptada contra sklearn al verificar la exportación
+TOLERANCIA = 1e-6
+
+
+def hash_archivo(ruta):
+    """SHA-1 del contenido de un archivo (identifica el .pkl del que salió el .npz)"""
+    sha = hashlib.sha1()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def fuente_compilados(ruta=COMPILADOS_PATH):
+    """Hash del .pkl del que se exportó el .npz, o None si no se puede leer"""
+    try:
+        with np.load(ruta, allow_pickle=False) as z:
+            if int(z['formato']) != FORMATO:
+                return None
+            return str(z['fuente'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+# ========== INFERENCIA ==========
+
+class BosqueCompilado:
+    """
+    Conjunto de árboles aplanados en arreglos; los nodos de todos los árboles
+    comparten índices y `raices` marca el primer nodo de cada árbol.
+    Las hojas tienen izquierda = -1.
+    """
+
+    def __init__(self, izquierda, derecha, feature, umbral, valor, raices, profundidad,
+                 menor_estricto=False, izquierda_si_falta=None):
+        self.izquierda = izquierda
+        self.derecha = derecha
+        self.feature = feature
+        self.umbral = umbral
+        self.valor = valor
+        self.raices = raices
+        self.profundidad = int(profundidad)
+        self.menor_estricto = menor_estricto            # XGBoost: x < umbral; sklearn: x <= umbral
+        self.izquierda_si_falta = izquierda_si_falta    # dirección de los NaN (solo XGBoost)
+
+    def hojas(self, X):
+        """Valor de la hoja a la que llega cada fila en cada árbol: (filas, árboles)"""
+        # Ambas librerías evalúan los árboles sobre float32
+        X = np.asarray(X, dtype=np.float32)
+        filas = np.arange(len(X))[:, None]
+        nodo = np.repeat(self.raices[None, :], len(X), axis=0)
+
+        for _ in range(self.profundidad):
+            x = X[filas, self.feature[nodo]]
+            umbral = self.umbral[nodo]
+            va_izquierda = x < umbral if self.menor_estricto else x <= umbral
+            if self.izquierda_si_falta is not None:
+                va_izquierda = np.where(np.isnan(x), self.izquierda_si_falta[nodo], va_izquierda)
+            izquierda = self.izquierda[nodo]
+            nodo = np.where(izquierda < 0, nodo, np.where(va_izquierda, izquierda, self.derecha[nodo]))
+
+        return self.valor[nodo]
+
+
+class RegresorCompilado:
+    """Equivalente a RandomForestRegressor.predict: promedio de los árboles"""
+
+    def __init__(self, bosque):
+        self.bosque = bosque
+
+    def predict(self, X):
+        return self.bosque.hojas(X).astype(np.float64).mean(axis=1)
+
+
+class ClasificadorCompilado:
+    """Equivalente a XGBClassifier.predict (multi:softprob): argmax de los márgenes por clase"""
+
+    def __init__(self, bosque, clase_arbol, margen_base, clases):
+        self.bosque = bosque
+        self.clase_arbol = clase_arbol
+        self.margen_base = margen_base
+        self.classes_ = clases
+
+    def margenes(self, X):
+        hojas = self.bosque.hojas(X)
+        margenes = np.tile(self.margen_base, (len(hojas), 1))
+        for clase in range(len(self.margen_base)):
+            margenes[:, clase] += hojas[:, self.clase_arbol == clase].sum(axis=1, dtype=np.float32)
+        return margenes
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.margenes(X), axis=1)]
+
+
+class EscaladorCompilado:
+    """Equivalente a StandardScaler.transform"""
+
+    def __init__(self, media, escala):
+        self.mean_ = media
+        self.scale_ = escala
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class CodificadorCompilado:
+    """Equivalente a LabelEncoder (transform falla con valores desconocidos, como sklearn)"""
+
+    def __init__(self, clases):
+        self.classes_ = clases
+        self._indices = {clase: i for i, clase in enumerate(clases.tolist())}
+
+    def transform(self, valores):
+        try:
+            return np.array([self._indices[v] for v in valores], dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"y contains previously unseen labels: {e}")
+
+    def inverse_transform(self, codigos):
+        return self.classes_[np.asarray(codigos, dtype=np.int64)]
+
+
+def _bosque(z, prefijo, **opciones):
+    return BosqueCompilado(
+        z[f'{prefijo}izquierda'], z[f'{prefijo}derecha'], z[f'{prefijo}feature'],
+        z[f'{prefijo}umbral'], z[f'{prefijo}valor'], z[f'{prefijo}raices'],
+        z[f'{prefijo}profundidad'], **opciones
+    )
+
+
+def cargar_compilados(ruta=COMPILADOS_PATH):
+    """
+    Carga el .npz con la misma estructura que waterway_models.pkl
+    (consumo_predictor, riesgo_clasificador, metadata, proyecciones_12_meses),
+    así WaterPredictor lo usa sin cambios.
+    """
+    with np.load(ruta, allow_pickle=False) as z:
+        if int(z['formato']) != FORMATO:
+            raise ValueError(f"Formato de modelos compilados {int(z['formato'])} no soportado")
+        z = {clave: z[clave] for clave in z.files}
+
+    extra = json.loads(str(z['extra']))
+    return {
+        'metadata': extra['metadata'],
+        'proyecciones_12_meses': extra['proyecciones_12_meses'],
+        'consumo_predictor': {
+            'model': RegresorCompilado(_bosque(z, 'consumo_')),
+            'scaler': EscaladorCompilado(z['consumo_media'], z['consumo_escala']),
+            'features': extra['features_consumo'],
+            'label_encoder_estrato': CodificadorCompilado(z['consumo_clases_estrato']),
+        },
+        'riesgo_clasificador': {
+            'model': ClasificadorCompilado(
+                _bosque(z, 'riesgo_', menor_estricto=True, izquierda_si_falta=z['riesgo_izquierda_si_falta']),
+                z['riesgo_clase_arbol'], z['riesgo_margen_base'], z['riesgo_clases_modelo']
+            ),
+            'features': extra['features_riesgo'],
+            'label_encoder_estrato': CodificadorCompilado(z['riesgo_clases_estrato']),
+            'label_encoder_riesgo': CodificadorCompilado(z['riesgo_clases_riesgo']),
+        },
+    }
+
+
+# ========== EXPORTACIÓN ==========
+
+def _aplanar(arboles, prefijo):
+    """
+    Une árboles (izquierda, derecha, feature, umbral, valor) en arreglos
+    únicos, desplazando los índices de los hijos de cada árbol
+    """
+    partes = {nombre: [] for nombre in ('izquierda', 'derecha', 'feature', 'umbral', 'valor')}
+    raices = []
+    desplazamiento = 0
+    for izquierda, derecha, feature, umbral, valor in arboles:
+        hoja = izquierda < 0
+        raices.append(desplazamiento)
+        partes['izquierda'].append(np.where(hoja, -1, izquierda + desplazamiento))
+        partes['derecha'].append(np.where(hoja, -1, derecha + desplazamiento))
+        partes['feature'].append(np.where(hoja, 0, feature))
+        partes['umbral'].append(umbral)
+        partes['valor'].append(valor)
+        desplazamiento += len(izquierda)
+
+    arreglos = {f'{prefijo}{nombre}': np.concatenate(valores) for nombre, valores in partes.items()}
+    arreglos[f'{prefijo}izquierda'] = arreglos[f'{prefijo}izquierda'].astype(np.int32)
+    arreglos[f'{prefijo}derecha'] = arreglos[f'{prefijo}derecha'].astype(np.int32)
+    arreglos[f'{prefijo}feature'] = arreglos[f'{prefijo}feature'].astype(np.int32)
+    arreglos[f'{prefijo}raices'] = np.array(raices, dtype=np.int32)
+    return arreglos
+
+
+def _exportar_random_forest(modelo, prefijo):
+    arboles = []
+    profundidad = 0
+    for estimador in modelo.estimators_:
+        arbol = estimador.tree_
+        arboles.append((
+            arbol.children_left, arbol.children_right, arbol.feature,
+            arbol.threshold.astype(np.float64), arbol.value[:, 0, 0].astype(np.float64)
+        ))
+        profundidad = max(profundidad, arbol.max_depth)
+    arreglos = _aplanar(arboles, prefijo)
+    arreglos[f'{prefijo}profundidad'] = np.array(profundidad)
+    return arreglos
+
+
+def _exportar_xgboost(modelo, prefijo, features):
+    booster = modelo.get_booster()
+    if booster.feature_names and list(booster.feature_names) != list(features):
+        raise ValueError(f"Features del XGBoost {booster.feature_names} distintas de {features}")
+
+    datos = json.loads(booster.save_raw('json'))
+    learner = datos['learner']
+    if learner['objective']['name'] != 'multi:softprob':
+        raise ValueError(f"Objetivo XGBoost no soportado: {learner['objective']['name']}")
+
+    gbtree = learner['gradient_booster']['model']
+    arboles = []
+    faltantes = []
+    profundidad = 0
+    for arbol in gbtree['trees']:
+        izquierda = np.array(arbol['left_children'], dtype=np.int64)
+        derecha = np.array(arbol['right_children'], dtype=np.int64)
+        condiciones = np.array(arbol['split_conditions'], dtype=np.float32)
+        hoja = izquierda < 0
+        # En las hojas split_conditions guarda el valor de la hoja
+        arboles.append((
+            izquierda, derecha, np.array(arbol['split_indices'], dtype=np.int64),
+            condiciones, np.where(hoja, condiciones, 0).astype(np.float32)
+        ))
+        faltantes.append(np.array(arbol['default_left'], dtype=bool))
+        profundidad = max(profundidad, _profundidad(izquierda, derecha))
+
+    # base_score se suma tal cual al margen de cada clase (uno por clase desde XGBoost 3)
+    base = np.array(json.loads(learner['learner_model_param']['base_score']), dtype=np.float32).reshape(-1)
+    n_clases = int(learner['learner_model_param']['num_class'])
+    if len(base) == 1:
+        base = np.repeat(base, n_clases)
+
+    arreglos = _aplanar(arboles, prefijo)
+    arreglos[f'{prefijo}profundidad'] = np.array(profundidad)
+    arreglos[f'{prefijo}izquierda_si_falta'] = np.concatenate(faltantes)
+    arreglos[f'{prefijo}clase_arbol'] = np.array(gbtree['tree_info'], dtype=np.int32)
+    arreglos[f'{prefijo}margen_base'] = base
+    arreglos[f'{prefijo}clases_modelo'] = np.asarray(modelo.classes_)
+    return arreglos
+
+
+def _profundidad(izquierda, derecha):
+    """Profundidad máxima de un árbol dado por sus arreglos de hijos"""
+    profundidad = 0
+    nivel = [0]
+    while nivel:
+        siguientes = [h for n in nivel for h in (izquierda[n], derecha[n]) if izquierda[n] >= 0]
+        if not siguientes:
+            break
+        profundidad += 1
+        nivel = siguientes
+    return profundidad
+
+
+def exportar(modelos, fuente, ruta=COMPILADOS_PATH):
+    """
+    Exporta los modelos cargados de waterway_models.pkl a un .npz sin objetos
+    Python (se lee con allow_pickle=False). fuente: hash del .pkl.
+    El archivo se escribe aparte y reemplaza a `ruta` solo si sus predicciones
+    coinciden con las originales (ver verificar); si no, lanza ValueError.
+    Retorna (diferencia máxima de consumo, coincidencias de riesgo).
+    """
+    consumo = modelos['consumo_predictor']
+    riesgo = modelos['riesgo_clasificador']
+
+    arreglos = {
+        'formato': np.array(FORMATO),
+        'fuente': np.array(fuente),
+        'consumo_media': consumo['scaler'].mean_.astype(np.float64),
+        'consumo_escala': consumo['scaler'].scale_.astype(np.float64),
+        'consumo_clases_estrato': np.asarray(consumo['label_encoder_estrato'].classes_).astype(str),
+        'riesgo_clases_estrato': np.asarray(riesgo['label_encoder_estrato'].classes_).astype(str),
+        'riesgo_clases_riesgo': np.asarray(riesgo['label_encoder_riesgo'].classes_).astype(str),
+        'extra': np.array(json.dumps({
+            'metadata': modelos.get('metadata', {}),
+            'proyecciones_12_meses': modelos.get('proyecciones_12_meses', []),
+            'features_consumo': list(consumo.get('features', [])),
+            'features_riesgo': list(riesgo.get('features', [])),
+        }, ensure_ascii=False, default=str)),
+    }
+    arreglos.update(_exportar_random_forest(consumo['model'], 'consumo_'))
+    arreglos.update(_exportar_xgboost(riesgo['model'], 'riesgo_', riesgo.get('features', [])))
+
+    temporal = Path(ruta).with_suffix('.tmp.npz')
+    np.savez_compressed(temporal, **arreglos)
+    try:
+        diferencia, coincidencias = verificar(modelos, cargar_compilados(temporal))
+        if diferencia > TOLERANCIA or coincidencias < 1.0:
+            raise ValueError(
+                f"Los modelos compilados no coinciden con los originales "
+                f"(consumo: diferencia {diferencia:.2e}, riesgo: {coincidencias * 100:.2f}% de clases iguales)"
+            )
+    except Exception:
+        temporal.unlink(missing_ok=True)
+        raise
+    temporal.replace(ruta)
+    return diferencia, coincidencias
+
+
+def verificar(modelos, compilados, n=2000, semilla=0):
+    """
+    Compara sklearn/xgboost contra la versión compilada sobre entradas al azar
+    Retorna (diferencia máxima de consumo, coincidencias de riesgo en [0, 1])
+    """
+    rng = np.random.default_rng(semilla)
+    n_estratos = len(modelos['consumo_predictor']['label_encoder_estrato'].classes_)
+    meses = rng.integers(1, 13, n)
+    estratos = rng.integers(0, n_estratos, n)
+    precipitacion = rng.uniform(0, 400, n)
+    temperatura = rng.uniform(10, 35, n)
+    consumo = rng.uniform(5, 600, n)
+
+    X_consumo = np.column_stack([meses, (meses - 1) // 3 + 1, meses * 30, precipitacion, temperatura, consumo, estratos])
+    original = modelos['consumo_predictor']['model'].predict(modelos['consumo_predictor']['scaler'].transform(X_consumo))
+    compilado = compilados['consumo_predictor']['model'].predict(compilados['consumo_predictor']['scaler'].transform(X_consumo))
+
+    X_riesgo = np.column_stack([meses, estratos, consumo, precipitacion, temperatura, consumo, np.full(n, 0.5)])
+    riesgo_original = modelos['riesgo_clasificador']['model'].predict(X_riesgo)
+    riesgo_compilado = compilados['riesgo_clasificador']['model'].predict(X_riesgo)
+
+    return float(np.max(np.abs(original - compilado))), float(np.mean(riesgo_original == riesgo_compilado))
+
+
+if __name__ == '__main__':
+    import sys
+
+    import joblib
+
+    print("=" * 60)
+    print("COMPILANDO MODELOS DE ML A NUMPY")
+    print("=" * 60)
+    modelos = joblib.load(MODELOS_PATH)
+    try:
+        diferencia, coincidencias = exportar(modelos, hash_archivo(MODELOS_PATH))
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        print(f"[ERROR] No se modificó {COMPILADOS_PATH}")
+        sys.exit(1)
+    print(f"[OK] Consumo: diferencia máxima contra sklearn {diferencia:.2e}")
+    print(f"[OK] Riesgo: {coincidencias * 100:.2f}% de clases iguales a XGBoost")
+    print(f"Modelos escritos en: {COMPILADOS_PATH} ({COMPILADOS_PATH.stat().st_size} bytes)")
+    print("=" * 60)
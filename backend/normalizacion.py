@@ -0,0 +1,213 @@
+"""
+WaterWay - Normalización de datasets a un esquema tipado
+Los JSON procesados mezclan nombres de campos ('Fecha'/'fecha',
+'Policlinica'/'ubicacion') y guardan fechas y números como texto.
+Al cargar, cada dataset con esquema se convierte una sola vez a columnas
+tipadas con nombres canónicos; los filtros comparan valores ya parseados.
+"""
+import math
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+
+from indices import parsear_fecha
+
+# Formatos de fecha aceptados además de ISO
+FORMATOS_FECHA = ['%d/%m/%Y', '%d/%m/%Y %H:%M:%S']
+
+# Máximo de ejemplos de filas con problemas que se muestran al cargar
+MAX_EJEMPLOS_PROBLEMAS = 3
+
+
+class Campo:
+    """Campo canónico de un esquema"""
+
+    def __init__(self, nombre, tipo, alias, requerido=False):
+        self.nombre = nombre            # nombre canónico
+        self.tipo = tipo                # 'fecha', 'real' o 'ubicacion'
+        self.alias = alias              # nombres posibles en los JSON, en orden de preferencia
+        self.requerido = requerido      # una fila sin este campo se reporta como inválida
+
+
+# Esquemas por dataset (atributo de DataLoader -> campos)
+ESQUEMAS = {
+    'calidad_agua': [
+        Campo('fecha', 'fecha', ('Fecha', 'fecha'), requerido=True),
+        Campo('ubicacion', 'ubicacion', ('Policlinica', 'ubicacion', 'policlinica'), requerido=True),
+        Campo('sodio', 'real', ('Sodio', 'sodio')),
+        Campo('cloruro', 'real', ('Cloruro', 'cloruro')),
+        Campo('conductividad', 'real', ('conductividad', 'Conductividad')),
+        Campo('solidos_totales', 'real', ('Solidos Totales', 'Sólidos Totales', 'solidos_totales')),
+    ],
+}
+
+
+def clave_ubicacion(texto):
+    """Clave canónica de un lugar: sin tildes, minúsculas y espacios simples"""
+    if texto is None:
+        return None
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'\s+', ' ', texto).strip().casefold()
+    return texto or None
+
+
+def _es_vacio(valor):
+    """None o NaN (los exports de pandas escriben NaN para los faltantes)"""
+    return valor is None or (isinstance(valor, float) and math.isnan(valor))
+
+
+def _convertir_fecha(valor):
+    if isinstance(valor, datetime):
+        return valor
+    fecha = parsear_fecha(valor)
+    if fecha is not None or not isinstance(valor, str):
+        return fecha
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor.strip(), formato)
+        except ValueError:
+            continue
+    return None
+
+
+def _convertir_real(valor):
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, str):
+        valor = valor.strip().replace(',', '.')
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return numero if math.isfinite(numero) else None
+
+
+def periodo_fecha(texto):
+    """
+    Rango [inicio, fin) que cubre un prefijo de fecha: 'AAAA', 'AAAA-MM',
+    'AAAA-MM-DD' o una fecha con hora (instante exacto). None si no es uno de esos.
+    """
+    try:
+        if re.fullmatch(r'\d{4}', texto):
+            inicio = datetime(int(texto), 1, 1)
+            return inicio, inicio.replace(year=inicio.year + 1)
+        if re.fullmatch(r'\d{4}-\d{2}', texto):
+            inicio = datetime.strptime(texto, '%Y-%m')
+            siguiente = inicio.replace(day=28) + timedelta(days=4)
+            return inicio, siguiente.replace(day=1)
+        if re.fullmatch(r'\d{4}-\d{2}-\d{2}', texto):
+            inicio = datetime.strptime(texto, '%Y-%m-%d')
+            return inicio, inicio + timedelta(days=1)
+    except ValueError:
+        return None
+
+    fecha = parsear_fecha(texto)
+    if fecha is None:
+        return None
+    return fecha, fecha + timedelta(microseconds=1)
+
+
+class DatasetNormalizado:
+    """
+    Vista tipada de un dataset según su esquema.
+    Las columnas quedan alineadas con las posiciones de los registros originales,
+    así se puede filtrar sobre valores tipados y devolver los registros tal cual.
+    """
+
+    def __init__(self, registros, esquema, nombre=''):
+        self.nombre = nombre
+        self.total = len(registros)
+        self.campos = {campo.nombre: campo for campo in esquema}
+        self.columnas = {campo.nombre: [] for campo in esquema}
+        self.problemas = []             # (posición, descripción)
+        self.validos = []               # posiciones con todos los campos requeridos
+        self.ubicaciones = {}           # clave canónica -> nombre como aparece en los datos
+        self._por_ubicacion = {}        # clave canónica -> posiciones
+        self._derivados = {}            # clave -> estructura calculada sobre la vista
+        self._derivados_lock = threading.Lock()
+
+        for pos, registro in enumerate(registros):
+            valido = True
+            for campo in esquema:
+                original = next((registro[a] for a in campo.alias if not _es_vacio(registro.get(a))), None)
+                valor = self._convertir(campo, original)
+                self.columnas[campo.nombre].append(valor)
+
+                if valor is None and (campo.requerido or original is not None):
+                    motivo = 'falta' if original is None else f"valor inválido {original!r}"
+                    self.problemas.append((pos, f"{campo.nombre}: {motivo}"))
+                    valido = valido and not campo.requerido
+
+                if campo.tipo == 'ubicacion' and valor is not None:
+                    self.ubicaciones.setdefault(valor, str(original).strip())
+                    self._por_ubicacion.setdefault(valor, []).append(pos)
+
+            if valido:
+                self.validos.append(pos)
+
+        self._reportar_problemas()
+
+    def __len__(self):
+        return len(self.validos)
+
+    @staticmethod
+    def _convertir(campo, valor):
+        if valor is None:
+            return None
+        if campo.tipo == 'fecha':
+            return _convertir_fecha(valor)
+        if campo.tipo == 'real':
+            return _convertir_real(valor)
+        return clave_ubicacion(valor)
+
+    def _reportar_problemas(self):
+        """Informa una sola vez (al cargar) las filas que no cumplen el esquema"""
+        if not self.problemas:
+            return
+        filas = len({pos for pos, _ in self.problemas})
+        ejemplos = '; '.join(
+            f"fila {pos}: {descripcion}" for pos, descripcion in self.problemas[:MAX_EJEMPLOS_PROBLEMAS]
+        )
+        print(f"[!] {self.nombre}: {filas} registros no cumplen el esquema ({ejemplos})")
+
+    def derivado(self, clave, construir):
+        """
+        Estructura calculada sobre la vista tipada (series, detectores, ...).
+        Se construye una vez con construir(self) y vive lo mismo que la vista,
+        es decir, hasta que el archivo cambie.
+        """
+        estructura = self._derivados.get(clave)
+        if estructura is None:
+            with self._derivados_lock:
+                estructura = self._derivados.get(clave)
+                if estructura is None:
+                    estructura = self._derivados[clave] = construir(self)
+        return estructura
+
+    def columna(self, nombre):
+        """Valores tipados de un campo canónico, alineados con los registros"""
+        return self.columnas[nombre]
+
+    def posiciones_ubicacion(self, ubicacion):
+        """Posiciones de una ubicación (sin distinguir mayúsculas ni tildes)"""
+        return self._por_ubicacion.get(clave_ubicacion(ubicacion), [])
+
+    def filtrar(self, ubicacion=None, fecha=None):
+        """
+        Posiciones (ordenadas) que cumplen los filtros.
+        fecha: prefijo 'AAAA', 'AAAA-MM' o 'AAAA-MM-DD', o fecha con hora exacta.
+        Retorna None si la fecha no tiene uno de esos formatos.
+        """
+        posiciones = self.posiciones_ubicacion(ubicacion) if ubicacion else range(self.total)
+
+        if fecha:
+            periodo = periodo_fecha(fecha)
+            if periodo is None:
+                return None
+            inicio, fin = periodo
+            fechas = self.columnas['fecha']
+            posiciones = [pos for pos in posiciones if fechas[pos] is not None and inicio <= fechas[pos] < fin]
+
+        return list(posiciones)
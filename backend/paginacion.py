@@ -0,0 +1,94 @@
+"""
+WaterWay - Paginación por cursor y proyección de campos para los listados
+El cursor es opaco para el cliente: guarda la posición, la versión de los
+datos y una huella de la consulta, así una página siguiente nunca mezcla
+resultados de otra consulta ni de otra versión de los archivos.
+"""
+import base64
+import hashlib
+import json
+
+
+# Parámetros que no cambian qué resultados hay ni su orden
+PARAMETROS_PAGINACION = {'cursor', 'limit', 'fields'}
+
+
+class Pagina:
+    """Una página de resultados"""
+
+    def __init__(self, registros, total, siguiente=None, paginada=False):
+        self.registros = registros      # registros de la página (ya proyectados)
+        self.total = total              # total de resultados de la consulta
+        self.siguiente = siguiente      # cursor de la página siguiente, o None si es la última
+        self.paginada = paginada        # si se pidió limit o cursor
+
+
+def huella_consulta(ruta, parametros):
+    """Huella corta de una consulta (ruta + filtros, sin los parámetros de paginación)"""
+    partes = [ruta] + [
+        f"{clave}={valor}" for clave, valor in sorted(parametros)
+        if clave not in PARAMETROS_PAGINACION
+    ]
+    return hashlib.sha1('&'.join(partes).encode('utf-8')).hexdigest()[:12]
+
+
+def codificar_cursor(posicion, version, huella):
+    """Cursor opaco (base64 url-safe) para continuar desde posicion"""
+    datos = json.dumps({'p': posicion, 'v': version, 'q': huella}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, version, huella):
+    """Posición guardada en el cursor; ValueError si es inválido o quedó desactualizado"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        posicion = int(datos['p'])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Cursor inválido")
+
+    if datos.get('q') != huella:
+        raise ValueError("El cursor corresponde a otra consulta")
+    if datos.get('v') != version:
+        raise ValueError("Los datos cambiaron desde la página anterior; vuelve a consultar sin cursor")
+    if posicion < 0:
+        raise ValueError("Cursor inválido")
+    return posicion
+
+
+def parsear_campos(texto):
+    """Convierte 'a,b,c' en una lista de campos (None si no se pidió proyección)"""
+    if not texto:
+        return None
+    campos = [campo.strip() for campo in texto.split(',') if campo.strip()]
+    return campos or None
+
+
+def proyectar(registros, campos):
+    """Deja en cada registro solo los campos pedidos (los que no tiene se omiten)"""
+    if not campos:
+        return registros
+    return [{campo: r[campo] for campo in campos if campo in r} for r in registros]
+
+
+def paginar(registros, version, huella, cursor=None, limite=None, campos=None):
+    """
+    Corta una página de registros.
+    Sin limite ni cursor devuelve todo (comportamiento anterior de los endpoints).
+    """
+    inicio = decodificar_cursor(cursor, version, huella) if cursor else 0
+    total = len(registros)
+
+    # limit=0 siempre significó "sin límite"
+    if limite is not None and limite <= 0:
+        limite = None
+
+    fin = total if limite is None else min(total, inicio + limite)
+    siguiente = codificar_cursor(fin, version, huella) if fin < total else None
+
+    return Pagina(
+        proyectar(registros[inicio:fin], campos),
+        total,
+        siguiente=siguiente,
+        paginada=bool(cursor) or limite is not None,
+    )
@@ -2,68 +2,365 @@
 WaterWay - Predictor de consumo y riesgo hídrico
 Usa modelos de Machine Learning entrenados en Colab
 """
-import joblib
-import pandas as pd
+import calendar
+import hashlib
 import numpy as np
 import json
+import numbers
+import os
+import threading
+from collections import OrderedDict
+from itertools import product
 from pathlib import Path
 from datetime import datetime
 
+from modelos_compilados import COMPILADOS_PATH, cargar_compilados, fuente_compilados, hash_archivo
+
+# Usa los modelos compilados a NumPy (models/waterway_models_compilados.npz) si están al día con el .pkl
+USAR_MODELOS_COMPILADOS = os.getenv('WATERWAY_MODELOS_COMPILADOS', '1') == '1'
+
+# Consumo base por estrato (m³): fallback sin modelo y baseline histórico del modelo
+CONSUMO_BASE = {
+    '1': 15, '2': 17, '3': 19, '4': 21,
+    '5': 25, '6': 30, 'Comercial': 150, 'Industrial': 500
+}
+
+# Máximo de escenarios por llamada de predicción en lote
+MAX_ESCENARIOS_LOTE = 10000
+
+# Máximo de resultados memorizados por el predictor (LRU)
+MAX_MEMO = 4096
+
+def _sumar_meses(fecha, meses):
+    """Misma fecha `meses` meses después; el día se ajusta al último del mes si no existe"""
+    indice = fecha.month - 1 + meses
+    anio, mes = fecha.year + indice // 12, indice % 12 + 1
+    return fecha.replace(year=anio, month=mes, day=min(fecha.day, calendar.monthrange(anio, mes)[1]))
+
+class _CacheMemo:
+    """Resultados de predicciones por entradas normalizadas, acotados por LRU y thread-safe"""
+    
+    def __init__(self, max_entradas=MAX_MEMO):
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self.descartes = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obtener(self, clave):
+        """Resultado guardado para la clave, o None"""
+        with self._lock:
+            resultado = self._entradas.get(clave)
+            if resultado is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return resultado
+    
+    def guardar(self, clave, resultado):
+        with self._lock:
+            self._entradas[clave] = resultado
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.descartes += 1
+    
+    def limpiar(self):
+        """Vacía la cache (los contadores se conservan)"""
+        with self._lock:
+            self._entradas.clear()
+    
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'descartes': self.descartes,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0,
+            }
+
+def _clave_memo(tipo, version, estrato, *numericos):
+    """
+    Clave de memo con las entradas normalizadas (estrato '3' y 3, mes 3 y 3.0 son lo mismo).
+    None si alguna entrada no es un número: esa llamada no se memoriza.
+    """
+    if not all(isinstance(v, numbers.Real) for v in numericos):
+        return None
+    return (tipo, version, str(estrato)) + tuple(float(v) for v in numericos)
+
+def _arreglos_lote(estratos, *numericos):
+    """
+    Arreglos 1-D alineados para una predicción en lote: estratos como texto
+    y el resto como float; un valor único se repite para todos los escenarios.
+    """
+    try:
+        arreglos = np.broadcast_arrays(
+            np.asarray(estratos, dtype=object).astype(str),
+            *(np.asarray(valores, dtype=np.float64) for valores in numericos)
+        )
+    except (TypeError, ValueError):
+        raise ValueError("Los escenarios deben tener estrato y valores numéricos, con el mismo largo")
+    arreglos = [a.reshape(-1) for a in arreglos]
+    if len(arreglos[0]) > MAX_ESCENARIOS_LOTE:
+        raise ValueError(f"Máximo {MAX_ESCENARIOS_LOTE} escenarios por lote")
+    return arreglos
+
 class WaterPredictor:
     """Predictor de consumo y riesgo hídrico usando ML"""
     
-    def __init__(self):
-        model_path = Path(__file__).parent / 'models' / 'waterway_models.pkl'
-        proyecciones_model_path = Path(__file__).parent / 'models' / 'waterway_proyecciones_model.pkl'
-        proyecciones_data_path = Path(__file__).parent / 'data' / 'processed' / 'proyecciones_12_meses.json'
+    def __init__(self, cargar=True):
+        """
+        cargar=False deja el predictor sin modelos hasta llamar a _cargar()
+        o cargar_en_segundo_plano(); mientras tanto `listo` es False
+        """
+        self.model_path = Path(__file__).parent / 'models' / 'waterway_models.pkl'
+        self.proyecciones_model_path = Path(__file__).parent / 'models' / 'waterway_proyecciones_model.pkl'
+        self.proyecciones_data_path = Path(__file__).parent / 'data' / 'processed' / 'proyecciones_12_meses.json'
+        self.compilados_path = COMPILADOS_PATH
+        self._memo = _CacheMemo()
+        self._carga_lock = threading.Lock()     # una carga a la vez
+        self._estado_lock = threading.Lock()    # modelos + versión, publicados juntos
+        self._listo = threading.Event()
+        self._detener_recarga = threading.Event()
+        self._hilo_recarga = None
+        self._firma = None
+        self._version = 'cargando'
+        self.models = None
+        self.ml_enabled = False
+        self.modelos_compilados = False
+        self.proyecciones_model = None
+        self.proyecciones_data = []
+        self.proyecciones_enabled = False
+        if cargar:
+            self._cargar()
+    
+    @property
+    def listo(self):
+        """True cuando terminó la primera carga de modelos (con o sin ML)"""
+        return self._listo.is_set()
+    
+    def esperar(self, timeout=None):
+        """Bloquea hasta que los modelos estén cargados. Retorna `listo`"""
+        return self._listo.wait(timeout)
+    
+    def cargar_en_segundo_plano(self):
+        """Carga los modelos en un thread, para no demorar el arranque del servidor"""
+        def cargar():
+            try:
+                self._cargar()
+            except Exception as e:
+                print(f"[ERROR] Error cargando modelos en segundo plano: {e}")
+            finally:
+                self._listo.set()
+        
+        thread = threading.Thread(target=cargar, name='waterway-carga-modelos', daemon=True)
+        thread.start()
+        return thread
+    
+    def _firma_archivos(self):
+        """Firma (mtime, tamaño) de los archivos de modelos, para detectar cambios"""
+        firma = {}
+        for ruta in (self.model_path, self.compilados_path, self.proyecciones_model_path, self.proyecciones_data_path):
+            try:
+                st = os.stat(ruta)
+                firma[ruta.name] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                firma[ruta.name] = None
+        return firma
+    
+    @property
+    def version(self):
+        """
+        Versión de los modelos cargados (cambia al recargar otros archivos).
+        Sin modelos, las proyecciones simuladas dependen de la fecha, así que
+        la versión también.
+        """
+        if not self.ml_enabled and not self.proyecciones_enabled:
+            return f"{self._version}.{datetime.now():%Y%m%d}"
+        return self._version
+    
+    def recargar(self, forzar=False):
+        """
+        Recarga los modelos si cambiaron los archivos (no antes de la primera carga).
+        Retorna True si recargó
+        """
+        if not self.listo:
+            return False
+        if not forzar and self._firma_archivos() == self._firma:
+            return False
+        self._cargar()
+        print(f"[OK] Modelos de ML recargados: versión {self._version}")
+        return True
+    
+    @property
+    def recarga_automatica(self):
+        """Indica si el thread de recarga en segundo plano está activo"""
+        return self._hilo_recarga is not None and self._hilo_recarga.is_alive()
+    
+    def iniciar_recarga_automatica(self, intervalo):
+        """
+        Inicia un thread que detecta cambios en los archivos de modelos y los recarga
+        intervalo: segundos entre revisiones (app.py usa el de los datos, INTERVALO_RECARGA)
+        """
+        if self.recarga_automatica:
+            return
+        
+        self._detener_recarga.clear()
+        self._hilo_recarga = threading.Thread(
+            target=self._ciclo_recarga,
+            args=(intervalo,),
+            name='waterway-recarga-modelos',
+            daemon=True
+        )
+        self._hilo_recarga.start()
+    
+    def detener_recarga_automatica(self):
+        """Detiene el thread de recarga en segundo plano"""
+        self._detener_recarga.set()
+        if self._hilo_recarga is not None:
+            self._hilo_recarga.join()
+            self._hilo_recarga = None
+    
+    def _ciclo_recarga(self, intervalo):
+        """Bucle del thread de recarga"""
+        while not self._detener_recarga.wait(intervalo):
+            try:
+                self.recargar()
+            except Exception as e:
+                print(f"[ERROR] Error recargando modelos: {e}")
+    
+    def _compilados_vigentes(self):
+        """Indica si hay modelos compilados exportados del .pkl actual (o sin .pkl)"""
+        if not USAR_MODELOS_COMPILADOS or not self.compilados_path.exists():
+            return False
+        if not self.model_path.exists():
+            return True
+        if fuente_compilados(self.compilados_path) != hash_archivo(self.model_path):
+            print("[!] Modelos compilados desactualizados, se usa el .pkl (regenerar con: python modelos_compilados.py)")
+            return False
+        return True
+    
+    def _cargar(self):
+        """
+        Carga los modelos y las proyecciones desde disco.
+        Se leen aparte y se publican juntos con la versión nueva (bajo lock);
+        la cache de resultados se vacía recién después del cambio, así ningún
+        resultado calculado con los modelos anteriores queda bajo la versión nueva.
+        """
+        with self._carga_lock:
+            firma = self._firma_archivos()
+            estado = self._leer_modelos()
+            with self._estado_lock:
+                self.models = estado['models']
+                self.ml_enabled = estado['ml_enabled']
+                self.modelos_compilados = estado['modelos_compilados']
+                self.proyecciones_model = estado['proyecciones_model']
+                self.proyecciones_data = estado['proyecciones_data']
+                self.proyecciones_enabled = estado['proyecciones_enabled']
+                self._firma = firma
+                self._version = hashlib.sha1(repr(sorted(firma.items())).encode('utf-8')).hexdigest()[:16]
+            self._memo.limpiar()
+        
+        self._listo.set()
+    
+    def _leer_modelos(self):
+        """Lee los modelos y las proyecciones sin tocar el estado publicado"""
+        model_path = self.model_path
+        proyecciones_model_path = self.proyecciones_model_path
+        proyecciones_data_path = self.proyecciones_data_path
+        estado = {
+            'models': None,
+            'ml_enabled': False,
+            'modelos_compilados': False,
+            'proyecciones_model': None,
+            'proyecciones_data': [],
+            'proyecciones_enabled': False,
+        }
+        
+        # Carga modelo base: la versión compilada (NumPy, sin sklearn ni xgboost)
+        # si está al día, y si no el .pkl
+        if self._compilados_vigentes():
+            try:
+                estado['models'] = cargar_compilados(self.compilados_path)
+                estado['ml_enabled'] = True
+                estado['modelos_compilados'] = True
+                print("[OK] Modelos de ML compilados cargados (NumPy)")
+            except Exception as e:
+                print(f"[!] Error cargando modelos compilados: {e}")
         
-        # Carga modelo base
-        if not model_path.exists():
+        if not estado['ml_enabled'] and not model_path.exists():
             print("[!] Modelo ML no encontrado, usando predicciones simuladas")
-            self.models = None
-            self.ml_enabled = False
-        else:
+        elif not estado['ml_enabled']:
             try:
-                self.models = joblib.load(model_path)
-                self.ml_enabled = True
+                import joblib  # solo para el .pkl: el camino compilado no lo necesita
+                estado['models'] = joblib.load(model_path)
+                estado['ml_enabled'] = True
                 print("[OK] Modelos de ML cargados correctamente")
-                
-                # Extrae metadata
-                metadata = self.models.get('metadata', {})
-                print(f"    - Fecha entrenamiento: {metadata.get('fecha_entrenamiento', 'N/A')}")
-                print(f"    - Registros usados: {metadata.get('num_registros_consumo', 'N/A')}")
-                print(f"    - Estratos: {len(metadata.get('estratos', []))}")
             except Exception as e:
                 print(f"[ERROR] Error cargando modelo: {e}")
-                self.models = None
-                self.ml_enabled = False
         
-        # Carga modelo de proyecciones y datos pre-calculados
-        self.proyecciones_model = None
-        self.proyecciones_data = []
-        self.proyecciones_enabled = False
+        if estado['ml_enabled']:
+            # Extrae metadata
+            metadata = estado['models'].get('metadata', {})
+            print(f"    - Fecha entrenamiento: {metadata.get('fecha_entrenamiento', 'N/A')}")
+            print(f"    - Registros usados: {metadata.get('num_registros_consumo', 'N/A')}")
+            print(f"    - Estratos: {len(metadata.get('estratos', []))}")
         
+        # Carga modelo de proyecciones y datos pre-calculados
         if proyecciones_model_path.exists() and proyecciones_data_path.exists():
             try:
                 # Carga modelo de proyecciones
-                self.proyecciones_model = joblib.load(proyecciones_model_path)
+                import joblib
+                proyecciones_model = joblib.load(proyecciones_model_path)
                 
                 # Carga proyecciones pre-calculadas
                 with open(proyecciones_data_path, 'r', encoding='utf-8') as f:
-                    self.proyecciones_data = json.load(f)
+                    proyecciones_data = json.load(f)
                 
-                self.proyecciones_enabled = True
+                estado['proyecciones_model'] = proyecciones_model
+                estado['proyecciones_data'] = proyecciones_data
+                estado['proyecciones_enabled'] = True
                 
                 # Extrae metadata
-                metadata_proy = self.proyecciones_model.get('metadata', {})
+                metadata_proy = proyecciones_model.get('metadata', {})
                 print("[OK] Modelo de proyecciones cargado")
                 print(f"    - Precision: {metadata_proy.get('r2', 0)*100:.1f}%")
-                print(f"    - Proyecciones: {len(self.proyecciones_data)} registros")
+                print(f"    - Proyecciones: {len(proyecciones_data)} registros")
                 print(f"    - Escenarios: Actual, Optimista, Pesimista")
             except Exception as e:
                 print(f"[!] Error cargando proyecciones: {e}")
                 print("    Usando proyecciones simuladas")
-                self.proyecciones_enabled = False
+        
+        return estado
+    
+    def estadisticas_cache(self):
+        """Uso de la cache de resultados de predecir_consumo y clasificar_riesgo"""
+        return self._memo.estadisticas()
+    
+    def _estado(self):
+        """(versión, ml_enabled, models) publicados juntos por la última carga"""
+        with self._estado_lock:
+            return self._version, self.ml_enabled, self.models
+    
+    def _memorizado(self, clave, calcular):
+        """
+        Resultado desde la cache o calculándolo (sin clave no se memoriza).
+        calcular() retorna (resultado, memorizable): los respaldos ante un
+        error del modelo no se guardan.
+        """
+        if clave is not None:
+            resultado = self._memo.obtener(clave)
+            if resultado is not None:
+                return resultado
+        resultado, memorizable = calcular()
+        if clave is not None and memorizable:
+            self._memo.guardar(clave, resultado)
+        return resultado
     
     def predecir_consumo(self, estrato, mes, precipitacion=150, temperatura=22):
         """
@@ -78,20 +375,25 @@ class WaterPredictor:
         Returns:
             float - Consumo predicho en m³
         """
+        version, ml_enabled, models = self._estado()
+        clave = _clave_memo('consumo', version, estrato, mes, precipitacion, temperatura)
+        return self._memorizado(
+            clave, lambda: self._predecir_consumo(ml_enabled, models, estrato, mes, precipitacion, temperatura)
+        )
+    
+    def _predecir_consumo(self, ml_enabled, models, estrato, mes, precipitacion, temperatura):
+        """(consumo, memorizable) con los modelos de una misma carga"""
         # Fallback si no hay modelo
-        consumo_base = {
-            '1': 15, '2': 17, '3': 19, '4': 21, 
-            '5': 25, '6': 30, 'Comercial': 150, 'Industrial': 500
-        }
+        consumo_base = CONSUMO_BASE
         
-        if not self.ml_enabled:
+        if not ml_enabled:
             # Simulación simple con estacionalidad
             base = consumo_base.get(str(estrato), 20)
             factor_clima = 1 + ((temperatura - 22) * 0.02) - ((precipitacion - 150) * 0.001)
-            return round(base * factor_clima, 2)
+            return round(base * factor_clima, 2), True
         
         try:
-            modelo_data = self.models['consumo_predictor']
+            modelo_data = models['consumo_predictor']
             model = modelo_data['model']
             scaler = modelo_data['scaler']
             le_estrato = modelo_data['label_encoder_estrato']
@@ -112,12 +414,61 @@ class WaterPredictor:
             X_scaled = scaler.transform(X)
             prediccion = model.predict(X_scaled)[0]
             
-            return round(prediccion, 2)
+            return round(prediccion, 2), True
             
         except Exception as e:
             print(f"Error en predicción ML: {e}")
             # Fallback
-            return consumo_base.get(str(estrato), 20)
+            return consumo_base.get(str(estrato), 20), False
+    
+    def predecir_consumo_lote(self, estratos, meses, precipitaciones=150, temperaturas=22):
+        """
+        Predice consumo para muchos escenarios en una sola pasada
+        (codifica, escala y predice la matriz completa de una vez)
+        
+        Args:
+            estratos, meses, precipitaciones, temperaturas: listas alineadas,
+            o un valor único que se usa para todos los escenarios
+        
+        Returns:
+            list - Consumo predicho en m³ de cada escenario (igual a predecir_consumo)
+        """
+        estratos, meses, precipitaciones, temperaturas = _arreglos_lote(
+            estratos, meses, precipitaciones, temperaturas
+        )
+        if len(estratos) == 0:
+            return []
+        _, ml_enabled, models = self._estado()
+        
+        # Baseline de cada estrato (una búsqueda por estrato distinto)
+        distintos, inversa = np.unique(estratos, return_inverse=True)
+        base = np.array([CONSUMO_BASE.get(e, 20) for e in distintos], dtype=np.float64)[inversa]
+        
+        if not ml_enabled:
+            factor_clima = 1 + ((temperaturas - 22) * 0.02) - ((precipitaciones - 150) * 0.001)
+            return [round(float(v), 2) for v in base * factor_clima]
+        
+        modelo_data = models['consumo_predictor']
+        clases = {clase: i for i, clase in enumerate(modelo_data['label_encoder_estrato'].classes_)}
+        codigos = np.array([clases.get(e, -1) for e in distintos])[inversa]
+        
+        # Estratos que el modelo no conoce usan el consumo base, como predecir_consumo
+        resultado = base.copy()
+        conocidos = codigos >= 0
+        if conocidos.any():
+            try:
+                m = meses[conocidos]
+                X = np.column_stack([
+                    m, (m - 1) // 3 + 1, m * 30,
+                    precipitaciones[conocidos], temperaturas[conocidos],
+                    base[conocidos], codigos[conocidos]
+                ])
+                prediccion = modelo_data['model'].predict(modelo_data['scaler'].transform(X))
+                resultado[conocidos] = [round(v, 2) for v in prediccion]
+            except Exception as e:
+                print(f"Error en predicción ML en lote: {e}")
+        
+        return resultado.tolist()
     
     def clasificar_riesgo(self, ciudad, estrato, consumo, mes, precipitacion=150, temperatura=22):
         """
@@ -126,7 +477,16 @@ class WaterPredictor:
         Returns:
             str - 'Alto', 'Medio' o 'Bajo'
         """
-        if not self.ml_enabled:
+        # La ciudad no es una feature del modelo: no forma parte de la clave
+        version, ml_enabled, models = self._estado()
+        clave = _clave_memo('riesgo', version, estrato, consumo, mes, precipitacion, temperatura)
+        return self._memorizado(
+            clave, lambda: self._clasificar_riesgo(ml_enabled, models, estrato, consumo, mes, precipitacion, temperatura)
+        )
+    
+    def _clasificar_riesgo(self, ml_enabled, models, estrato, consumo, mes, precipitacion, temperatura):
+        """(nivel, memorizable) con los modelos de una misma carga"""
+        if not ml_enabled:
             # Simulación basada en reglas
             score = 0
             if consumo > 25:
@@ -139,13 +499,13 @@ class WaterPredictor:
                 score += 20
             
             if score >= 60:
-                return 'Alto'
+                return 'Alto', True
             elif score >= 30:
-                return 'Medio'
-            return 'Bajo'
+                return 'Medio', True
+            return 'Bajo', True
         
         try:
-            modelo_data = self.models['riesgo_clasificador']
+            modelo_data = models['riesgo_clasificador']
             model = modelo_data['model']
             le_estrato = modelo_data['label_encoder_estrato']
             le_riesgo = modelo_data['label_encoder_riesgo']
@@ -164,11 +524,59 @@ class WaterPredictor:
             prediccion_encoded = model.predict(X)[0]
             nivel_riesgo = le_riesgo.inverse_transform([prediccion_encoded])[0]
             
-            return nivel_riesgo
+            return nivel_riesgo, True
             
         except Exception as e:
             print(f"Error en clasificación ML: {e}")
-            return 'Medio'
+            return 'Medio', False
+    
+    def clasificar_riesgo_lote(self, ciudad, estratos, consumos, meses, precipitaciones=150, temperaturas=22):
+        """
+        Clasifica el riesgo de muchos escenarios con una sola predicción del modelo
+        
+        Returns:
+            list - 'Alto', 'Medio' o 'Bajo' de cada escenario (igual a clasificar_riesgo)
+        """
+        estratos, consumos, meses, precipitaciones, temperaturas = _arreglos_lote(
+            estratos, consumos, meses, precipitaciones, temperaturas
+        )
+        if len(estratos) == 0:
+            return []
+        _, ml_enabled, models = self._estado()
+        
+        if not ml_enabled:
+            # Simulación basada en reglas
+            score = (
+                np.where(consumos > 25, 30, 0)
+                + np.where(precipitaciones < 100, 25, 0)
+                + np.where(temperaturas > 24, 15, 0)
+                + np.where(np.isin(meses, [12, 1, 2, 3]), 20, 0)
+            )
+            return np.where(score >= 60, 'Alto', np.where(score >= 30, 'Medio', 'Bajo')).tolist()
+        
+        modelo_data = models['riesgo_clasificador']
+        clases = {clase: i for i, clase in enumerate(modelo_data['label_encoder_estrato'].classes_)}
+        distintos, inversa = np.unique(estratos, return_inverse=True)
+        codigos = np.array([clases.get(e, -1) for e in distintos])[inversa]
+        
+        # Estratos desconocidos (o un error del modelo) dan 'Medio', como clasificar_riesgo
+        resultado = np.full(len(estratos), 'Medio', dtype=object)
+        conocidos = codigos >= 0
+        if conocidos.any():
+            try:
+                # Features: ['mes', 'estrato_encoded', 'consumo_m3', 'precipitacion_mm',
+                #            'temperatura_c', 'consumo_ma_3', 'consumo_percentil']
+                X = np.column_stack([
+                    meses[conocidos], codigos[conocidos], consumos[conocidos],
+                    precipitaciones[conocidos], temperaturas[conocidos],
+                    consumos[conocidos], np.full(conocidos.sum(), 0.5)
+                ])
+                prediccion = modelo_data['model'].predict(X)
+                resultado[conocidos] = modelo_data['label_encoder_riesgo'].inverse_transform(prediccion)
+            except Exception as e:
+                print(f"Error en clasificación ML en lote: {e}")
+        
+        return resultado.tolist()
     
     def obtener_proyecciones(self, ciudad='Medellín', estrato=None):
         """
@@ -203,32 +611,43 @@ class WaterPredictor:
         return self._proyecciones_simuladas(estrato)
     
     def _proyecciones_simuladas(self, estrato=None):
-        """Genera proyecciones simuladas si no hay modelo"""
+        """
+        Genera proyecciones simuladas si no hay modelo
+        Arma la grilla estrato × mes × escenario completa y la predice en un solo lote.
+        """
         estratos = [estrato] if estrato else ['1', '2', '3', '4', '5', '6', 'Comercial', 'Industrial']
-        proyecciones = []
         
         fecha_base = datetime.now()
+        meses = [((fecha_base.month + mes_futuro - 1) % 12) + 1 for mes_futuro in range(1, 13)]
+        fechas = [
+            _sumar_meses(fecha_base, mes_futuro).strftime('%Y-%m-%d')
+            for mes_futuro in range(1, 13)
+        ]
         
-        for est in estratos:
-            consumo_base = self.predecir_consumo(est, fecha_base.month)
-            
-            for mes_futuro in range(1, 13):
-                mes = ((fecha_base.month + mes_futuro - 1) % 12) + 1
-                fecha = (fecha_base + pd.DateOffset(months=mes_futuro)).strftime('%Y-%m-%d')
-                
-                consumo_actual = self.predecir_consumo(est, mes, 150, 22)
-                consumo_pesimista = self.predecir_consumo(est, mes, 120, 24)  # +2°C, -20% lluvia
-                consumo_optimista = self.predecir_consumo(est, mes, 135, 23)  # +1°C, -10% lluvia
-                
-                proyecciones.append({
-                    'fecha': fecha,
-                    'estrato': str(est),
-                    'consumo_actual': consumo_actual,
-                    'consumo_pesimista': consumo_pesimista,
-                    'consumo_optimista': consumo_optimista,
-                    'incremento_pesimista_pct': round((consumo_pesimista - consumo_actual) / consumo_actual * 100, 2),
-                    'incremento_optimista_pct': round((consumo_optimista - consumo_actual) / consumo_actual * 100, 2)
-                })
+        # Escenarios (precipitación, temperatura): actual, pesimista (+2°C, -20% lluvia)
+        # y optimista (+1°C, -10% lluvia)
+        escenarios = [(150, 22), (120, 24), (135, 23)]
+        
+        grilla_estratos = np.repeat(np.array(estratos, dtype=object).astype(str), len(meses) * len(escenarios))
+        grilla_meses = np.tile(np.repeat(meses, len(escenarios)), len(estratos))
+        grilla_clima = np.tile(np.array(escenarios, dtype=np.float64), (len(estratos) * len(meses), 1))
+        
+        consumos = self.predecir_consumo_lote(
+            grilla_estratos, grilla_meses, grilla_clima[:, 0], grilla_clima[:, 1]
+        )
+        
+        proyecciones = []
+        for i, (est, fecha) in enumerate(product(estratos, fechas)):
+            consumo_actual, consumo_pesimista, consumo_optimista = consumos[3 * i:3 * i + 3]
+            proyecciones.append({
+                'fecha': fecha,
+                'estrato': str(est),
+                'consumo_actual': consumo_actual,
+                'consumo_pesimista': consumo_pesimista,
+                'consumo_optimista': consumo_optimista,
+                'incremento_pesimista_pct': round((consumo_pesimista - consumo_actual) / consumo_actual * 100, 2),
+                'incremento_optimista_pct': round((consumo_optimista - consumo_actual) / consumo_actual * 100, 2)
+            })
         
         return proyecciones
     
@@ -269,7 +688,7 @@ class WaterPredictor:
         ]
         
         # Calcula riesgo general
-        riesgos = [self.clasificar_riesgo(ciudad, '3', 20, mes_actual + i) for i in range(12)]
+        riesgos = self.clasificar_riesgo_lote(ciudad, '3', 20, [mes_actual + i for i in range(12)])
         nivel_riesgo_predominante = max(set(riesgos), key=riesgos.count)
         
         return {
@@ -306,10 +725,20 @@ class WaterPredictor:
 
 # Singleton global
 _predictor = None
+_predictor_lock = threading.Lock()
 
-def get_predictor():
-    """Obtiene instancia única del predictor"""
+def get_predictor(en_segundo_plano=False):
+    """
+    Obtiene instancia única del predictor
+    en_segundo_plano=True la retorna enseguida y carga los modelos en un thread
+    (ver WaterPredictor.listo)
+    """
     global _predictor
     if _predictor is None:
-        _predictor = WaterPredictor()
+        with _predictor_lock:
+            if _predictor is None:
+                predictor = WaterPredictor(cargar=not en_segundo_plano)
+                if en_segundo_plano:
+                    predictor.cargar_en_segundo_plano()
+                _predictor = predictor
     return _predictor
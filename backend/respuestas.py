@@ -0,0 +1,196 @@
+"""
+WaterWay - Respuestas condicionales, comprimidas y cacheadas para los endpoints de datos
+Cada URL tiene un ETag fuerte derivado de la versión de los datos, los
+cuerpos gzip/brotli se comprimen una sola vez por versión y las respuestas
+ya serializadas se reutilizan entre usuarios.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Brotli es opcional; sin él se sirve solo gzip
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# Cuerpos más chicos que esto no se comprimen (no compensa)
+TAMANO_MINIMO_COMPRESION = 1024
+
+# Máximo de cuerpos comprimidos guardados (LRU)
+MAX_COMPRIMIDOS = 256
+
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 5
+
+
+def calcular_etag(version, ruta, parametros):
+    """ETag (sin comillas) de una URL para una versión de los datos"""
+    consulta = '&'.join(f"{clave}={valor}" for clave, valor in sorted(parametros))
+    huella = hashlib.sha1(f"{ruta}?{consulta}".encode('utf-8')).hexdigest()[:16]
+    return f"{version}-{huella}"
+
+
+def etag_representacion(etag, codificacion):
+    """ETag de una representación: cada codificación tiene bytes distintos"""
+    return f"{etag}-{codificacion}" if codificacion else etag
+
+
+def etag_coincide(if_none_match, etag):
+    """Indica si If-None-Match incluye el ETag en alguna de sus codificaciones"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    validos = {etag, etag_representacion(etag, 'gzip'), etag_representacion(etag, 'br')}
+    for etiqueta in if_none_match.split(','):
+        etiqueta = etiqueta.strip()
+        if etiqueta.startswith('W/'):
+            etiqueta = etiqueta[2:]
+        if etiqueta.strip('"') in validos:
+            return True
+    return False
+
+
+def elegir_codificacion(aceptadas):
+    """
+    Codificación a usar según Accept-Encoding ('br', 'gzip' o None)
+    aceptadas: objeto Accept de werkzeug (request.accept_encodings)
+    """
+    if BROTLI_AVAILABLE and aceptadas.quality('br') > 0:
+        return 'br'
+    if aceptadas.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def comprimir(cuerpo, codificacion):
+    """Comprime bytes con la codificación indicada"""
+    if codificacion == 'br':
+        return brotli.compress(cuerpo, quality=CALIDAD_BROTLI)
+    return gzip.compress(cuerpo, compresslevel=NIVEL_GZIP, mtime=0)
+
+
+class CacheComprimidos:
+    """
+    Cuerpos comprimidos por (ETag, codificación).
+    Como el ETag incluye la versión de los datos, cada cuerpo se comprime
+    una vez por versión; las versiones viejas salen solas por LRU.
+    """
+
+    def __init__(self, max_entradas=MAX_COMPRIMIDOS):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obtener(self, etag, codificacion, cuerpo):
+        """Cuerpo comprimido, desde la cache o comprimiéndolo ahora"""
+        clave = (etag, codificacion)
+
+        with self._lock:
+            comprimido = self._entradas.get(clave)
+            if comprimido is not None:
+                self._entradas.move_to_end(clave)
+                return comprimido
+
+        comprimido = comprimir(cuerpo, codificacion)
+
+        with self._lock:
+            self._entradas[clave] = comprimido
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+        return comprimido
+
+
+class CacheRespuestas:
+    """
+    Cache LRU de respuestas ya serializadas, acotada por tamaño total en bytes.
+    La clave incluye la versión de los datos: cuando un grupo (EPM, Uruguay,
+    ML) cambia de versión se descartan sus respuestas anteriores.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.descartes = 0
+        self._entradas = OrderedDict()      # (grupo, version, ruta, consulta) -> cuerpo
+        self._versiones = {}                # grupo -> última versión vista
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    @staticmethod
+    def clave(grupo, version, ruta, parametros):
+        """Clave de una respuesta: la consulta se normaliza ordenando los parámetros"""
+        consulta = '&'.join(f"{clave}={valor}" for clave, valor in sorted(parametros))
+        return (grupo, version, ruta, consulta)
+
+    def obtener(self, clave):
+        """Cuerpo guardado para la clave, o None"""
+        with self._lock:
+            cuerpo = self._entradas.get(clave)
+            if cuerpo is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return cuerpo
+
+    def guardar(self, clave, cuerpo):
+        """Guarda un cuerpo; los más grandes que un cuarto de la cache no se guardan"""
+        if len(cuerpo) > self.max_bytes // 4:
+            return
+
+        grupo, version = clave[0], clave[1]
+        with self._lock:
+            if self._versiones.get(grupo) != version:
+                self._versiones[grupo] = version
+                self._descartar(lambda c: c[0] == grupo and c[1] != version)
+
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= len(anterior)
+            self._entradas[clave] = cuerpo
+            self.bytes += len(cuerpo)
+
+            while self.bytes > self.max_bytes:
+                _, viejo = self._entradas.popitem(last=False)
+                self.bytes -= len(viejo)
+                self.descartes += 1
+
+    def _descartar(self, condicion):
+        for clave in [c for c in self._entradas if condicion(c)]:
+            self.bytes -= len(self._entradas.pop(clave))
+
+    def limpiar(self):
+        """Vacía la cache (los contadores se conservan)"""
+        with self._lock:
+            self._entradas.clear()
+            self._versiones.clear()
+            self.bytes = 0
+
+    def estadisticas(self):
+        """Contadores de uso de la cache"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'descartes': self.descartes,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0,
+            }
@@ -0,0 +1,161 @@
+"""
+WaterWay - Series temporales de calidad de agua (NumPy)
+Re-muestrea las mediciones por policlínica a frecuencia diaria, semanal o
+mensual con promedio, mínimo, máximo, percentil 95 y promedio móvil.
+Los cálculos son vectorizados sobre todas las muestras de la ubicación y
+cada (ubicación, frecuencia) se calcula una sola vez por versión de los datos;
+el promedio móvil se aplica encima en cada consulta.
+"""
+import threading
+
+import numpy as np
+
+from agregaciones import percentiles_por_grupo
+
+# Métricas de la vista normalizada de calidad_agua
+METRICAS = ('sodio', 'cloruro', 'conductividad', 'solidos_totales')
+
+# Nombres aceptados para cada frecuencia
+FRECUENCIAS = {
+    'diaria': 'diaria', 'd': 'diaria', 'dia': 'diaria',
+    'semanal': 'semanal', 'w': 'semanal', 'semana': 'semanal',
+    'mensual': 'mensual', 'm': 'mensual', 'mes': 'mensual',
+}
+
+PERCENTIL = 95
+
+# Ventana (en períodos) del promedio móvil por defecto
+VENTANA_MOVIL = 3
+
+
+def _inicio_periodo(dias, frecuencia):
+    """Primer día del período (datetime64[D]) de cada fecha"""
+    if frecuencia == 'mensual':
+        return dias.astype('datetime64[M]').astype('datetime64[D]')
+    if frecuencia == 'semanal':
+        # Semanas de lunes a domingo; el 1970-01-01 fue jueves
+        numeros = dias.astype(np.int64)
+        return (numeros - (numeros + 3) % 7).astype('datetime64[D]')
+    return dias
+
+
+def _redondear(arreglo):
+    """Lista de floats redondeados, con None en lugar de NaN"""
+    return [None if np.isnan(v) else round(float(v), 2) for v in arreglo]
+
+
+class SeriesCalidad:
+    """Series de calidad de agua sobre la vista tipada (DatasetNormalizado)"""
+
+    def __init__(self, normalizado):
+        posiciones = np.asarray(normalizado.validos, dtype=np.intp)
+        fechas = normalizado.columna('fecha')
+        ubicaciones = normalizado.columna('ubicacion')
+
+        self.ubicaciones = normalizado.ubicaciones
+        self._dias = np.array([fechas[p] for p in posiciones], dtype='datetime64[D]')
+        self._codigo = {clave: i for i, clave in enumerate(self.ubicaciones)}
+        self._ubicacion = np.array([self._codigo[ubicaciones[p]] for p in posiciones], dtype=np.intp)
+        self._valores = {
+            metrica: np.array(
+                [np.nan if v is None else v for v in (normalizado.columna(metrica)[p] for p in posiciones)],
+                dtype=np.float64
+            )
+            for metrica in METRICAS
+        }
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+    def resamplear(self, clave_ubicacion=None, frecuencia='mensual', ventana=VENTANA_MOVIL):
+        """
+        Serie re-muestreada de una ubicación (clave canónica; None = todas juntas).
+        Retorna una lista de períodos, del más antiguo al más reciente.
+        """
+        frecuencia = FRECUENCIAS.get(str(frecuencia).lower())
+        if frecuencia is None:
+            raise ValueError("frecuencia debe ser diaria, semanal o mensual")
+        if ventana < 1:
+            raise ValueError("ventana debe ser mayor que 0")
+
+        # La base (períodos y estadísticas) se cachea por (ubicación, frecuencia);
+        # el promedio móvil depende de la ventana y se calcula en cada consulta
+        clave = (clave_ubicacion, frecuencia)
+        base = self._cache.get(clave)
+        if base is None:
+            base = self._calcular(clave_ubicacion, frecuencia)
+            if clave_ubicacion is None or clave_ubicacion in self._codigo:
+                with self._cache_lock:
+                    self._cache[clave] = base
+
+        periodos, muestras, por_metrica = base
+        serie = [
+            {'periodo': periodo, 'muestras': n, 'metricas': {}}
+            for periodo, n in zip(periodos, muestras)
+        ]
+        for metrica, (estadisticas, promedio, hay) in por_metrica.items():
+            estadisticas = dict(estadisticas, movil=_redondear(self._promedio_movil(promedio, hay, ventana)))
+            for i, punto in enumerate(serie):
+                punto['metricas'][metrica] = {nombre: valores[i] for nombre, valores in estadisticas.items()}
+        return serie
+
+    def _calcular(self, clave_ubicacion, frecuencia):
+        """Períodos, muestras y estadísticas (sin promedio móvil) de cada métrica"""
+        if clave_ubicacion is None:
+            filas = np.arange(len(self._dias))
+        elif clave_ubicacion in self._codigo:
+            filas = np.flatnonzero(self._ubicacion == self._codigo[clave_ubicacion])
+        else:
+            return [], [], {}
+
+        periodos = _inicio_periodo(self._dias[filas], frecuencia)
+        unicos, grupo = np.unique(periodos, return_inverse=True)
+        muestras = np.bincount(grupo, minlength=len(unicos))
+
+        por_metrica = {
+            metrica: self._estadisticas(self._valores[metrica][filas], grupo, len(unicos))
+            for metrica in METRICAS
+        }
+        return [str(periodo) for periodo in unicos], [int(n) for n in muestras], por_metrica
+
+    @staticmethod
+    def _estadisticas(valores, grupo, n_grupos):
+        """
+        Promedio, mínimo, máximo y p95 por grupo (ignora NaN).
+        Retorna (estadísticas redondeadas, promedio, grupos con datos).
+        """
+        presentes = ~np.isnan(valores)
+        conteo = np.bincount(grupo[presentes], minlength=n_grupos)
+        suma = np.bincount(grupo[presentes], weights=valores[presentes], minlength=n_grupos)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            promedio = np.where(conteo > 0, suma / np.maximum(conteo, 1), np.nan)
+
+        minimo = np.full(n_grupos, np.inf)
+        maximo = np.full(n_grupos, -np.inf)
+        np.minimum.at(minimo, grupo[presentes], valores[presentes])
+        np.maximum.at(maximo, grupo[presentes], valores[presentes])
+        minimo[conteo == 0] = np.nan
+        maximo[conteo == 0] = np.nan
+
+        p95 = percentiles_por_grupo(valores[presentes], grupo[presentes], n_grupos, (PERCENTIL,))[PERCENTIL]
+        hay = conteo > 0
+
+        estadisticas = {
+            'promedio': _redondear(promedio),
+            'min': _redondear(minimo),
+            'max': _redondear(maximo),
+            'p95': _redondear(p95),
+        }
+        return estadisticas, promedio, hay
+
+    @staticmethod
+    def _promedio_movil(promedio, hay, ventana):
+        """Promedio de los últimos `ventana` períodos (los que no tienen datos no cuentan)"""
+        n_grupos = len(promedio)
+        acumulado = np.concatenate(([0.0], np.cumsum(np.where(hay, promedio, 0.0))))
+        acumulado_n = np.concatenate(([0], np.cumsum(hay)))
+        desde = np.maximum(np.arange(n_grupos) + 1 - ventana, 0)
+        hasta = np.arange(n_grupos) + 1
+        n_movil = acumulado_n[hasta] - acumulado_n[desde]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n_movil > 0, (acumulado[hasta] - acumulado[desde]) / np.maximum(n_movil, 1), np.nan)
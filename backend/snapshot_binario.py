@@ -0,0 +1,195 @@
+"""
+WaterWay - Snapshot binario compilado de los datos procesados
+Convierte data/processed/**/*.json en un único archivo binario que se
+abre con mmap al arrancar, evitando parsear JSON en cada inicio.
+
+Uso:
+    python snapshot_binario.py    # compila data/processed -> data/processed.snap
+"""
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent / 'data' / 'processed'
+SNAPSHOT_PATH = Path(__file__).parent / 'data' / 'processed.snap'
+
+# Formato del archivo:
+#   MAGIC (8 bytes) | largo del header (uint32 LE) | header JSON | payloads
+# Cada payload es un dataset serializado con marshal, alineado a 8 bytes.
+MAGIC = b'WWSNAP\x00\x01'
+FORMATO = 2
+
+
+def _compartir_textos(obj, pool):
+    """
+    Reemplaza textos repetidos por un mismo objeto.
+    marshal los escribe una sola vez (referencias), así el archivo es más
+    chico y al cargar los registros comparten memoria.
+    """
+    if isinstance(obj, str):
+        return pool.setdefault(obj, obj)
+    if isinstance(obj, list):
+        return [_compartir_textos(v, pool) for v in obj]
+    if isinstance(obj, dict):
+        return {_compartir_textos(k, pool): _compartir_textos(v, pool) for k, v in obj.items()}
+    return obj
+
+
+def _hash(contenido):
+    """sha256 del contenido de un JSON fuente"""
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def _firma(ruta):
+    """(mtime_ns, tamaño) de un archivo, igual que la firma de DataLoader"""
+    st = os.stat(ruta)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def compilar(data_dir=DATA_DIR, destino=SNAPSHOT_PATH):
+    """
+    Compila todos los JSON de data_dir en un snapshot binario.
+    Escribe a un archivo temporal y lo renombra, así un proceso que esté
+    leyendo el snapshot anterior nunca ve un archivo a medio escribir.
+    Retorna el header escrito.
+    """
+    data_dir = Path(data_dir)
+    destino = Path(destino)
+    fuentes = {}
+    payloads = []
+
+    for ruta in sorted(data_dir.rglob('*.json')):
+        nombre = ruta.relative_to(data_dir).as_posix()
+        firma = _firma(ruta)
+        contenido = ruta.read_bytes()
+
+        data = _compartir_textos(json.loads(contenido.decode('utf-8')), {})
+        payload = marshal.dumps(data)
+        fuentes[nombre] = {'firma': firma, 'sha256': _hash(contenido), 'crc32': zlib.crc32(payload)}
+        payloads.append((nombre, payload))
+
+    header = {
+        'formato': FORMATO,
+        'marshal': marshal.version,
+        'python': list(sys.version_info[:2]),
+        'fuentes': fuentes,
+    }
+
+    # Calcula offsets: el header incluye los offsets, así que se reserva
+    # espacio de sobra y se rellena con espacios hasta el largo final
+    datos_header = json.dumps(header).encode('utf-8')
+    reserva = len(datos_header) + 48 * len(payloads) + 64
+    offset = len(MAGIC) + 4 + reserva
+    for nombre, payload in payloads:
+        offset += -offset % 8
+        fuentes[nombre]['offset'] = offset
+        fuentes[nombre]['largo'] = len(payload)
+        offset += len(payload)
+
+    datos_header = json.dumps(header).encode('utf-8')
+    if len(datos_header) > reserva:
+        raise ValueError('Header del snapshot excede el espacio reservado')
+    datos_header = datos_header.ljust(reserva, b' ')
+
+    temporal = destino.with_suffix(destino.suffix + '.tmp')
+    with open(temporal, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', reserva))
+        f.write(datos_header)
+        for nombre, payload in payloads:
+            f.write(b'\x00' * (fuentes[nombre]['offset'] - f.tell()))
+            f.write(payload)
+    os.replace(temporal, destino)
+
+    return header
+
+
+class SnapshotBinario:
+    """Snapshot compilado abierto con mmap; cada dataset se decodifica al pedirlo"""
+
+    def __init__(self, ruta=SNAPSHOT_PATH):
+        self.ruta = Path(ruta)
+        self.firma = _firma(self.ruta)
+
+        with open(self.ruta, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError('Archivo de snapshot inválido')
+        (largo,) = struct.unpack_from('<I', self._mm, len(MAGIC))
+        inicio = len(MAGIC) + 4
+        self.header = json.loads(bytes(self._mm[inicio:inicio + largo]))
+
+        if self.header.get('formato') != FORMATO:
+            raise ValueError(f"Formato de snapshot {self.header.get('formato')} no soportado")
+        if (self.header.get('marshal') != marshal.version or
+                self.header.get('python') != list(sys.version_info[:2])):
+            raise ValueError('Snapshot compilado con otra versión de Python')
+
+    def vigente(self, nombre, firma, ruta):
+        """
+        Indica si el snapshot tiene el dataset y corresponde al JSON actual (ruta).
+        Si (mtime, tamaño) coinciden se confirma con el sha256 del contenido:
+        una edición del mismo tamaño dentro de la resolución del mtime no
+        cambia la firma.
+        """
+        fuente = self.header['fuentes'].get(nombre)
+        if fuente is None or tuple(fuente['firma']) != tuple(firma):
+            return False
+        try:
+            return _hash(Path(ruta).read_bytes()) == fuente['sha256']
+        except OSError:
+            return False
+
+    def cargar(self, nombre):
+        """Decodifica un dataset desde el archivo mapeado en memoria"""
+        fuente = self.header['fuentes'][nombre]
+        payload = memoryview(self._mm)[fuente['offset']:fuente['offset'] + fuente['largo']]
+        try:
+            if zlib.crc32(payload) != fuente['crc32']:
+                raise ValueError(f'{nombre}: checksum inválido en el snapshot')
+            return marshal.loads(payload)
+        finally:
+            payload.release()
+
+
+# Snapshot abierto compartido por el proceso (se reabre si se recompila)
+_abierto = None
+_abierto_lock = threading.Lock()
+
+
+def obtener_snapshot(ruta=SNAPSHOT_PATH):
+    """Snapshot compilado vigente, o None si no existe o no es válido"""
+    global _abierto
+
+    try:
+        firma = _firma(ruta)
+    except OSError:
+        return None
+
+    with _abierto_lock:
+        if _abierto is None or _abierto.ruta != Path(ruta) or _abierto.firma != firma:
+            try:
+                _abierto = SnapshotBinario(ruta)
+            except (OSError, ValueError) as e:
+                print(f"[!] Snapshot binario no disponible: {e}")
+                _abierto = None
+        return _abierto
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("COMPILANDO SNAPSHOT BINARIO")
+    print("=" * 60)
+    header = compilar()
+    for nombre, fuente in header['fuentes'].items():
+        print(f"[OK] {nombre}: {fuente['firma'][1]} -> {fuente['largo']} bytes")
+    print(f"Snapshot escrito en: {SNAPSHOT_PATH}")
+    print("=" * 60)
@@ -0,0 +1,9 @@
+"""
+WaterWay - Configuración de pytest
+Los módulos del backend se importan planos (from indices import ...),
+igual que cuando se ejecuta app.py desde backend/.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
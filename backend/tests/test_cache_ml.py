@@ -0,0 +1,61 @@
+"""
+WaterWay - Cache de respuestas de /api/ml/* y versión de los modelos
+Una versión nueva de los modelos tiene que dejar de servir (y descartar)
+las respuestas guardadas con la versión anterior.
+"""
+import os
+
+import pytest
+
+import app as app_mod
+from respuestas import CacheRespuestas
+
+RUTA = '/api/ml/proyecciones'
+PARAMETROS = {'estrato': '3'}
+
+
+@pytest.fixture
+def predictor():
+    if not app_mod.ML_AVAILABLE or not app_mod.respuestas_cache.max_bytes:
+        pytest.skip("Sin predictor o con la cache de respuestas desactivada")
+    predictor = app_mod.predictor
+    assert predictor.esperar(timeout=60)
+    return predictor
+
+
+@pytest.fixture
+def archivo_modelo(predictor):
+    """Archivo de modelos cuya fecha se adelanta para simular un reentrenamiento"""
+    ruta = next((r for r in (predictor.model_path, predictor.compilados_path) if r.exists()), None)
+    if ruta is None:
+        pytest.skip("No hay archivos de modelos")
+    st = os.stat(ruta)
+    yield ruta
+    os.utime(ruta, ns=(st.st_atime_ns, st.st_mtime_ns))
+    predictor.recargar()
+
+
+def test_version_nueva_de_modelos_descarta_respuestas_cacheadas(predictor, archivo_modelo):
+    cliente = app_mod.app.test_client()
+    cache = app_mod.respuestas_cache
+
+    primera = cliente.get(RUTA, query_string=PARAMETROS)
+    assert primera.status_code == 200
+    clave_vieja = CacheRespuestas.clave('/api/ml/', predictor.version, RUTA, PARAMETROS.items())
+    assert cache.obtener(clave_vieja) is not None
+
+    # Mientras no cambie la versión se sirve lo guardado
+    cache.guardar(clave_vieja, b'{"cacheada": true}')
+    assert cliente.get(RUTA, query_string=PARAMETROS).get_json() == {'cacheada': True}
+
+    st = os.stat(archivo_modelo)
+    os.utime(archivo_modelo, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    version = predictor.version
+    assert predictor.recargar()
+    assert predictor.version != version
+
+    nueva = cliente.get(RUTA, query_string=PARAMETROS, headers={'If-None-Match': primera.headers['ETag']})
+    assert nueva.status_code == 200
+    assert nueva.get_json()['success'] is True
+    assert nueva.headers['ETag'] != primera.headers['ETag']
+    assert cache.obtener(clave_vieja) is None
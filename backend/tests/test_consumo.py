@@ -0,0 +1,47 @@
+"""
+WaterWay - Tests de consumo por estrato (EPM)
+Se reemplaza el dataset de consumo del snapshot por unos registros armados a mano.
+"""
+import pytest
+
+import app as app_mod
+import data_loader as data_loader_mod
+from data_loader import CAMPOS_INDEXADOS, _Entrada
+from indices import IndiceInvertido
+
+CONSUMO = [
+    {'estrato': 1, 'municipio': 'Medellín', 'fecha': '2024-01-01', 'consumo_m3': 10.0},
+    {'estrato': 1, 'municipio': 'Medellín', 'fecha': '2024-02-01', 'consumo_m3': 14.0},
+    {'estrato': None, 'municipio': 'Medellín', 'fecha': '2024-01-01', 'consumo_m3': 30.0},
+    {'estrato': 1, 'municipio': 'Bello', 'fecha': '2024-01-01', 'consumo_m3': 50.0},
+]
+
+
+@pytest.fixture
+def loader(monkeypatch):
+    loader = app_mod.data_loader
+    entrada = _Entrada(datos=CONSUMO, indice=IndiceInvertido(CONSUMO, CAMPOS_INDEXADOS['consumo']))
+    monkeypatch.setattr(loader, '_snapshot', loader._snapshot.con_dataset('consumo', entrada))
+    return loader
+
+
+def test_consumo_por_estrato_conserva_la_clave_none(loader, monkeypatch):
+    esperado = {'1': {'promedio': 12.0, 'total': 2}, 'None': {'promedio': 30.0, 'total': 1}}
+    assert loader.get_consumo_por_estrato() == esperado
+
+    # Igual que el cálculo por registros (sin NumPy)
+    monkeypatch.setattr(data_loader_mod, 'AGREGACIONES_AVAILABLE', False)
+    assert loader.get_consumo_por_estrato() == esperado
+
+
+def test_municipio_por_defecto_igual_con_y_sin_agrupar(loader):
+    cliente = app_mod.app.test_client()
+
+    agrupado = cliente.get('/api/epm/consumo', query_string={'agrupar_por': 'estrato'}).get_json()
+    assert {g['estrato']: g['conteo'] for g in agrupado['data']} == {'1': 2, 'sin_dato': 1}
+
+    por_estrato = cliente.get('/api/epm/consumo').get_json()
+    assert {estrato: d['total'] for estrato, d in por_estrato['data'].items()} == {'1': 2, 'None': 1}
+
+    todos = cliente.get('/api/epm/consumo', query_string={'agrupar_por': 'municipio', 'municipio': ''}).get_json()
+    assert {g['municipio'] for g in todos['data']} == {'Medellín', 'Bello'}
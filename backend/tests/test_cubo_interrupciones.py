@@ -0,0 +1,54 @@
+"""
+WaterWay - Tests del cubo de impacto de interrupciones
+"""
+import pytest
+
+from cubo_interrupciones import CuboInterrupciones
+
+CAMPOS_EPM = {
+    'campo_area': 'Municipio', 'campo_tipo': 'Impacto',
+    'campo_inicio': 'Inicio', 'campo_fin': 'Fin', 'campo_horas': 'Horas', 'horas_en_dias': True,
+    'campo_usuarios': 'N. Inst', 'usuarios_en_miles': True,
+}
+
+
+def _registro(inicio, fin, horas, usuarios=1, municipio='Quibdó', impacto='Total'):
+    return {'Municipio': municipio, 'Impacto': impacto, 'Inicio': inicio, 'Fin': fin, 'Horas': horas, 'N. Inst': usuarios}
+
+
+def test_horas_es_la_duracion_principal():
+    cubo = CuboInterrupciones([
+        # Fin inválido cinco meses después: manda Horas
+        _registro('2020-07-29T20:00:00', '2020-12-31T22:00:00', '2'),
+        _registro('2022-01-14T18:00:00', '2022-01-14T00:00:00', '0,25'),
+        _registro('2022-03-05T00:00:00', '2022-03-05T06:20:00', '6,33'),
+    ], **CAMPOS_EPM)
+
+    _, totales = cubo.consultar(por=())
+    assert totales['interrupciones'] == 3
+    assert totales['horas'] == pytest.approx(2 + 6 + 6.33)
+
+
+def test_sin_horas_usa_inicio_y_fin():
+    cubo = CuboInterrupciones([
+        _registro('2022-01-05T10:00:00', '2022-01-05T12:15:00', None),
+        _registro('2022-01-06T10:00:00', '2022-01-06T08:00:00', None),   # fin anterior: 0 horas
+    ], **CAMPOS_EPM)
+
+    _, totales = cubo.consultar(por=())
+    assert totales['horas'] == 2.25
+
+
+def test_usuarios_en_miles_y_rollups():
+    cubo = CuboInterrupciones([
+        _registro('2022-01-05T10:00:00', None, '1', usuarios=2.32),
+        _registro('2022-02-05T10:00:00', None, '3', usuarios=10, impacto='Parcial'),
+    ], **CAMPOS_EPM)
+
+    grupos, totales = cubo.consultar(por=('mes',))
+    assert [g['mes'] for g in grupos] == ['2022-01', '2022-02']
+    assert grupos[0]['usuarios_afectados'] == 2320
+    assert totales['horas_usuario'] == 2320 * 1 + 10 * 3
+
+    grupos, _ = cubo.consultar(por=('tipo',), desde='2022-02')
+    assert grupos == [{'tipo': 'Parcial', 'interrupciones': 1, 'horas': 3.0, 'usuarios_afectados': 10, 'horas_usuario': 30.0}]
@@ -0,0 +1,86 @@
+"""
+WaterWay - Tests de la facturación en lote por bloques (OSE)
+Usan un tarifario chico armado a mano para poder calcular los importes.
+"""
+import numpy as np
+import pytest
+
+from facturacion import TarifarioOSE
+
+
+def _bloques(fecha, categoria, cargo_fijo, *bloques):
+    return [
+        {'fecha': fecha, 'categoria': categoria, 'hasta_m3': hasta, 'tarifa_por_m3': tarifa, 'cargo_fijo': cargo_fijo, 'moneda': 'UYU'}
+        for hasta, tarifa in bloques
+    ]
+
+
+TARIFAS = (
+    _bloques('2024-01-01', 'Residencial', 100, (5, 10), (15, 20), (9999, 30))
+    + _bloques('2024-07-01', 'Residencial', 110, (5, 12), (15, 24), (9999, 36))
+    + _bloques('2024-01-01', 'Comercial', 200, (9999, 50))
+)
+
+
+@pytest.fixture
+def tarifario():
+    return TarifarioOSE(TARIFAS)
+
+
+@pytest.fixture(scope='module')
+def cliente():
+    from app import app
+    return app.test_client()
+
+
+def test_consumo_justo_en_el_limite_queda_en_el_bloque_inferior(tarifario):
+    facturas = tarifario.facturar([0, 5, 15, 15.5], 'Residencial', '2024-03')
+
+    assert facturas['bloque'].tolist() == [0, 0, 1, 2]
+    np.testing.assert_allclose(facturas['cargo_variable'], [0, 5 * 10, 5 * 10 + 10 * 20, 5 * 10 + 10 * 20 + 0.5 * 30])
+    np.testing.assert_allclose(facturas['importe'], facturas['cargo_variable'] + 100)
+
+
+def test_fecha_anterior_a_la_primera_tarifa(tarifario, cliente):
+    with pytest.raises(ValueError, match='No hay tarifa vigente'):
+        tarifario.facturar([10], 'Residencial', '2023-12-31')
+
+    respuesta = cliente.post('/api/uruguay/facturacion/lote', json={
+        'consumo_m3': [10], 'categoria': 'Residencial', 'fecha': '2023-12', 'tarifas': TARIFAS,
+    })
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['success'] is False
+
+
+def test_categoria_desconocida(tarifario, cliente):
+    with pytest.raises(ValueError, match='Categoría desconocida en el hogar 1'):
+        tarifario.facturar([10, 10], ['Residencial', 'Industrial'], '2024-03')
+
+    respuesta = cliente.post('/api/uruguay/facturacion/lote', json={
+        'consumo_m3': [10], 'categoria': 'Industrial', 'tarifas': TARIFAS,
+    })
+    assert respuesta.status_code == 400
+
+
+def test_categoria_y_fecha_unicas_se_aplican_a_todos(tarifario):
+    consumos = [3, 12, 40]
+    unicas = tarifario.facturar(consumos, ' residencial ', '2024-03')
+    por_hogar = tarifario.facturar(consumos, ['Residencial'] * 3, ['2024-03-15'] * 3)
+
+    np.testing.assert_array_equal(unicas['importe'], por_hogar['importe'])
+    with pytest.raises(ValueError):
+        tarifario.facturar(consumos, ['Residencial'] * 2, '2024-03')
+    with pytest.raises(ValueError):
+        tarifario.facturar(consumos, 'Residencial', ['2024-03'] * 2)
+
+
+def test_fecha_entre_dos_versiones_usa_la_vigente(tarifario):
+    facturas = tarifario.facturar([10] * 4, 'Residencial', ['2024-06-30', '2024-07-01', '2025-02', None])
+
+    assert facturas['vigencia'].astype(str).tolist() == ['2024-01', '2024-07', '2024-07', '2024-07']
+    np.testing.assert_allclose(facturas['importe'], [
+        100 + 5 * 10 + 5 * 20,
+        110 + 5 * 12 + 5 * 24,
+        110 + 5 * 12 + 5 * 24,
+        110 + 5 * 12 + 5 * 24,
+    ])
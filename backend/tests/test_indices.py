@@ -0,0 +1,39 @@
+"""
+WaterWay - Tests de parseo de duraciones e índice de intervalos
+"""
+from datetime import datetime
+
+import pytest
+
+from indices import IndiceIntervalos, parsear_horas
+
+
+@pytest.mark.parametrize('valor, esperado', [
+    ('0,25', 6.0),          # fracción de día de Excel
+    ('0,0833333333', 2.0),
+    ('6,33', 6.33),         # horas con decimales
+    ('7,25', 7.25),
+    ('6', 6.0),
+    (2, 2.0),
+])
+def test_parsear_horas_en_dias(valor, esperado):
+    assert parsear_horas(valor, decimales_en_dias=True) == pytest.approx(esperado, abs=1e-6)
+
+
+def test_parsear_horas_sin_conversion():
+    assert parsear_horas('0,25') == 0.25
+    assert parsear_horas(None) is None
+    assert parsear_horas('sin dato') is None
+
+
+def test_intervalo_que_cruza_la_medianoche_usa_horas():
+    registros = [
+        # Fin anterior al Inicio: se usa Horas (0,25 días = 6 horas)
+        {'Inicio': '2022-01-14T18:00:00', 'Fin': '2022-01-14T00:00:00', 'Horas': '0,25'},
+        {'Inicio': '2022-03-05T00:00:00', 'Fin': '2022-03-05T06:20:00', 'Horas': '6,33'},
+    ]
+    indice = IndiceIntervalos(registros, 'Inicio', 'Fin', 'Horas', horas_en_dias=True)
+
+    assert indice.activos_en(datetime(2022, 1, 14, 23, 30)) == [0]
+    assert indice.activos_en(datetime(2022, 1, 15, 0, 30)) == []
+    assert indice.activos_en(datetime(2022, 3, 5, 6, 0)) == [1]
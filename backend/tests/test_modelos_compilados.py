@@ -0,0 +1,77 @@
+"""
+WaterWay - Paridad de los modelos compilados (NumPy) con sklearn/xgboost
+Compara sobre una grilla fija de entradas; se saltea si no están el .pkl,
+joblib, sklearn o xgboost, o si el .npz no se exportó del .pkl actual.
+"""
+from itertools import product
+
+import numpy as np
+import pytest
+
+import predictor as predictor_mod
+from modelos_compilados import COMPILADOS_PATH, MODELOS_PATH, TOLERANCIA, cargar_compilados, fuente_compilados, hash_archivo
+from predictor import CONSUMO_BASE, WaterPredictor
+
+MESES = range(1, 13)
+PRECIPITACIONES = (0.0, 75.0, 150.0, 300.0)
+TEMPERATURAS = (12.0, 22.0, 32.0)
+CONSUMOS = (8.0, 19.0, 150.0, 520.0)
+
+
+@pytest.fixture(scope='module')
+def modelos():
+    joblib = pytest.importorskip('joblib')
+    pytest.importorskip('sklearn')
+    pytest.importorskip('xgboost')
+    if not MODELOS_PATH.exists() or not COMPILADOS_PATH.exists():
+        pytest.skip("Faltan models/waterway_models.pkl o el .npz compilado")
+    if fuente_compilados(COMPILADOS_PATH) != hash_archivo(MODELOS_PATH):
+        pytest.skip("El .npz no se exportó del .pkl actual")
+    return joblib.load(MODELOS_PATH), cargar_compilados(COMPILADOS_PATH)
+
+
+def _grilla(n_estratos):
+    filas = np.array(list(product(MESES, range(n_estratos), PRECIPITACIONES, TEMPERATURAS, CONSUMOS)), dtype=np.float64)
+    meses, estratos, precipitacion, temperatura, consumo = filas.T
+    return meses, estratos, precipitacion, temperatura, consumo
+
+
+def test_random_forest_de_consumo(modelos):
+    original, compilado = modelos
+    meses, estratos, precipitacion, temperatura, consumo = _grilla(
+        len(original['consumo_predictor']['label_encoder_estrato'].classes_)
+    )
+    X = np.column_stack([meses, (meses - 1) // 3 + 1, meses * 30, precipitacion, temperatura, consumo, estratos])
+
+    esperado = original['consumo_predictor']['model'].predict(original['consumo_predictor']['scaler'].transform(X))
+    obtenido = compilado['consumo_predictor']['model'].predict(compilado['consumo_predictor']['scaler'].transform(X))
+    np.testing.assert_allclose(obtenido, esperado, rtol=0, atol=TOLERANCIA)
+
+
+def test_xgboost_de_riesgo(modelos):
+    original, compilado = modelos
+    meses, estratos, precipitacion, temperatura, consumo = _grilla(
+        len(original['riesgo_clasificador']['label_encoder_estrato'].classes_)
+    )
+    X = np.column_stack([meses, estratos, consumo, precipitacion, temperatura, consumo, np.full(len(meses), 0.5)])
+
+    esperado = original['riesgo_clasificador']['model'].predict(X)
+    obtenido = compilado['riesgo_clasificador']['model'].predict(X)
+    np.testing.assert_array_equal(obtenido, esperado)
+
+
+def test_predictor_da_lo_mismo_con_y_sin_compilados(modelos, monkeypatch):
+    con_compilados = WaterPredictor()
+    monkeypatch.setattr(predictor_mod, 'USAR_MODELOS_COMPILADOS', False)
+    con_pkl = WaterPredictor()
+    assert con_compilados.modelos_compilados and not con_pkl.modelos_compilados
+
+    estratos, meses, precipitaciones, temperaturas = (
+        list(columna) for columna in zip(*product(CONSUMO_BASE, MESES, PRECIPITACIONES, TEMPERATURAS))
+    )
+    assert (con_compilados.predecir_consumo_lote(estratos, meses, precipitaciones, temperaturas)
+            == con_pkl.predecir_consumo_lote(estratos, meses, precipitaciones, temperaturas))
+
+    consumos = [CONSUMO_BASE[e] * 1.3 for e in estratos]
+    assert (con_compilados.clasificar_riesgo_lote('Medellín', estratos, consumos, meses, precipitaciones, temperaturas)
+            == con_pkl.clasificar_riesgo_lote('Medellín', estratos, consumos, meses, precipitaciones, temperaturas))
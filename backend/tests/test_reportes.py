@@ -0,0 +1,90 @@
+"""
+WaterWay - Tests de altas y cambios de reportes ciudadanos
+Cada escritura publica un snapshot nuevo con los conteos ajustados;
+el snapshot anterior no se modifica.
+"""
+import pytest
+
+from data_loader import DataLoader
+from indices import IndiceInvertido
+
+CAMPOS = {'municipio': None, 'estado': None}
+
+
+def _reporte(**campos):
+    return {'categoria': 'fuga', 'descripcion': 'Fuga en la vereda', 'municipio': 'Medellín', **campos}
+
+
+def test_con_registro_no_modifica_el_indice_original():
+    indice = IndiceInvertido([{'municipio': 'Bello', 'estado': 'pendiente'}], CAMPOS)
+    nuevo = indice.con_registro(1, {'municipio': 'Bello', 'estado': 'resuelto'})
+
+    assert indice.conteo('estado', 'resuelto') == 0 and indice.total == 1
+    assert nuevo.conteo('estado', 'resuelto') == 1 and nuevo.total == 2
+    assert nuevo.posiciones(municipio='Bello') == [0, 1]
+
+
+def test_con_cambio_mueve_la_posicion_en_orden():
+    registros = [{'municipio': 'Bello', 'estado': e} for e in ('resuelto', 'pendiente', 'resuelto')]
+    indice = IndiceInvertido(registros, CAMPOS)
+    nuevo = indice.con_cambio(1, 'estado', 'pendiente', 'resuelto')
+
+    assert nuevo.posiciones(estado='resuelto') == [0, 1, 2]
+    assert nuevo.conteo('estado', 'pendiente') == 0
+    assert 'pendiente' not in nuevo.valores('estado')
+    assert indice.posiciones(estado='pendiente') == [1]
+
+
+def test_alta_publica_snapshot_con_conteos_ajustados():
+    loader = DataLoader('colombia')
+    antes = loader.get_stats()['reportes']
+    snapshot = loader._snapshot
+
+    reporte = loader.agregar_reporte(_reporte())
+
+    despues = loader.get_stats()['reportes']
+    assert reporte['estado'] == 'pendiente' and reporte['id'].startswith('REP-')
+    assert despues['total'] == antes['total'] + 1
+    assert despues['pendientes'] == antes['pendientes'] + 1
+    assert loader.version != snapshot.version
+    # El snapshot anterior sigue igual para los requests que lo estén usando
+    assert len(snapshot.dataset('reportes')) == antes['total']
+    assert snapshot.indice('reportes').conteo('estado', 'pendiente') == antes['pendientes']
+    assert reporte in loader.get_reportes(municipio='Medellín', estado='pendiente')
+
+
+def test_cambio_de_estado_ajusta_conteos():
+    loader = DataLoader('colombia')
+    reporte = loader.agregar_reporte(_reporte())
+    antes = loader.get_stats()['reportes']
+    version = loader.version
+
+    actualizado = loader.actualizar_estado_reporte(reporte['id'], 'resuelto')
+
+    despues = loader.get_stats()['reportes']
+    assert actualizado['estado'] == 'resuelto'
+    assert despues['total'] == antes['total']
+    assert despues['pendientes'] == antes['pendientes'] - 1
+    assert despues['resueltos'] == antes['resueltos'] + 1
+    assert loader.version != version
+    assert loader.get_reportes(estado='resuelto')[-1]['id'] == reporte['id']
+
+
+def test_validaciones():
+    loader = DataLoader('colombia')
+    with pytest.raises(ValueError):
+        loader.agregar_reporte(_reporte(municipio=None))
+    with pytest.raises(ValueError):
+        loader.agregar_reporte(_reporte(estado='cerrado'))
+    assert loader.actualizar_estado_reporte('REP-NO-EXISTE', 'resuelto') is None
+
+
+def test_recarga_forzada_descarta_altas_y_cambia_version():
+    loader = DataLoader('colombia')
+    total = loader.get_stats()['reportes']['total']
+    loader.agregar_reporte(_reporte())
+    version = loader.version
+
+    assert loader.recargar(forzar=True)
+    assert loader.version != version
+    assert loader.get_stats()['reportes']['total'] == total